@@ -216,6 +216,22 @@ class AdminRepository {
     }
   }
 
+  // Plan of a patient's diet, resolved by the server from the record's dietRef
+  Future<Map<String, dynamic>> getPatientDiet(
+    String targetUid,
+    String dietId,
+  ) async {
+    final token = await _getToken();
+    final response = await http.get(
+      Uri.parse('$_baseUrl/admin/diet/$targetUid/$dietId'),
+      headers: {'Authorization': 'Bearer $token'},
+    );
+    if (response.statusCode != 200) {
+      throw Exception('Failed to load diet: ${response.body}');
+    }
+    return jsonDecode(utf8.decode(response.bodyBytes)) as Map<String, dynamic>;
+  }
+
   Future<void> uploadParserConfig(String targetUid, PlatformFile file) async {
     final token = await _getToken();
     if (file.bytes == null) throw Exception("File vuoto");
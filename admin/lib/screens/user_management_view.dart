@@ -1379,59 +1379,97 @@ class _UserHistoryScreen extends StatelessWidget {
   }
 }
 
-class _DietDetailScreen extends StatelessWidget {
+class _DietDetailScreen extends StatefulWidget {
   final Map<String, dynamic> data;
 
   const _DietDetailScreen({required this.data});
 
   @override
-  Widget build(BuildContext context) {
+  State<_DietDetailScreen> createState() => _DietDetailScreenState();
+}
+
+class _DietDetailScreenState extends State<_DietDetailScreen> {
+  final AdminRepository _repo = AdminRepository();
+  late final Future<Map<String, dynamic>?> _plan;
+
+  Map<String, dynamic> get data => widget.data;
+
+  @override
+  void initState() {
+    super.initState();
+    _plan = _loadPlan();
+  }
+
+  // Older records carry the plan inline (parsedData); newer ones only a dietRef,
+  // resolved by the server for the patient's copy (clientDietId)
+  Future<Map<String, dynamic>?> _loadPlan() async {
     final parsedData = data['parsedData'] as Map<String, dynamic>?;
-    final plan = parsedData?['plan'] as Map<String, dynamic>?;
+    if (parsedData != null) return parsedData['plan'] as Map<String, dynamic>?;
+
+    final userId = data['userId'] as String?;
+    final clientDietId = data['clientDietId'] as String?;
+    if (userId == null || clientDietId == null) return null;
+    final diet = await _repo.getPatientDiet(userId, clientDietId);
+    return diet['plan'] as Map<String, dynamic>?;
+  }
 
+  @override
+  Widget build(BuildContext context) {
     return Scaffold(
       appBar: AppBar(title: Text(data['fileName'] ?? "Dettaglio")),
-      body: plan == null
-          ? const Center(child: Text("Dati dieta non validi o mancanti."))
-          : ListView(
-              padding: const EdgeInsets.all(16),
-              children: plan.entries.map((entry) {
-                final day = entry.key;
-                final meals = entry.value as Map<String, dynamic>;
-                return Card(
-                  margin: const EdgeInsets.only(bottom: 12),
-                  child: ExpansionTile(
-                    title: Text(
-                      day,
-                      style: const TextStyle(fontWeight: FontWeight.bold),
-                    ),
-                    children: meals.entries.map((mEntry) {
-                      final mealName = mEntry.key;
-                      final dishes = mEntry.value as List<dynamic>;
-                      return ListTile(
-                        title: Text(
-                          mealName,
-                          style: const TextStyle(
-                            color: Colors.blue,
-                            fontWeight: FontWeight.bold,
-                          ),
-                        ),
-                        subtitle: Column(
-                          crossAxisAlignment: CrossAxisAlignment.start,
-                          children: dishes.map((d) {
-                            final name = d['name'] ?? '-';
-                            final qty = d['qty']?.toString() ?? '';
-                            return Text(
-                              "• $name ${qty.isNotEmpty ? '($qty)' : ''}",
-                            );
-                          }).toList(),
-                        ),
-                      );
-                    }).toList(),
+      body: FutureBuilder<Map<String, dynamic>?>(
+        future: _plan,
+        builder: (context, snapshot) {
+          if (snapshot.connectionState != ConnectionState.done) {
+            return const Center(child: CircularProgressIndicator());
+          }
+          final plan = snapshot.data;
+          if (snapshot.hasError || plan == null) {
+            return const Center(
+              child: Text("Dati dieta non validi o mancanti."),
+            );
+          }
+          return ListView(
+            padding: const EdgeInsets.all(16),
+            children: plan.entries.map((entry) {
+              final day = entry.key;
+              final meals = entry.value as Map<String, dynamic>;
+              return Card(
+                margin: const EdgeInsets.only(bottom: 12),
+                child: ExpansionTile(
+                  title: Text(
+                    day,
+                    style: const TextStyle(fontWeight: FontWeight.bold),
                   ),
-                );
-              }).toList(),
-            ),
+                  children: meals.entries.map((mEntry) {
+                    final mealName = mEntry.key;
+                    final dishes = mEntry.value as List<dynamic>;
+                    return ListTile(
+                      title: Text(
+                        mealName,
+                        style: const TextStyle(
+                          color: Colors.blue,
+                          fontWeight: FontWeight.bold,
+                        ),
+                      ),
+                      subtitle: Column(
+                        crossAxisAlignment: CrossAxisAlignment.start,
+                        children: dishes.map((d) {
+                          final name = d['name'] ?? '-';
+                          final qty = d['qty']?.toString() ?? '';
+                          return Text(
+                            "• $name ${qty.isNotEmpty ? '($qty)' : ''}",
+                          );
+                        }).toList(),
+                      ),
+                    );
+                  }).toList(),
+                ),
+              );
+            }).toList(),
+          );
+        },
+      ),
     );
   }
 }
@@ -820,7 +820,10 @@ class DietProvider extends ChangeNotifier {
     }
   }
 
-  void loadHistoricalDiet(Map<String, dynamic> dietData) {
+  Future<void> loadHistoricalDiet(Map<String, dynamic> dietData) async {
+    if (dietData['plan'] == null && dietData['dietRef'] != null) {
+      dietData = await _repository.getDiet(dietData['id']);
+    }
     _dietData = dietData['plan'];
     _substitutions = dietData['substitutions'];
     _storage.saveDiet({'plan': _dietData, 'substitutions': _substitutions});
@@ -23,6 +23,12 @@ class DietRepository {
     return DietPlan.fromJson(response);
   }
 
+  // Diets saved without an inline plan (only dietRef) are resolved by the server
+  Future<Map<String, dynamic>> getDiet(String dietId) async {
+    final response = await _client.getJson('/diet/$dietId');
+    return response as Map<String, dynamic>;
+  }
+
   Future<List<dynamic>> scanReceipt(
     String filePath,
     List<String> allowedFoods,
@@ -103,13 +103,23 @@ class HistoryScreen extends StatelessWidget {
                             child: const Text("Annulla"),
                           ),
                           FilledButton(
-                            onPressed: () {
-                              context.read<DietProvider>().loadHistoricalDiet(
-                                diet,
-                              );
+                            onPressed: () async {
+                              final messenger = ScaffoldMessenger.of(context);
                               Navigator.pop(c);
-                              Navigator.pop(context);
-                              ScaffoldMessenger.of(context).showSnackBar(
+                              try {
+                                await context
+                                    .read<DietProvider>()
+                                    .loadHistoricalDiet(diet);
+                              } catch (e) {
+                                messenger.showSnackBar(
+                                  SnackBar(
+                                    content: Text(ErrorMapper.toUserMessage(e)),
+                                  ),
+                                );
+                                return;
+                              }
+                              if (context.mounted) Navigator.pop(context);
+                              messenger.showSnackBar(
                                 const SnackBar(
                                   content: Text(
                                     "Dieta ripristinata con successo!",
@@ -5,6 +5,7 @@ import 'package:http/http.dart' as http;
 import 'package:retry/retry.dart';
 import 'package:flutter/foundation.dart';
 import '../core/env.dart';
+import 'auth_service.dart';
 
 // Eccezione per errori di business (es. 400, 500, dati non validi)
 class ApiException implements Exception {
@@ -56,6 +57,38 @@ class ApiClient {
     }
   }
 
+  Future<dynamic> getJson(String endpoint) async {
+    final uri = Uri.parse('${Env.apiUrl}$endpoint');
+    final token = await AuthService().getToken();
+    try {
+      final response = await http
+          .get(
+            uri,
+            headers: {
+              'Accept': 'application/json',
+              if (token != null) 'Authorization': 'Bearer $token',
+            },
+          )
+          .timeout(
+            const Duration(seconds: 30),
+            onTimeout: () {
+              throw NetworkException(
+                "Il server non risponde. Connessione lenta.",
+              );
+            },
+          );
+      if (response.statusCode >= 200 && response.statusCode < 300) {
+        return json.decode(utf8.decode(response.bodyBytes));
+      }
+      throw ApiException(
+        "Errore HTTP ${response.statusCode}",
+        response.statusCode,
+      );
+    } on SocketException {
+      throw NetworkException("Nessuna connessione internet.");
+    }
+  }
+
   Future<dynamic> _performUpload(
     String endpoint,
     String filePath,
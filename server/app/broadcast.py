@@ -1,14 +1,15 @@
 import firebase_admin
+import structlog
 from firebase_admin import messaging
 
-def broadcast_message(title: str, body: str, data: dict = None):
-    """
-    Sends a notification to the 'all_users' topic.
-    Ensure your Flutter app subscribes to 'all_users' on startup.
-    """
-    topic = 'all_users'
+from app.core.metrics import span
+
+logger = structlog.get_logger()
+
+BROADCAST_TOPIC = 'all_users'
 
-    message = messaging.Message(
+def broadcast_payload(title: str, body: str, data: dict = None, topic: str = BROADCAST_TOPIC) -> messaging.Message:
+    return messaging.Message(
         notification=messaging.Notification(
             title=title,
             body=body,
@@ -17,10 +18,19 @@ def broadcast_message(title: str, body: str, data: dict = None):
         topic=topic,
     )
 
+def broadcast_message(title: str, body: str, data: dict = None):
+    """
+    Sends a notification to the 'all_users' topic.
+    Ensure your Flutter app subscribes to 'all_users' on startup.
+    """
+    topic = BROADCAST_TOPIC
+    message = broadcast_payload(title, body, data, topic)
+
     try:
-        response = messaging.send(message)
-        print('Successfully sent message:', response)
+        with span("fcm_broadcast", topic=topic):
+            response = messaging.send(message)
+        logger.info("broadcast_sent", topic=topic, message_id=response)
         return response
     except Exception as e:
-        print('Error sending message:', e)
+        logger.error("broadcast_error", topic=topic, error=str(e))
         raise e
\ No newline at end of file
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# Roles verify_admin lets through; these are never taken from the token alone
+PRIVILEGED_ROLES = ('admin', 'nutritionist')
+
+
+class RoleCache:
+    """
+    uid -> role lookups for verify_admin: a short-TTL cache of users/{uid}, so
+    the dashboard's bursts of admin calls don't each cost a Firestore read.
+    The cache is per process: a demotion made on another worker or replica is
+    seen here once the entry expires (ROLE_CACHE_TTL_SECONDS).
+    """
+
+    def __init__(self, ttl: int = settings.ROLE_CACHE_TTL_SECONDS, maxsize: int = settings.ROLE_CACHE_MAX_ENTRIES):
+        self._roles = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, uid: str) -> Optional[str]:
+        return self._roles.get(uid)
+
+    def set(self, uid: str, role: Optional[str]) -> None:
+        self._roles.set(uid, role or "")
+
+    def invalidate(self, uid: str) -> None:
+        # Called by every endpoint that changes a user's role or existence
+        self._roles.pop(uid)
+
+    def stats(self) -> dict:
+        return self._roles.stats()
+
+
+role_cache = RoleCache()
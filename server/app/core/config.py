@@ -6,6 +6,15 @@ class Settings(BaseSettings):
     # Loads from .env automatically
     GOOGLE_API_KEY: str = ""
     GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    GEMINI_MAX_CONNECTIONS: int = 20
+    GEMINI_KEEPALIVE_SECONDS: float = 60.0
+    GEMINI_TIMEOUT_SECONDS: float = 120.0
+
+    # Server-side context caching of long system prompts
+    PROMPT_CACHE_ENABLED: bool = True
+    PROMPT_CACHE_TTL_SECONDS: int = 3600
+    PROMPT_CACHE_MIN_CHARS: int = 4000
+    PROMPT_CACHE_RETRY_SECONDS: int = 600
     
     # [SECURITY FIX] Strict CORS Policy
     # Add your Flutter Web production domain here
@@ -20,11 +29,122 @@ class Settings(BaseSettings):
         "https://app.kybo.it"
     ]
 
+    # Auth
+    FIREBASE_PROJECT_ID: str = ""
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    TOKEN_CLOCK_SKEW_SECONDS: int = 0
+    ROLE_CACHE_TTL_SECONDS: int = 60
+    ROLE_CACHE_MAX_ENTRIES: int = 4096
+    # Firebase Auth / FCM calls (no async API) run on their own bounded executor
+    FIREBASE_EXECUTOR_WORKERS: int = 8
+
     # Paths
     DIET_PDF_PATH: str = "temp_dieta.pdf"
     RECEIPT_PATH_PREFIX: str = "temp_scontrino"
     DIET_JSON_PATH: str = "dieta.json"
 
+    # Parsed diet cache (memory LRU + disk)
+    DIET_CACHE_ENABLED: bool = True
+    DIET_CACHE_DIR: str = ".cache/diets"
+    DIET_CACHE_MEMORY_ITEMS: int = 128
+    DIET_CACHE_DISK_MAX_MB: int = 256
+    DIET_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Parsed plans stored once per content hash (zlib, chunked above DIET_BLOB_CHUNK_BYTES); records keep a dietRef
+    DIET_BLOB_COLLECTION: str = "diet_blobs"
+    DIET_BLOB_CHUNK_BYTES: int = 900 * 1024
+    DIET_BLOB_COMPRESSION_LEVEL: int = 6
+    DIET_BLOB_MEMORY_ITEMS: int = 64
+    # Also write plan/substitutions inline on users/{uid}/diets, for app versions that don't resolve dietRef
+    # yet (current ones load it from GET /diet/{id} and /admin/diet/{uid}/{id}). Turn off once those are
+    # gone: records then carry only the dietRef. Plans above DIET_INLINE_MAX_BYTES are never inlined
+    DIET_INLINE_LEGACY_FIELDS: bool = True
+    DIET_INLINE_MAX_BYTES: int = 512 * 1024
+    # GET /diet/* answers from memory (304 on matching ETag); upload invalidates, TTL bounds other writers
+    DIET_VIEW_CACHE_TTL_SECONDS: int = 300
+    DIET_VIEW_CACHE_MAX_ENTRIES: int = 4096
+
+    # Deterministic parser for known PDF templates (JSON files); Gemini is the fallback.
+    # No layouts ship with the server: point DIET_TEMPLATES_DIR at ones verified against real exports
+    # (benchmarks/diet_templates only describes the synthetic benchmark fixtures)
+    DIET_TEMPLATES_ENABLED: bool = False
+    DIET_TEMPLATES_DIR: str = ""
+
+    # Long diets (extracted text above DIET_CHUNK_MIN_CHARS) are parsed as concurrent chunks
+    DIET_CHUNK_MIN_CHARS: int = 60000
+    DIET_CHUNK_TARGET_CHARS: int = 25000
+    DIET_CHUNK_CONCURRENCY: int = 4
+
+    # Uploads are kept in memory; only larger files spill to this directory (tmpfs)
+    UPLOAD_SPOOL_MAX_BYTES: int = 4 * 1024 * 1024
+    UPLOAD_SPOOL_DIR: str = "/dev/shm"
+
+    # CPU-bound work (PDF extraction, OCR). 0 = one worker per CPU
+    PROCESS_POOL_WORKERS: int = 0
+    PDF_PARALLEL_MIN_PAGES: int = 4
+    PDF_PAGES_PER_CHUNK: int = 2
+
+    # Receipt OCR
+    OCR_TARGET_DPI: int = 300
+    OCR_STRIP_HEIGHT: int = 800
+    OCR_TESSERACT_CONFIG: str = "--psm 4"
+
+    # Rescans of the same receipt, per user: file hash / perceptual hash -> OCR text, OCR text + foods -> items
+    RECEIPT_CACHE_ENABLED: bool = True
+    RECEIPT_CACHE_TTL_SECONDS: int = 6 * 3600
+    RECEIPT_TEXT_CACHE_ITEMS: int = 512
+    RECEIPT_RESULT_CACHE_ITEMS: int = 1024
+    # Bits (of 4096) two photos' dHashes may differ by and still count as the same receipt; -1 disables
+    RECEIPT_PHASH_MAX_DISTANCE: int = 96
+
+    # Local receipt-line matching against allowed foods (thefuzz score 0-100)
+    FOOD_MATCH_THRESHOLD: int = 90
+    FOOD_MATCH_CANDIDATES: int = 5
+    FOOD_INDEX_CACHE_SIZE: int = 64
+    FOOD_INDEX_CACHE_TTL_SECONDS: int = 3600
+
+    # Background job queue (async diet parsing)
+    JOB_QUEUE_DB_PATH: str = ".cache/jobs.sqlite3"
+    JOB_UPLOAD_DIR: str = ".cache/job_uploads"
+    JOB_WORKERS: int = 2
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_STALE_SECONDS: int = 120
+    JOB_RETENTION_HOURS: int = 24
+
+    # FCM pushes are queued and sent in send_each batches (max 500), retried with exponential backoff
+    NOTIFY_QUEUE_MAX_SIZE: int = 10000
+    NOTIFY_BATCH_SIZE: int = 500
+    NOTIFY_BATCH_WINDOW_MS: int = 50
+    NOTIFY_MAX_ATTEMPTS: int = 5
+    NOTIFY_BACKOFF_SECONDS: float = 1.0
+    NOTIFY_BACKOFF_MAX_SECONDS: float = 60.0
+    # Tokens FCM reported as unregistered are not sent to again for this long
+    NOTIFY_DEAD_TOKEN_TTL_SECONDS: int = 30 * 24 * 3600
+    NOTIFY_DEAD_TOKEN_MAX_ENTRIES: int = 100000
+
+    # config/global is mirrored in memory via a Firestore listener; polling only if it drops
+    CONFIG_LISTENER_ENABLED: bool = True
+    CONFIG_POLL_SECONDS: int = 60
+
+    # Rate-limit counters shared by all workers: sqlite:///<path> (one host), redis://... (replicas), memory://
+    RATE_LIMIT_STORAGE_URI: str = "sqlite:///.cache/ratelimit.sqlite3"
+
+    # JSON responses above this size are gzip/brotli-compressed when the client accepts it
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 6
+    RESPONSE_BROTLI_QUALITY: int = 4
+
+    # Leader election for scheduled jobs: "file" (one host), "firestore" (replicas), "none"
+    LEADER_BACKEND: str = "file"
+    LEADER_LEASE_SECONDS: int = 15
+    LEADER_LOCK_DIR: str = ".cache/leases"
+
+    # Prometheus /metrics (empty token = no auth: keep the endpoint on a private network)
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: str = ""
+    # Spans and requests slower than this are also logged with their request_id
+    METRICS_SPAN_LOG_MIN_MS: float = 250.0
+
     # Keywords
     MEAL_MAPPING: dict = {
         "prima colazione": "Colazione",
@@ -0,0 +1,76 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import structlog
+from firebase_admin import firestore_async
+
+from app.core.config import settings
+from app.core.metrics import span
+
+logger = structlog.get_logger()
+
+
+class FirebaseIO:
+    """
+    The only way request handlers reach Firebase.
+
+    - Firestore goes through the SDK's AsyncClient (grpc.aio): gets, writes,
+      queries and batches are awaited on the event loop, no thread involved.
+    - Auth and FCM have no async API; their calls run on a dedicated, bounded
+      executor (FIREBASE_EXECUTOR_WORKERS), so a burst of admin actions can
+      neither freeze the loop nor starve the threadpool used by uploads.
+    """
+
+    def __init__(self, workers: int = settings.FIREBASE_EXECUTOR_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self.calls = 0
+        self.failures = 0
+
+    @property
+    def db(self):
+        # Looked up per call: firebase_admin caches the client per app (and tests can swap it)
+        return firestore_async.client()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="firebase-admin")
+        return self._executor
+
+    async def call(self, stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs a blocking firebase_admin call (auth.*, messaging.*) on the bounded executor."""
+        loop = asyncio.get_running_loop()
+        self._queued += 1
+        self.calls += 1
+        try:
+            with span(stage):
+                return await loop.run_in_executor(self._get_executor(), functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self._queued -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._queued,
+            "calls": self.calls,
+            "failures": self.failures,
+        }
+
+
+firebase_io = FirebaseIO()
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import structlog
+from firebase_admin import firestore
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class LeaderLease(ABC):
+    """
+    Leader election for work that must run in exactly one process
+    (scheduled maintenance), however many uvicorn workers or replicas are up.
+
+    start() keeps trying to acquire the lease in the background; is_leader
+    flips as it is won, renewed or lost. A crashed leader is replaced within
+    one lease period.
+    """
+
+    def __init__(self, name: str, lease_seconds: int = settings.LEADER_LEASE_SECONDS):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._leader = False
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._leader:
+            try:
+                await asyncio.to_thread(self._release)
+            except Exception as e:
+                logger.warning("leader_release_failed", lease=self.name, error=str(e))
+        self._set_leader(False)
+
+    async def _loop(self) -> None:
+        # Renew well inside the lease so one slow round-trip doesn't cost leadership
+        interval = max(1.0, self.lease_seconds / 3)
+        while True:
+            started = time.time()
+            try:
+                acquired = await asyncio.to_thread(self._try_acquire)
+                if acquired:
+                    self._renewed_at = started
+            except Exception as e:
+                logger.warning("leader_lease_error", lease=self.name, error=str(e))
+                # Backend unreachable: keep leading only while the last renewal is still valid
+                acquired = self._leader and started - self._renewed_at < self.lease_seconds
+            self._set_leader(acquired)
+            await asyncio.sleep(interval)
+
+    def _set_leader(self, leader: bool) -> None:
+        if leader != self._leader:
+            logger.info("leader_changed", lease=self.name, holder=self.holder_id, leader=leader)
+        self._leader = leader
+
+    @abstractmethod
+    def _try_acquire(self) -> bool:
+        """Acquire or renew the lease (blocking, runs in a thread); True while held."""
+
+    @abstractmethod
+    def _release(self) -> None:
+        """Give the lease up so another process can take it without waiting for expiry."""
+
+
+class LocalLease(LeaderLease):
+    """Always leader: single-process deployments."""
+
+    def _try_acquire(self) -> bool:
+        return True
+
+    def _release(self) -> None:
+        pass
+
+
+class FileLockLease(LeaderLease):
+    """
+    flock() on a shared file: for all the workers of one host, and for tests.
+    The kernel drops the lock when the holder dies, so failover takes at most
+    one retry interval.
+    """
+
+    def __init__(self, name: str, lock_dir: str = settings.LEADER_LOCK_DIR, **kwargs):
+        super().__init__(name, **kwargs)
+        os.makedirs(lock_dir, exist_ok=True)
+        self.path = os.path.join(lock_dir, f"{name}.lock")
+        self._fd: Optional[int] = None
+
+    def _try_acquire(self) -> bool:
+        import fcntl
+
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, self.holder_id.encode())
+        self._fd = fd
+        return True
+
+    def _release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class FirestoreLease(LeaderLease):
+    """
+    Heartbeated lease document (leases/{name}): for replicas on several hosts.
+    The holder renews expires_at every lease_seconds / 3 inside a transaction;
+    anyone may take over an expired lease.
+    """
+
+    def __init__(self, name: str, collection: str = "leases", **kwargs):
+        super().__init__(name, **kwargs)
+        self.collection = collection
+
+    def _try_acquire(self) -> bool:
+        db = firestore.client()
+        doc_ref = db.collection(self.collection).document(self.name)
+
+        @firestore.transactional
+        def claim(transaction) -> bool:
+            snapshot = doc_ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else {}
+            now = time.time()
+            if data.get("holder") not in (None, self.holder_id) and data.get("expires_at", 0) > now:
+                return False
+            transaction.set(doc_ref, {"holder": self.holder_id, "expires_at": now + self.lease_seconds})
+            return True
+
+        return claim(db.transaction())
+
+    def _release(self) -> None:
+        doc_ref = firestore.client().collection(self.collection).document(self.name)
+        snapshot = doc_ref.get()
+        if snapshot.exists and (snapshot.to_dict() or {}).get("holder") == self.holder_id:
+            doc_ref.delete()
+
+
+def create_lease(name: str, backend: str = settings.LEADER_BACKEND) -> LeaderLease:
+    if backend == "firestore":
+        return FirestoreLease(name)
+    if backend == "file":
+        return FileLockLease(name)
+    return LocalLease(name)
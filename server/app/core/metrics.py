@@ -0,0 +1,206 @@
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+import structlog
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, disable_created_metrics, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# No *_created series: a third of the scrape size, unused by our dashboards
+disable_created_metrics()
+
+# Upload stages range from sub-millisecond (auth) to minutes (long Gemini parses)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "kybo_http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge("kybo_http_requests_in_flight", "HTTP requests being served", multiprocess_mode="livesum")
+STAGE_SECONDS = Histogram(
+    "kybo_stage_duration_seconds", "Latency of one pipeline stage (see span())",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter("kybo_stage_errors_total", "Pipeline stages that raised", ["stage", "error"])
+GEMINI_IN_FLIGHT = Gauge("kybo_gemini_in_flight", "Gemini calls awaiting a response", multiprocess_mode="livesum")
+
+# stats() keys that only ever grow; every other number is exported as a gauge
+COUNTER_STATS = {
+    "hits", "misses", "evictions", "attempts", "rejected", "created", "reused", "refreshed",
+    "evicted", "reads", "pushes", "verifications", "failures", "key_refreshes", "disk_hits", "disk_misses",
+    "calls", "written", "deduplicated", "bytes_raw", "bytes_stored",
+    "enqueued", "coalesced", "batches", "sent", "retried", "failed", "dropped", "pruned", "skipped_dead",
+    "phash_hits",
+}
+
+
+@contextmanager
+def span(stage: str, **fields) -> Iterator[None]:
+    """
+    Times one pipeline stage into kybo_stage_duration_seconds{stage}.
+    Failures are counted per exception type; slow or failed spans are also
+    logged (structlog "span" event, with the request_id bound by the middleware).
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        STAGE_ERRORS.labels(stage, error).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        if error:
+            logger.warning("span", stage=stage, duration_ms=round(elapsed * 1000, 1), error=error, **fields)
+        elif elapsed * 1000 >= settings.METRICS_SPAN_LOG_MIN_MS:
+            logger.info("span", stage=stage, duration_ms=round(elapsed * 1000, 1), **fields)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware: streaming bodies pass through
+    untouched). Labels requests with the matched route template, not the raw
+    path, so /upload-diet/{target_uid} stays a single series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        structlog.contextvars.bind_contextvars(request_id=uuid.uuid4().hex[:12], path=scope["path"])
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+            if elapsed * 1000 >= settings.METRICS_SPAN_LOG_MIN_MS:
+                logger.info("http_request", method=scope["method"], route=route, status=status, duration_ms=round(elapsed * 1000, 1))
+            structlog.contextvars.clear_contextvars()
+
+
+def _flatten(prefix: str, data: dict):
+    """Yields (metric name, leaf key, value, label) for every number in a nested stats() dict."""
+    for key, value in data.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            if key.startswith("by_"):
+                yield name, key, value, key[3:]
+            else:
+                yield from _flatten(name, value)
+        elif isinstance(value, (bool, int, float)):
+            yield name, key, value, None
+
+
+class StatsCollector:
+    """
+    Exports the stats() dicts of the caches and services at scrape time, so
+    their counters cost nothing on the request path. Nested dicts are
+    flattened (kybo_<source>_<key>_<subkey>); a "by_<label>" dict becomes one
+    metric labelled by <label>; keys in COUNTER_STATS are counters.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, stats: Callable[[], dict]) -> None:
+        self._sources[name] = stats
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        for source, stats in list(self._sources.items()):
+            try:
+                data = stats()
+            except Exception as e:
+                logger.warning("metrics_stats_failed", source=source, error=str(e))
+                continue
+            for name, key, value, label in _flatten(f"kybo_{source}", data):
+                help_text = f"{source} stats(): {key}"
+                if label:
+                    family = CounterMetricFamily(name, help_text, labels=[label])
+                    for item, count in value.items():
+                        family.add_metric([str(item)], count)
+                elif key in COUNTER_STATS:
+                    family = CounterMetricFamily(name, help_text, value=value)
+                else:
+                    family = GaugeMetricFamily(name, help_text, value=float(value))
+                yield family
+
+
+class ConcurrencyCollector:
+    """
+    Occupancy of the three places blocking work queues up: the anyio
+    threadpool (run_in_threadpool, sync endpoints), the event loop's default
+    executor (asyncio.to_thread) and the process pool. Read at scrape time,
+    from the event loop (the /metrics endpoint is async).
+    """
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        import asyncio
+
+        import anyio.to_thread
+
+        from app.core.workers import process_pool_stats
+
+        try:
+            limiter = anyio.to_thread.current_default_thread_limiter()
+            statistics = limiter.statistics()
+            yield GaugeMetricFamily("kybo_threadpool_size", "run_in_threadpool token limit", value=limiter.total_tokens)
+            yield GaugeMetricFamily("kybo_threadpool_busy", "run_in_threadpool tokens in use", value=statistics.borrowed_tokens)
+            yield GaugeMetricFamily("kybo_threadpool_waiting", "Calls queued for a run_in_threadpool token", value=statistics.tasks_waiting)
+        except RuntimeError:  # not on the event loop
+            pass
+        try:
+            executor = asyncio.get_running_loop()._default_executor
+        except RuntimeError:
+            executor = None
+        if executor is not None:
+            yield GaugeMetricFamily("kybo_to_thread_workers", "asyncio.to_thread worker threads", value=len(executor._threads))
+            yield GaugeMetricFamily("kybo_to_thread_queued", "asyncio.to_thread calls waiting for a thread", value=executor._work_queue.qsize())
+        pool = process_pool_stats()
+        yield GaugeMetricFamily("kybo_process_pool_workers", "Process pool size", value=pool["workers"])
+        yield GaugeMetricFamily("kybo_process_pool_pending", "Process pool tasks queued or running", value=pool["pending"])
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+REGISTRY.register(ConcurrencyCollector())
+
+
+def render_metrics() -> bytes:
+    """Prometheus text format. With PROMETHEUS_MULTIPROC_DIR set, histograms and counters cover every worker."""
+    registry: Optional[CollectorRegistry] = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(stats_collector)
+    return generate_latest(registry)
+
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+from slowapi.util import get_remote_address
+from starlette.requests import Request
+
+# Expired rows are swept once every this many increments
+PURGE_EVERY = 1000
+
+
+class SQLiteStorage(Storage):
+    """
+    `limits` storage shared by every process on the host: fixed-window counters
+    in a SQLite file (WAL), one UPSERT per hit.
+
+        sqlite:///.cache/ratelimit.sqlite3     (relative path)
+        sqlite:////var/lib/kybo/ratelimit.db   (absolute path)
+
+    Importing this module registers the "sqlite" scheme with `limits`.
+    For several hosts use a redis:// URI (needs the `redis` package).
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len("sqlite:///"):] or ":memory:"
+        db_dir = os.path.dirname(self.path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        with self._lock:
+            # A window that has run out restarts from `amount`
+            row = self._conn.execute(
+                """
+                INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END,
+                    expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END
+                RETURNING value
+                """,
+                (key, amount, now + expiry, now, now),
+            ).fetchone()
+            self._hits += 1
+            if self._hits % PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+        return row[0]
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM counters WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+
+def rate_limit_key(request: Request) -> str:
+    # verify_token stores the uid: users behind one carrier NAT get separate buckets
+    uid = getattr(request.state, "uid", None)
+    if uid:
+        return f"uid:{uid}"
+    return f"ip:{get_remote_address(request)}"
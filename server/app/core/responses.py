@@ -0,0 +1,55 @@
+import gzip
+from typing import Any, Optional, Set
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+def _pick_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def json_response(request: Request, content: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """
+    orjson-encoded JSON, compressed when large and the client accepts it.
+
+    Returning a Response skips FastAPI's response_model re-validation and its
+    stdlib encoder; callers pass data that already has the declared shape.
+    """
+    body = orjson.dumps(content)
+    headers = {"Vary": "Accept-Encoding", **(headers or {})}
+    encoding = None
+    if len(body) >= settings.RESPONSE_COMPRESSION_MIN_BYTES:
+        encoding = _pick_encoding(request.headers.get("accept-encoding", ""))
+    if encoding == "br":
+        body = brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def if_none_match(request: Request) -> Set[str]:
+    """Opaque tags of the If-None-Match header (weak comparison, so W/ is dropped); "*" kept as is."""
+    tags = set()
+    for tag in request.headers.get("if-none-match", "").split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.add(tag.strip('"') if tag != "*" else tag)
+    return tags
@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Dict, Optional
+
+import firebase_admin
+import httpx
+import jwt
+import structlog
+from cryptography.x509 import load_pem_x509_certificate
+from fastapi.concurrency import run_in_threadpool
+from firebase_admin import auth
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class TokenVerificationError(Exception):
+    pass
+
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens on the event loop, without a threadpool hop.
+
+    - Google's signing keys are fetched asynchronously and cached for the
+      Cache-Control max-age of the response (refetched early on an unknown kid).
+    - Already-verified tokens are kept in a bounded LRU until their own 'exp'.
+    - Same checks as auth.verify_id_token (check_revoked=False): RS256 signature,
+      aud/iss against the project id, exp/iat/auth_time, non-empty 'sub'.
+    Falls back to auth.verify_id_token when the project id cannot be determined.
+    """
+
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        cache_size: int = settings.TOKEN_CACHE_MAX_ENTRIES,
+        clock_skew: int = settings.TOKEN_CLOCK_SKEW_SECONDS,
+    ):
+        self._project_id = project_id
+        self.clock_skew = clock_skew
+        self._tokens = TTLCache(maxsize=cache_size)
+        self._keys: Dict[str, object] = {}
+        self._keys_expire_at = 0.0
+        self._last_forced_refresh = 0.0
+        self._keys_lock: Optional[asyncio.Lock] = None
+        self.verifications = 0
+        self.failures = 0
+        self.verify_seconds_total = 0.0
+        self.key_refreshes = 0
+
+    @property
+    def project_id(self) -> Optional[str]:
+        if self._project_id is None:
+            project_id = settings.FIREBASE_PROJECT_ID or os.getenv("GOOGLE_CLOUD_PROJECT")
+            if not project_id and firebase_admin._apps:
+                project_id = firebase_admin.get_app().project_id
+            self._project_id = project_id or ""
+        return self._project_id or None
+
+    # --- KEYS ---
+
+    def set_keys(self, certs: Dict[str, str], max_age: float) -> None:
+        """Installs a kid -> PEM certificate mapping (also used by benchmarks)."""
+        self._keys = {kid: load_pem_x509_certificate(pem.encode()).public_key() for kid, pem in certs.items()}
+        self._keys_expire_at = time.monotonic() + max_age
+
+    async def _refresh_keys(self) -> None:
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(GOOGLE_CERTS_URL)
+            response.raise_for_status()
+        match = _MAX_AGE_RE.search(response.headers.get("cache-control", ""))
+        self.set_keys(response.json(), int(match.group(1)) if match else 3600)
+        self.key_refreshes += 1
+        logger.info("token_keys_refreshed", keys=len(self._keys))
+
+    async def _get_key(self, kid: str):
+        if self._keys_lock is None:
+            self._keys_lock = asyncio.Lock()
+        key = self._keys.get(kid)
+        expired = time.monotonic() >= self._keys_expire_at
+        # Unknown kid: Google may have rotated early; allow at most one forced refresh a minute
+        rotated = key is None and time.monotonic() - self._last_forced_refresh > 60
+        if expired or rotated:
+            async with self._keys_lock:
+                if time.monotonic() >= self._keys_expire_at or kid not in self._keys:
+                    if kid not in self._keys:
+                        self._last_forced_refresh = time.monotonic()
+                    await self._refresh_keys()
+            key = self._keys.get(kid)
+        if key is None:
+            raise TokenVerificationError("Unknown signing key")
+        return key
+
+    # --- VERIFICATION ---
+
+    def _decode(self, token: str, key, project_id: str) -> dict:
+        claims = jwt.decode(
+            token,
+            key=key,
+            algorithms=["RS256"],
+            audience=project_id,
+            issuer=f"https://securetoken.google.com/{project_id}",
+            leeway=self.clock_skew,
+            options={"require": ["exp", "iat", "sub"]},
+        )
+        now = time.time()
+        sub = claims.get("sub")
+        if not isinstance(sub, str) or not sub or len(sub) > 128:
+            raise TokenVerificationError("Invalid 'sub' claim")
+        if claims["iat"] > now + self.clock_skew:
+            raise TokenVerificationError("Token used before issued")
+        if claims.get("auth_time", 0) > now + self.clock_skew:
+            raise TokenVerificationError("Invalid 'auth_time' claim")
+        claims["uid"] = sub
+        return claims
+
+    async def verify(self, token: str) -> dict:
+        cache_key = hashlib.sha256(token.encode()).digest()
+        cached = self._tokens.get(cache_key)
+        if cached is not None and cached["exp"] > time.time() - self.clock_skew:
+            return cached
+
+        start = time.perf_counter()
+        try:
+            project_id = self.project_id
+            if not project_id:
+                claims = await run_in_threadpool(auth.verify_id_token, token)
+            else:
+                header = jwt.get_unverified_header(token)
+                if header.get("alg") != "RS256" or not header.get("kid"):
+                    raise TokenVerificationError("Invalid token header")
+                key = await self._get_key(header["kid"])
+                claims = self._decode(token, key, project_id)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.verifications += 1
+            self.verify_seconds_total += time.perf_counter() - start
+
+        ttl = claims["exp"] - time.time()
+        if ttl > 0:
+            self._tokens.set(cache_key, claims, ttl=ttl)
+        return claims
+
+    def stats(self) -> dict:
+        return {
+            "cache": self._tokens.stats(),
+            "verifications": self.verifications,
+            "failures": self.failures,
+            "avg_verify_ms": round(1000 * self.verify_seconds_total / self.verifications, 3) if self.verifications else 0.0,
+            "key_refreshes": self.key_refreshes,
+        }
+
+
+token_verifier = FirebaseTokenVerifier()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+from typing import BinaryIO, Optional, Union
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+
+MAX_FILE_SIZE = 10 * 1024 * 1024
+
+# A path on disk, raw bytes/memoryview, or any readable binary file object
+UploadSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+
+def _spool_dir() -> Optional[str]:
+    spool_dir = settings.UPLOAD_SPOOL_DIR
+    return spool_dir if spool_dir and os.path.isdir(spool_dir) else None
+
+
+async def spool_upload_file(file: UploadFile) -> tempfile.SpooledTemporaryFile:
+    """
+    Streams an upload into memory, enforcing MAX_FILE_SIZE as it goes.
+    Only uploads above UPLOAD_SPOOL_MAX_BYTES spill to UPLOAD_SPOOL_DIR (tmpfs by default);
+    the spilled file is anonymous, so nothing is left behind if the process dies.
+    The caller owns the returned buffer and must close() it.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_BYTES, dir=_spool_dir())
+    size = 0
+    try:
+        while content := await file.read(1024 * 1024):
+            size += len(content)
+            if size > MAX_FILE_SIZE:
+                raise HTTPException(status_code=413, detail="File too large")
+            buffer.write(content)
+        buffer.seek(0)
+        return buffer
+    except Exception:
+        buffer.close()
+        raise
+
+
+def read_source(source: UploadSource) -> bytes:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    source.seek(0)
+    return source.read()
+
@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, List, Optional
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def process_pool_size() -> int:
+    return settings.PROCESS_POOL_WORKERS or os.cpu_count() or 1
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Process-wide pool for CPU-bound work (PDF text extraction, OCR) that would
+    otherwise hold the GIL and stall the event loop and threadpool.
+    Uses 'spawn' so workers never inherit gRPC/Firebase state from a fork.
+    """
+    global _process_pool
+    if _process_pool is None:
+        with _pool_lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=process_pool_size(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+def _discard_broken_pool(pool: ProcessPoolExecutor) -> None:
+    # Only the caller that saw this pool break replaces it; others already get the new one
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_in_process_pool(fn: Callable, arg_tuples: Iterable[tuple]) -> List:
+    """
+    Runs fn(*args) for each tuple on the shared pool and returns the results in
+    order. A worker that dies (OOM kill, segfault in a native library) breaks
+    the whole executor: the broken pool is shut down and replaced, and the
+    batch is retried once on the fresh one.
+    """
+    arg_tuples = list(arg_tuples)
+    for attempt in (1, 2):
+        pool = get_process_pool()
+        try:
+            futures = [pool.submit(fn, *args) for args in arg_tuples]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            _discard_broken_pool(pool)
+            logger.warning("process_pool_broken", task=getattr(fn, "__name__", str(fn)), attempt=attempt)
+            if attempt == 2:
+                raise
+
+
+def process_pool_stats() -> dict:
+    # _pending_work_items holds submitted tasks until they finish (queued + running)
+    pool = _process_pool
+    return {
+        "workers": process_pool_size() if pool is not None else 0,
+        "pending": len(pool._pending_work_items) if pool is not None else 0,
+    }
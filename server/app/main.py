@@ -1,44 +1,57 @@
 import os
+import hmac
 import uuid
 import structlog
 import aiofiles
 import json
 import asyncio
-from datetime import datetime, timezone
+import orjson
 from typing import Optional, List, Dict
 
 import firebase_admin
 from firebase_admin import credentials, auth, firestore, messaging
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Header, Depends, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.concurrency import run_in_threadpool
 from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from pydantic import Json, BaseModel
+from prometheus_client import CONTENT_TYPE_LATEST
 
 # --- IMPORTS ---
 from app.services.diet_service import DietParser
 from app.services.receipt_service import ReceiptScanner
 from app.services.notification_service import NotificationService
-from app.services.normalization import normalize_meal_name
+from app.services.notification_dispatcher import notification_dispatcher
+from app.services.receipt_cache import receipt_cache
+from app.services.diet_format import format_day, format_substitutions, to_app_format
+from app.services.job_queue import JobQueue
+from app.services.gemini_gateway import gemini_gateway
+from app.services.user_sync import UserSyncEngine
+from app.services.prompt_cache import prompt_cache
+from app.services.config_cache import config_cache
+from app.services.diet_store import diet_blob_store, load_user_diet, user_diet_cache
 from app.core.config import settings
-from app.models.schemas import DietResponse, Dish, Ingredient, SubstitutionGroup, SubstitutionOption
-from app.broadcast import broadcast_message 
+from app.core.workers import shutdown_process_pool
+from app.core.uploads import MAX_FILE_SIZE, spool_upload_file
+from app.core.auth_cache import PRIVILEGED_ROLES, role_cache
+from app.core.token_verifier import token_verifier
+from app.core.leader import create_lease
+from app.core.rate_limit import rate_limit_key
+from app.core.responses import if_none_match, json_response
+from app.core.metrics import MetricsMiddleware, render_metrics, span, stats_collector
+from app.core.firebase_io import firebase_io
+from app.models.schemas import DietResponse
 
 # --- CONFIGURATION ---
-MAX_FILE_SIZE = 10 * 1024 * 1024
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".pdf", ".webp"}
-
-MEAL_ORDER = [
-    "Colazione", "Seconda Colazione", "Spuntino", "Pranzo",
-    "Merenda", "Cena", "Spuntino Serale", "Nell'Arco Della Giornata"
-]
+RECEIPT_SCAN_MODES = {"hybrid", "local_only", "llm"}
+DIET_STREAM_FORMATS = {"ndjson", "sse"}
 
 structlog.configure(
     processors=[
+        structlog.contextvars.merge_contextvars,
         structlog.processors.TimeStamper(fmt="iso"),
         structlog.processors.JSONRenderer()
     ],
@@ -60,7 +73,8 @@ if not firebase_admin._apps:
     except Exception as e:
         logger.error("firebase_init_critical_error", error=str(e))
 
-limiter = Limiter(key_func=get_remote_address)
+# [PERF] Counters live in shared storage so limits hold across workers; keyed per uid, IP fallback
+limiter = Limiter(key_func=rate_limit_key, storage_uri=settings.RATE_LIMIT_STORAGE_URI, in_memory_fallback_enabled=True)
 app = FastAPI()
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
@@ -72,9 +86,27 @@ app.add_middleware(
     allow_methods=["GET", "POST", "OPTIONS", "DELETE", "PUT"],
     allow_headers=["Authorization", "Content-Type"],
 )
+# [PERF] Per-route latency histograms + request_id bound for every log line of the request
+app.add_middleware(MetricsMiddleware)
 
 notification_service = NotificationService()
 diet_parser = DietParser()
+job_queue = JobQueue()
+# Scheduled jobs run in one process only, whatever --workers / replica count
+scheduler_lease = create_lease("scheduler")
+
+# Exported on /metrics, read at scrape time
+if diet_parser.cache: stats_collector.register("diet_cache", diet_parser.cache.stats)
+if diet_parser.templates: stats_collector.register("template_parser", diet_parser.templates.stats)
+stats_collector.register("prompt_cache", prompt_cache.stats)
+stats_collector.register("token_verifier", token_verifier.stats)
+stats_collector.register("role_cache", role_cache.stats)
+stats_collector.register("config_cache", config_cache.stats)
+stats_collector.register("firebase_executor", firebase_io.stats)
+stats_collector.register("diet_blobs", diet_blob_store.stats)
+stats_collector.register("diet_views", user_diet_cache.stats)
+stats_collector.register("notifications", notification_dispatcher.stats)
+stats_collector.register("receipt_cache", receipt_cache.stats)
 
 # --- SCHEMAS ---
 class CreateUserRequest(BaseModel):
@@ -131,25 +163,45 @@ def validate_extension(filename: str) -> str:
         raise HTTPException(status_code=400, detail="Invalid file type")
     return ext
 
-async def verify_token(authorization: str = Header(...)):
+async def verify_token_claims(request: Request, authorization: str = Header(...)) -> dict:
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid auth header")
     token = authorization.split("Bearer ")[1].strip()
     if not token:
          raise HTTPException(status_code=401, detail="Empty token")
     try:
-        decoded_token = await run_in_threadpool(auth.verify_id_token, token)
-        return decoded_token['uid'] 
+        # Local verification: cached signing keys + LRU of verified tokens, no threadpool hop
+        with span("auth"):
+            claims = await token_verifier.verify(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Authentication failed")
+    # Rate-limit key (rate_limit_key)
+    request.state.uid = claims['uid']
+    return claims
+
+async def verify_token(claims: dict = Depends(verify_token_claims)):
+    return claims['uid']
+
+async def _get_user_role(uid: str) -> Optional[str]:
+    user_doc = await firebase_io.db.collection('users').document(uid).get()
+    return (user_doc.to_dict() or {}).get('role') if user_doc.exists else None
 
-async def verify_admin(uid: str = Depends(verify_token)):
+async def verify_admin(claims: dict = Depends(verify_token_claims)):
+    uid = claims['uid']
     try:
-        db = firebase_admin.firestore.client()
-        user_doc = db.collection('users').document(uid).get()
-        if not user_doc.exists or user_doc.to_dict().get('role') != 'admin':
-            if user_doc.exists and user_doc.to_dict().get('role') == 'nutritionist':
-                 return uid
+        # 1. A non-privileged 'role' claim is enough to refuse. Privileged roles are
+        #    always confirmed against users/{uid} (2. short-TTL cache, 3. Firestore),
+        #    so a demoted or deleted user's old token stops working on every worker
+        #    within ROLE_CACHE_TTL_SECONDS, not when the token expires
+        if claims.get('role') and claims['role'] not in PRIVILEGED_ROLES:
+            raise HTTPException(status_code=403, detail="Admin privileges required")
+        role = role_cache.get(uid)
+        if role is None:
+            with span("firestore_read"):
+                role = await _get_user_role(uid)
+            role_cache.set(uid, role)
+
+        if role not in PRIVILEGED_ROLES:
             raise HTTPException(status_code=403, detail="Admin privileges required")
         return uid
     except HTTPException:
@@ -157,145 +209,357 @@ async def verify_admin(uid: str = Depends(verify_token)):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Authorization check failed")
 
-# --- BACKGROUND WORKER (SECURE SCHEDULER) ---
-
-async def maintenance_worker():
-    logger.info("maintenance_worker_started")
-    while True:
-        try:
-            db = firebase_admin.firestore.client()
-            doc_ref = db.collection('config').document('global')
-            doc = doc_ref.get()
-            
-            if doc.exists:
-                data = doc.to_dict()
-                is_scheduled = data.get('is_scheduled', False)
-                start_str = data.get('scheduled_maintenance_start')
-                
-                if is_scheduled and start_str:
-                    try:
-                        clean_str = start_str.replace('Z', '+00:00')
-                        scheduled_time = datetime.fromisoformat(clean_str)
-                        if scheduled_time.tzinfo is None:
-                            scheduled_time = scheduled_time.replace(tzinfo=timezone.utc)
-                        
-                        now = datetime.now(timezone.utc)
-                        if now >= scheduled_time:
-                            logger.info("maintenance_triggered", scheduled_for=start_str)
-                            doc_ref.update({
-                                "maintenance_mode": True,
-                                "is_scheduled": False,
-                                "scheduled_maintenance_start": firestore.DELETE_FIELD,
-                                "updated_by": "system_scheduler"
-                            })
-                    except Exception as e:
-                        logger.error("scheduler_error", error=str(e))
-        except Exception as e:
-            logger.error("worker_crash", error=str(e))
-        
-        await asyncio.sleep(60)
-
 @app.on_event("startup")
 async def start_background_tasks():
-    asyncio.create_task(maintenance_worker())
+    # [PERF] config/global is pushed by a Firestore listener; the scheduler arms a timer
+    await scheduler_lease.start()
+    await config_cache.start(leader=scheduler_lease)
+    await job_queue.start()
+    await notification_dispatcher.start()
+    await gemini_gateway.warmup()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await config_cache.stop()
+    await scheduler_lease.stop()
+    await job_queue.stop()
+    await notification_dispatcher.stop()
+    shutdown_process_pool()
+    firebase_io.shutdown()
+    await gemini_gateway.aclose()
+
+# --- DIET HELPERS & JOBS ---
+
+async def _get_custom_prompt(db, target_uid: str) -> Optional[str]:
+    user_doc = await db.collection('users').document(target_uid).get()
+    if user_doc.exists:
+        parent_id = user_doc.to_dict().get('parent_id')
+        if parent_id:
+            parent_doc = await db.collection('users').document(parent_id).get()
+            if parent_doc.exists: return parent_doc.to_dict().get('custom_parser_prompt')
+    return None
+
+async def _save_diet_records(db, target_uid: str, file_name: str, dict_data: dict, requester_id: str) -> None:
+    # [PERF] Both records in one batched commit (one round trip, all-or-nothing)
+    batch = db.batch()
+    # [PERF] The plan itself is stored once, compressed, by content hash; records reference it
+    blob_fields = await diet_blob_store.stage(db, batch, dict_data)
+
+    # 1. Save to Client History (User Subcollection): older app versions read the plan inline
+    client_ref = db.collection('users').document(target_uid).collection('diets').document()
+    client_diet = {
+        'uploadedAt': firebase_admin.firestore.SERVER_TIMESTAMP,
+        'uploadedBy': 'nutritionist',
+        **blob_fields,
+    }
+    if settings.DIET_INLINE_LEGACY_FIELDS and blob_fields['dietSize'] <= settings.DIET_INLINE_MAX_BYTES:
+        client_diet.update({'plan': dict_data.get('plan'), 'substitutions': dict_data.get('substitutions')})
+
+    # 2. Save to Admin History (Global): no plan of its own, the admin app follows clientDietId
+    history = {
+        'userId': target_uid,
+        'uploadedAt': firebase_admin.firestore.SERVER_TIMESTAMP,
+        'fileName': file_name,
+        'uploadedBy': requester_id,
+        'clientDietId': client_ref.id,
+        **blob_fields,
+    }
+
+    batch.set(db.collection('diet_history').document(), history)
+    batch.set(client_ref, client_diet)
+    await batch.commit()
+    diet_blob_store.committed(blob_fields['dietRef'], dict_data)
+    user_diet_cache.invalidate(target_uid)
+
+async def _run_diet_job(job_id: str, payload: dict, report) -> dict:
+    target_uid = payload.get('target_uid')
+    db = firebase_io.db if target_uid else None
+
+    report("parsing", 0.1)
+    custom_prompt = None
+    if target_uid:
+        with span("firestore_read"):
+            custom_prompt = await _get_custom_prompt(db, target_uid)
+    raw_data = await diet_parser.parse_complex_diet(payload['upload_path'], custom_prompt)
+
+    report("formatting", 0.8)
+    with span("format"):
+        dict_data = to_app_format(raw_data)
+
+    if target_uid:
+        report("saving", 0.9)
+        with span("firestore_write"):
+            await _save_diet_records(db, target_uid, payload['file_name'], dict_data, payload['requester_id'])
+
+    # The FCM push is the completion signal for clients not listening on /jobs
+    if payload.get('fcm_token'):
+        notification_dispatcher.send_diet_ready(payload['fcm_token'], {"job_id": job_id, "status": "done"})
+    return dict_data
+
+job_queue.register("diet", _run_diet_job)
+
+async def _run_sync_users_job(job_id: str, payload: dict, report) -> dict:
+    return await UserSyncEngine().run(payload.get('dry_run', False), report)
+
+job_queue.register("sync_users", _run_sync_users_job)
+
+async def _enqueue_diet_job(file: UploadFile, owner_uid: str, payload: dict) -> JSONResponse:
+    os.makedirs(settings.JOB_UPLOAD_DIR, exist_ok=True)
+    upload_path = os.path.join(settings.JOB_UPLOAD_DIR, f"{uuid.uuid4()}.pdf")
+    with span("upload_save"):
+        await save_upload_file(file, upload_path)
+    payload.update({'upload_path': upload_path, 'file_name': file.filename})
+    try:
+        job_id = job_queue.submit("diet", payload, owner_uid=owner_uid)
+    except Exception:
+        if os.path.exists(upload_path): os.remove(upload_path)
+        raise
+    return _job_accepted(job_id)
+
+def _job_accepted(job_id: str) -> JSONResponse:
+    return JSONResponse(status_code=202, content={
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events"
+    })
+
+def _job_view(job: dict) -> dict:
+    return {
+        "job_id": job['id'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "progress": job['progress'],
+        "error": job['error'],
+        "result": job['result'],
+    }
 
 # --- ENDPOINTS ---
 
 @app.post("/upload-diet", response_model=DietResponse)
 @limiter.limit("5/minute")
-async def upload_diet(request: Request, file: UploadFile = File(...), fcm_token: Optional[str] = Form(None), user_id: str = Depends(verify_token)):
+async def upload_diet(request: Request, file: UploadFile = File(...), fcm_token: Optional[str] = Form(None), async_mode: bool = Form(False), user_id: str = Depends(verify_token)):
     if not file.filename.lower().endswith('.pdf'): raise HTTPException(status_code=400, detail="Only PDF allowed")
-    temp_filename = f"{uuid.uuid4()}.pdf"
+    if async_mode:
+        return await _enqueue_diet_job(file, user_id, {'fcm_token': fcm_token})
+    with span("upload_save"):
+        upload = await spool_upload_file(file)
     try:
-        await save_upload_file(file, temp_filename)
-        raw_data = await run_in_threadpool(diet_parser.parse_complex_diet, temp_filename)
-        if fcm_token: await run_in_threadpool(notification_service.send_diet_ready, fcm_token)
-        return _convert_to_app_format(raw_data)
+        raw_data = await diet_parser.parse_complex_diet(upload)
+        if fcm_token: notification_dispatcher.send_diet_ready(fcm_token)
+        # [PERF] Plain dicts -> orjson (+ gzip/br); response_model is kept for the OpenAPI schema only
+        with span("format"):
+            return json_response(request, to_app_format(raw_data))
     finally:
-        if os.path.exists(temp_filename): os.remove(temp_filename)
+        upload.close()
+
+@app.post("/upload-diet/stream")
+@limiter.limit("5/minute")
+async def upload_diet_stream(request: Request, file: UploadFile = File(...), fcm_token: Optional[str] = Form(None), stream_format: str = Form("ndjson"), user_id: str = Depends(verify_token)):
+    """
+    Streaming /upload-diet: one "day" event per day as soon as Gemini has produced
+    it, then the substitutions, then "done" (or "error"). Days with the same name
+    (multi-week plans) arrive as separate events and are merged by the client.
+
+    Dishes without a cad_code take it from the substitution group with the same
+    title, which is only known at the end: every day event carries an "index",
+    and each day that changes once the substitutions are in is sent again, after
+    the "substitutions" event, as a "day_update" with the same index that replaces
+    it. Applying the updates and merging the days gives exactly the /upload-diet
+    plan (benchmarks.bench_diet_stream checks this).
+    """
+    if not file.filename.lower().endswith('.pdf'): raise HTTPException(status_code=400, detail="Only PDF allowed")
+    if stream_format not in DIET_STREAM_FORMATS: raise HTTPException(status_code=400, detail="Invalid stream format")
+    with span("upload_save"):
+        upload = await spool_upload_file(file)
+
+    async def events():
+        try:
+            sent = []
+            async for kind, data in diet_parser.stream_complex_diet(upload):
+                if kind == "day":
+                    day_name, meals = format_day(data)
+                    yield {"type": "day", "index": len(sent), "day": day_name, "meals": meals}
+                    sent.append((data, meals))
+                else:
+                    substitutions, cad_map = format_substitutions(data.get('tabella_sostituzioni'))
+                    yield {"type": "substitutions", "substitutions": substitutions}
+                    for index, (raw_day, meals) in enumerate(sent):
+                        day_name, resolved = format_day(raw_day, cad_map)
+                        if resolved != meals:
+                            yield {"type": "day_update", "index": index, "day": day_name, "meals": resolved}
+            if fcm_token: notification_dispatcher.send_diet_ready(fcm_token)
+            yield {"type": "done"}
+        except Exception as e:
+            logger.error("diet_stream_error", error=str(e))
+            yield {"type": "error", "detail": "Diet parsing failed"}
+        finally:
+            upload.close()
+
+    async def encode():
+        async for event in events():
+            if stream_format == "sse":
+                yield b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
+            else:
+                yield orjson.dumps(event) + b"\n"
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(encode(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/upload-diet/{target_uid}", response_model=DietResponse)
 @limiter.limit("10/minute")
-async def upload_diet_admin(request: Request, target_uid: str, file: UploadFile = File(...), fcm_token: Optional[str] = Form(None), requester_id: str = Depends(verify_token)):
+async def upload_diet_admin(request: Request, target_uid: str, file: UploadFile = File(...), fcm_token: Optional[str] = Form(None), async_mode: bool = Form(False), requester_id: str = Depends(verify_token)):
     if not file.filename.lower().endswith('.pdf'): raise HTTPException(status_code=400, detail="Only PDF allowed")
-    temp_filename = f"{uuid.uuid4()}.pdf"
+    if async_mode:
+        return await _enqueue_diet_job(file, requester_id, {'fcm_token': fcm_token, 'target_uid': target_uid, 'requester_id': requester_id})
+    with span("upload_save"):
+        upload = await spool_upload_file(file)
     try:
-        await save_upload_file(file, temp_filename)
-        db = firebase_admin.firestore.client()
-        custom_prompt = None
-        user_doc = db.collection('users').document(target_uid).get()
-        if user_doc.exists:
-            parent_id = user_doc.to_dict().get('parent_id')
-            if parent_id:
-                parent_doc = db.collection('users').document(parent_id).get()
-                if parent_doc.exists: custom_prompt = parent_doc.to_dict().get('custom_parser_prompt')
+        db = firebase_io.db
+        with span("firestore_read"):
+            custom_prompt = await _get_custom_prompt(db, target_uid)
         
-        raw_data = await run_in_threadpool(diet_parser.parse_complex_diet, temp_filename, custom_prompt)
-        formatted_data = _convert_to_app_format(raw_data)
-        dict_data = formatted_data.dict()
-
-        # 1. Save to Admin History (Global)
-        db.collection('diet_history').add({
-            'userId': target_uid,
-            'uploadedAt': firebase_admin.firestore.SERVER_TIMESTAMP,
-            'fileName': file.filename,
-            'parsedData': dict_data,
-            'uploadedBy': requester_id
-        })
+        raw_data = await diet_parser.parse_complex_diet(upload, custom_prompt)
+        with span("format"):
+            dict_data = to_app_format(raw_data)
 
-        # 2. Save to Client History (User Subcollection)
-        db.collection('users').document(target_uid).collection('diets').add({
-            'uploadedAt': firebase_admin.firestore.SERVER_TIMESTAMP,
-            'plan': dict_data.get('plan'),
-            'substitutions': dict_data.get('substitutions'),
-            'uploadedBy': 'nutritionist'
-        })
+        with span("firestore_write"):
+            await _save_diet_records(db, target_uid, file.filename, dict_data, requester_id)
         
-        if fcm_token: await run_in_threadpool(notification_service.send_diet_ready, fcm_token)
-        return formatted_data
+        if fcm_token: notification_dispatcher.send_diet_ready(fcm_token)
+        return json_response(request, dict_data)
     finally:
-        if os.path.exists(temp_filename): os.remove(temp_filename)
+        upload.close()
 
 @app.post("/scan-receipt")
-async def scan_receipt(request: Request, file: UploadFile = File(...), allowed_foods: Json[List[str]] = Form(...), user_id: str = Depends(verify_token)):
-    temp_filename = f"{uuid.uuid4()}{validate_extension(file.filename)}"
+async def scan_receipt(request: Request, file: UploadFile = File(...), allowed_foods: Json[List[str]] = Form(...), mode: str = Form("hybrid"), user_id: str = Depends(verify_token)):
+    validate_extension(file.filename)
+    if mode not in RECEIPT_SCAN_MODES: raise HTTPException(status_code=400, detail="Invalid scan mode")
+    with span("upload_save"):
+        upload = await spool_upload_file(file)
     try:
-        await save_upload_file(file, temp_filename)
         current_scanner = ReceiptScanner(allowed_foods_list=allowed_foods)
-        found_items = await run_in_threadpool(current_scanner.scan_receipt, temp_filename)
+        found_items = await current_scanner.scan_receipt(upload, file.filename, mode, user_id=user_id)
         return JSONResponse(content=found_items)
     finally:
-        if os.path.exists(temp_filename): os.remove(temp_filename)
+        upload.close()
+
+# --- DIET READS ---
+
+async def _serve_diet(request: Request, uid: str, diet_id: Optional[str]) -> Response:
+    # [PERF] Strong ETag = plan content hash; a cached view answers 304/200 with zero Firestore reads
+    known_etags = if_none_match(request)
+    cache_key = diet_id or user_diet_cache.LATEST
+    view = user_diet_cache.get(uid, cache_key)
+    if view is None:
+        with span("firestore_read"):
+            view = await load_user_diet(uid, diet_id, known_etags)
+        if view is None:
+            raise HTTPException(status_code=404, detail="Diet not found")
+        if view.data is not None:
+            user_diet_cache.set(uid, cache_key, view)
+
+    headers = {"ETag": f'"{view.etag}"', "Cache-Control": "private, no-cache", "X-Diet-Id": view.diet_id}
+    if view.etag in known_etags or "*" in known_etags:
+        return Response(status_code=304, headers=headers)
+    return json_response(request, view.data, headers=headers)
+
+@app.get("/diet/latest", response_model=DietResponse)
+async def get_latest_diet(request: Request, user_id: str = Depends(verify_token)):
+    return await _serve_diet(request, user_id, None)
+
+@app.get("/diet/{diet_id}", response_model=DietResponse)
+async def get_diet(request: Request, diet_id: str, user_id: str = Depends(verify_token)):
+    return await _serve_diet(request, user_id, diet_id)
+
+async def _is_assigned_nutritionist(requester_id: str, target_uid: str) -> bool:
+    # Same check as the Firestore rules for users/{uid}/diets: admins are not let through
+    role = role_cache.get(requester_id)
+    if role is None:
+        role = await _get_user_role(requester_id)
+    if role != 'nutritionist':
+        return False
+    target_doc = await firebase_io.db.collection('users').document(target_uid).get()
+    target = (target_doc.to_dict() or {}) if target_doc.exists else {}
+    return requester_id in (target.get('parent_id'), target.get('created_by'), target.get('nutritionist_id'))
+
+@app.get("/admin/diet/{target_uid}/{diet_id}", response_model=DietResponse)
+async def get_patient_diet(request: Request, target_uid: str, diet_id: str, requester_id: str = Depends(verify_admin)):
+    # The admin app's diet history: records only carry dietRef, the plan is resolved here
+    with span("firestore_read"):
+        allowed = await _is_assigned_nutritionist(requester_id, target_uid)
+    if not allowed:
+        raise HTTPException(status_code=404, detail="Diet not found")
+    return await _serve_diet(request, target_uid, diet_id)
+
+# --- METRICS ---
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    # Rendered on the event loop: the threadpool gauges are only readable from here
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {settings.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+# --- JOBS ---
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, user_id: str = Depends(verify_token)):
+    job = job_queue.get(job_id)
+    if not job or job['owner_uid'] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_view(job)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, user_id: str = Depends(verify_token)):
+    job = job_queue.get(job_id)
+    if not job or job['owner_uid'] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for snapshot in job_queue.events(job_id):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {snapshot['status']}\ndata: {json.dumps(_job_view(snapshot))}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # --- ADMIN USER MANAGEMENT ---
 
 @app.post("/admin/create-user")
 async def admin_create_user(body: CreateUserRequest, requester_id: str = Depends(verify_admin)):
     try:
-        db = firebase_admin.firestore.client()
-        
-        # 1. CLEANUP: Delete any existing orphaned docs with this email to prevent duplicates
-        existing_docs = db.collection('users').where('email', '==', body.email).stream()
-        for doc in existing_docs:
-            doc.reference.delete()
-
-        # 2. Check requester permissions (for inheritance logic)
-        requester_doc = db.collection('users').document(requester_id).get()
+        db = firebase_io.db
+        users = db.collection('users')
+
+        # 1. Orphaned docs with this email (duplicates to clean up) and the requester's
+        #    permissions (for inheritance logic), read concurrently
+        existing_docs, requester_doc = await asyncio.gather(
+            users.where('email', '==', body.email).get(),
+            users.document(requester_id).get(),
+        )
         final_parent_id = body.parent_id
         if requester_doc.exists and requester_doc.to_dict().get('role') == 'nutritionist':
             final_parent_id = requester_id
         
-        # 3. Create Auth User
-        user = auth.create_user(
+        # 2. Create Auth User
+        user = await firebase_io.call(
+            "auth_admin", auth.create_user,
             email=body.email, 
             password=body.password, 
             display_name=f"{body.first_name} {body.last_name}", 
             email_verified=True
         )
-        auth.set_custom_user_claims(user.uid, {'role': body.role})
+        await firebase_io.call("auth_admin", auth.set_custom_user_claims, user.uid, {'role': body.role})
         
-        # 4. Create Firestore Document (Clean State)
-        db.collection('users').document(user.uid).set({
+        # 3. CLEANUP + Firestore Document (Clean State) in one batched commit
+        batch = db.batch()
+        for doc in existing_docs:
+            batch.delete(doc.reference)
+        batch.set(users.document(user.uid), {
             'uid': user.uid, 
             'email': body.email, 
             'role': body.role,
@@ -307,6 +571,8 @@ async def admin_create_user(body: CreateUserRequest, requester_id: str = Depends
             'created_by': requester_id, 
             'requires_password_change': True
         })
+        await batch.commit()
+        role_cache.invalidate(user.uid)
         return {"uid": user.uid, "message": "User created"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -314,20 +580,20 @@ async def admin_create_user(body: CreateUserRequest, requester_id: str = Depends
 @app.put("/admin/update-user/{target_uid}")
 async def admin_update_user(target_uid: str, body: UpdateUserRequest, requester_id: str = Depends(verify_admin)):
     try:
-        db = firebase_admin.firestore.client()
+        db = firebase_io.db
         
         # Update Auth
         update_args = {}
         if body.email: update_args['email'] = body.email
         if body.first_name or body.last_name:
-             user = auth.get_user(target_uid)
+             user = await firebase_io.call("auth_admin", auth.get_user, target_uid)
              names = user.display_name.split(' ') if user.display_name else ["", ""]
              new_first = body.first_name if body.first_name else names[0]
              new_last = body.last_name if body.last_name else (names[1] if len(names)>1 else "")
              update_args['display_name'] = f"{new_first} {new_last}".strip()
 
         if update_args:
-            auth.update_user(target_uid, **update_args)
+            await firebase_io.call("auth_admin", auth.update_user, target_uid, **update_args)
 
         # Update Firestore
         fs_update = {}
@@ -336,7 +602,7 @@ async def admin_update_user(target_uid: str, body: UpdateUserRequest, requester_
         if body.last_name: fs_update['last_name'] = body.last_name
         
         if fs_update:
-            db.collection('users').document(target_uid).update(fs_update)
+            await db.collection('users').document(target_uid).update(fs_update)
             
         return {"message": "User updated"}
     except Exception as e:
@@ -345,14 +611,15 @@ async def admin_update_user(target_uid: str, body: UpdateUserRequest, requester_
 @app.post("/admin/assign-user")
 async def admin_assign_user(body: AssignUserRequest, requester_id: str = Depends(verify_admin)):
     try:
-        db = firebase_admin.firestore.client()
+        db = firebase_io.db
         # Change role to user, assign parent
-        db.collection('users').document(body.target_uid).update({
+        await db.collection('users').document(body.target_uid).update({
             'role': 'user',
             'parent_id': body.nutritionist_id,
             'updated_at': firebase_admin.firestore.SERVER_TIMESTAMP
         })
-        auth.set_custom_user_claims(body.target_uid, {'role': 'user'})
+        await firebase_io.call("auth_admin", auth.set_custom_user_claims, body.target_uid, {'role': 'user'})
+        role_cache.invalidate(body.target_uid)
         return {"message": "User assigned successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -360,14 +627,15 @@ async def admin_assign_user(body: AssignUserRequest, requester_id: str = Depends
 @app.post("/admin/unassign-user")
 async def admin_unassign_user(body: UnassignUserRequest, requester_id: str = Depends(verify_admin)):
     try:
-        db = firebase_admin.firestore.client()
+        db = firebase_io.db
         # Revert role to independent, remove parent
-        db.collection('users').document(body.target_uid).update({
+        await db.collection('users').document(body.target_uid).update({
             'role': 'independent',
             'parent_id': firestore.DELETE_FIELD,
             'updated_at': firebase_admin.firestore.SERVER_TIMESTAMP
         })
-        auth.set_custom_user_claims(body.target_uid, {'role': 'independent'})
+        await firebase_io.call("auth_admin", auth.set_custom_user_claims, body.target_uid, {'role': 'independent'})
+        role_cache.invalidate(body.target_uid)
         return {"message": "User unassigned successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -375,39 +643,22 @@ async def admin_unassign_user(body: UnassignUserRequest, requester_id: str = Dep
 @app.delete("/admin/delete-user/{target_uid}")
 async def admin_delete_user(target_uid: str, requester_id: str = Depends(verify_admin)):
     try:
-        try: auth.delete_user(target_uid)
+        try: await firebase_io.call("auth_admin", auth.delete_user, target_uid)
         except: pass
-        firebase_admin.firestore.client().collection('users').document(target_uid).delete()
+        await firebase_io.db.collection('users').document(target_uid).delete()
+        role_cache.invalidate(target_uid)
         return {"message": "Deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/admin/sync-users")
-async def admin_sync_users(requester_id: str = Depends(verify_admin)):
+async def admin_sync_users(dry_run: bool = False, background: bool = False, requester_id: str = Depends(verify_admin)):
+    if background:
+        job_id = job_queue.submit("sync_users", {'dry_run': dry_run}, owner_uid=requester_id)
+        return _job_accepted(job_id)
     try:
-        db = firebase_admin.firestore.client()
-        
-        # Iterate through all Auth users
-        for user in auth.list_users().users:
-            
-            # 1. GHOST BUSTER: Find and delete any docs with this email that have the WRONG ID
-            email_docs = db.collection('users').where('email', '==', user.email).stream()
-            for doc in email_docs:
-                if doc.id != user.uid:
-                    doc.reference.delete()
-
-            # 2. Create missing document if it doesn't exist
-            if not db.collection('users').document(user.uid).get().exists:
-                db.collection('users').document(user.uid).set({
-                    'uid': user.uid, 
-                    'email': user.email, 
-                    'role': 'independent',
-                    'first_name': 'App', 
-                    'last_name': '', 
-                    'created_at': firebase_admin.firestore.SERVER_TIMESTAMP
-                })
-                
-        return {"message": "Synced & Cleaned"}
+        result = await UserSyncEngine().run(dry_run)
+        return {"message": "Dry run completed" if dry_run else "Synced & Cleaned", **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -415,20 +666,31 @@ async def admin_sync_users(requester_id: str = Depends(verify_admin)):
 async def upload_parser_config(target_uid: str, file: UploadFile = File(...), requester_id: str = Depends(verify_admin)):
     try:
         content = (await file.read()).decode("utf-8")
-        db = firebase_admin.firestore.client()
+        db = firebase_io.db
+        user_ref = db.collection('users').document(target_uid)
+
+        # The previous prompt's server-side context cache is no longer needed
+        old_doc = await user_ref.get()
+        old_prompt = (old_doc.to_dict() or {}).get('custom_parser_prompt') if old_doc.exists else None
         
-        db.collection('users').document(target_uid).update({
+        # Prompt + history entry in one batched commit
+        batch = db.batch()
+        batch.update(user_ref, {
             'custom_parser_prompt': content, 
             'has_custom_parser': True,
             'parser_updated_at': firebase_admin.firestore.SERVER_TIMESTAMP
         })
         
         # History
-        db.collection('users').document(target_uid).collection('parser_history').add({
+        batch.set(user_ref.collection('parser_history').document(), {
             'content': content,
             'uploaded_at': firebase_admin.firestore.SERVER_TIMESTAMP,
             'uploaded_by': requester_id
         })
+        await batch.commit()
+
+        if old_prompt and old_prompt != content:
+            await prompt_cache.evict(old_prompt)
         
         return {"message": "Updated"}
     except Exception as e:
@@ -440,10 +702,10 @@ async def log_sensitive_access(body: LogAccessRequest, requester_id: str = Depen
     Registra un accesso ai dati sensibili (PII) per audit.
     """
     try:
-        db = firebase_admin.firestore.client()
+        db = firebase_io.db
         
         # Salviamo il log. Non permettiamo la modifica o cancellazione da API standard.
-        db.collection('access_logs').add({
+        await db.collection('access_logs').add({
             'requester_id': requester_id,
             'target_uid': body.target_uid,
             'action': 'UNLOCK_PII_VIEW', # PII = Personally Identifiable Information
@@ -461,79 +723,34 @@ async def log_sensitive_access(body: LogAccessRequest, requester_id: str = Depen
 
 @app.get("/admin/config/maintenance")
 async def get_maintenance_status(requester_id: str = Depends(verify_admin)):
-    doc = firebase_admin.firestore.client().collection('config').document('global').get()
-    return {"enabled": doc.to_dict().get('maintenance_mode', False)} if doc.exists else {"enabled": False}
+    config = await config_cache.get()
+    return {"enabled": config.get('maintenance_mode', False)}
 
 @app.post("/admin/config/maintenance")
 async def set_maintenance_status(body: MaintenanceRequest, requester_id: str = Depends(verify_admin)):
     data = {'maintenance_mode': body.enabled, 'updated_by': requester_id}
     if body.message:
         data['maintenance_message'] = body.message
-    firebase_admin.firestore.client().collection('config').document('global').set(data, merge=True)
+    await config_cache.update(data)
     return {"message": "Updated"}
 
 @app.post("/admin/schedule-maintenance")
 async def schedule_maintenance(req: ScheduleMaintenanceRequest, admin_uid: str = Depends(verify_admin)):
-    firebase_admin.firestore.client().collection('config').document('global').set({
+    await config_cache.update({
         "scheduled_maintenance_start": req.scheduled_time,
         "maintenance_message": req.message,
         "is_scheduled": True
-    }, merge=True)
+    })
     
     if req.notify:
-        try:
-            broadcast_message(title="System Update", body=req.message, data={"type": "maintenance_alert"})
-        except: pass
+        notification_dispatcher.broadcast(title="System Update", body=req.message, data={"type": "maintenance_alert"})
     return {"status": "scheduled"}
 
 @app.post("/admin/cancel-maintenance")
 async def cancel_maintenance_schedule(requester_id: str = Depends(verify_admin)):
-    firebase_admin.firestore.client().collection('config').document('global').update({
+    await config_cache.update({
         "is_scheduled": False,
         "scheduled_maintenance_start": firestore.DELETE_FIELD,
         "maintenance_message": firestore.DELETE_FIELD
     })
     return {"status": "cancelled"}
-
-def _convert_to_app_format(gemini_output) -> DietResponse:
-    if not gemini_output: return DietResponse(plan={}, substitutions={})
-    app_plan, app_substitutions = {}, {}
-    cad_map = {}
-    
-    for g in gemini_output.get('tabella_sostituzioni', []):
-        if g.get('cad_code', 0) > 0:
-            cad_map[g.get('titolo', '').strip().lower()] = g['cad_code']
-            app_substitutions[str(g['cad_code'])] = SubstitutionGroup(
-                name=g.get('titolo', ''),
-                options=[SubstitutionOption(name=o.get('nome',''), qty=o.get('quantita','')) for o in g.get('opzioni',[])]
-            )
-
-    day_map = {"lun": "Lunedì", "mar": "Martedì", "mer": "Mercoledì", "gio": "Giovedì", "ven": "Venerdì", "sab": "Sabato", "dom": "Domenica"}
-    
-    for day in gemini_output.get('piano_settimanale', []):
-        raw_name = day.get('giorno', '').lower().strip()
-        day_name = day_map.get(raw_name[:3], raw_name.capitalize())
-        app_plan[day_name] = {}
-        
-        for meal in day.get('pasti', []):
-            m_name = normalize_meal_name(meal.get('tipo_pasto', ''))
-            dishes = []
-            for d in meal.get('elenco_piatti', []):
-                d_name = d.get('nome_piatto') or 'Piatto'
-                dishes.append(Dish(
-                    name=d_name,
-                    qty=str(d.get('quantita_totale') or ''),
-                    cad_code=d.get('cad_code', 0) or cad_map.get(d_name.lower(), 0),
-                    is_composed=(d.get('tipo') == 'composto'),
-                    ingredients=[Ingredient(name=str(i.get('nome','')), qty=str(i.get('quantita',''))) for i in d.get('ingredienti', [])]
-                ))
-            if m_name in app_plan[day_name]: app_plan[day_name][m_name].extend(dishes)
-            else: app_plan[day_name][m_name] = dishes
-
-    # Order meals
-    for d, meals in app_plan.items():
-        app_plan[d] = {k: meals[k] for k in MEAL_ORDER if k in meals}
-        for k in meals: 
-            if k not in app_plan[d]: app_plan[d][k] = meals[k]
-
-    return DietResponse(plan=app_plan, substitutions=app_substitutions)
\ No newline at end of file
@@ -0,0 +1,233 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import structlog
+from firebase_admin import firestore, firestore_async
+
+from app.core.config import settings
+from app.core.firebase_io import firebase_io
+from app.core.leader import LeaderLease
+
+logger = structlog.get_logger()
+
+# Long timers are re-armed in steps so wall-clock adjustments can't make them drift
+MAX_TIMER_SECONDS = 3600
+TRIGGER_RETRY_SECONDS = 5
+
+
+def parse_schedule(start_str: str) -> datetime:
+    scheduled_time = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
+    if scheduled_time.tzinfo is None:
+        scheduled_time = scheduled_time.replace(tzinfo=timezone.utc)
+    return scheduled_time
+
+
+class GlobalConfigCache:
+    """
+    In-process mirror of config/global.
+
+    - A Firestore on_snapshot listener pushes every change, so reads are served
+      from memory; polling (CONFIG_POLL_SECONDS) only kicks in while the listener is down.
+    - Writes go to Firestore and are applied locally right away.
+    - A scheduled maintenance arms an asyncio timer for its start time instead
+      of being discovered by a periodic poll. Every process arms it, only the
+      leader fires it; the others re-check until the leader's write clears it.
+    """
+
+    def __init__(
+        self,
+        poll_seconds: int = settings.CONFIG_POLL_SECONDS,
+        listener_enabled: bool = settings.CONFIG_LISTENER_ENABLED,
+    ):
+        self.poll_seconds = poll_seconds
+        self.listener_enabled = listener_enabled
+        self._data: Dict[str, Any] = {}
+        self._loaded = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watch = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        self._triggering = False
+        self.leader: Optional[LeaderLease] = None
+        self.reads = 0
+        self.pushes = 0
+
+    def _doc_ref(self):
+        # Sync client: on_snapshot listeners only exist there
+        return firestore.client().collection('config').document('global')
+
+    def _async_doc_ref(self):
+        return firebase_io.db.collection('config').document('global')
+
+    async def start(self, leader: Optional[LeaderLease] = None) -> None:
+        self._loop = asyncio.get_running_loop()
+        self.leader = leader
+        await self.refresh()
+        self._subscribe()
+        self._supervisor = asyncio.create_task(self._supervise())
+        logger.info("config_cache_started", listener=self._watch is not None)
+
+    async def stop(self) -> None:
+        if self._supervisor:
+            self._supervisor.cancel()
+        if self._timer:
+            self._timer.cancel()
+        self._unsubscribe()
+
+    # --- Reads ---
+
+    async def get(self) -> Dict[str, Any]:
+        if not self._loaded:
+            await self.refresh()
+        return dict(self._data)
+
+    async def refresh(self) -> None:
+        try:
+            doc = await self._async_doc_ref().get()
+        except Exception as e:
+            logger.error("config_read_failed", error=str(e))
+            return
+        self.reads += 1
+        self._apply(doc.to_dict() if doc.exists else {})
+
+    # --- Writes ---
+
+    async def update(self, changes: Dict[str, Any]) -> None:
+        """Merges changes into config/global (firestore.DELETE_FIELD removes a key)."""
+        await self._async_doc_ref().set(changes, merge=True)
+        self._merge_local(changes)
+
+    def _merge_local(self, changes: Dict[str, Any]) -> None:
+        data = dict(self._data)
+        for key, value in changes.items():
+            if value is firestore.DELETE_FIELD:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        # The listener echoes the same state back shortly after
+        self._apply(data)
+
+    # --- Listener ---
+
+    def _subscribe(self) -> None:
+        if not self.listener_enabled:
+            return
+        try:
+            self._watch = self._doc_ref().on_snapshot(self._on_snapshot)
+        except Exception as e:
+            self._watch = None
+            logger.warning("config_listener_failed", error=str(e))
+
+    def _unsubscribe(self) -> None:
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception:
+                pass
+            self._watch = None
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        # Runs on the Firestore watch thread
+        snapshot = docs[0] if docs else None
+        data = snapshot.to_dict() if snapshot is not None and snapshot.exists else {}
+        self.pushes += 1
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._apply, data or {})
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            if self._watch is not None and self._watch.is_active:
+                continue
+            # Listener down (or disabled): poll, and try to get the push channel back
+            await self.refresh()
+            self._unsubscribe()
+            self._subscribe()
+
+    # --- Scheduler ---
+
+    def _apply(self, data: Dict[str, Any]) -> None:
+        self._data = data
+        self._loaded = True
+        self._arm_timer()
+
+    def _arm_timer(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        start_str = self._data.get('scheduled_maintenance_start')
+        if not self._data.get('is_scheduled', False) or not start_str or self._loop is None:
+            return
+        try:
+            scheduled_time = parse_schedule(start_str)
+        except (TypeError, ValueError) as e:
+            logger.error("scheduler_error", error=str(e))
+            return
+        delay = (scheduled_time - datetime.now(timezone.utc)).total_seconds()
+        self._timer = self._loop.call_later(min(max(delay, 0), MAX_TIMER_SECONDS), self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        start_str = self._data.get('scheduled_maintenance_start')
+        if not self._data.get('is_scheduled', False) or not start_str:
+            return
+        if parse_schedule(start_str) > datetime.now(timezone.utc):
+            self._arm_timer()
+            return
+        if self.leader is not None and not self.leader.is_leader:
+            # Picks the trigger up if the leader dies before clearing the schedule
+            self._timer = self._loop.call_later(TRIGGER_RETRY_SECONDS, self._on_timer)
+            return
+        if not self._triggering:
+            self._triggering = True
+            asyncio.create_task(self._trigger_maintenance(start_str))
+
+    async def _start_scheduled_maintenance(self, start_str: str) -> bool:
+        """Check-and-set in one transaction: an admin may have cancelled or moved the schedule since our snapshot."""
+        db = firebase_io.db
+        doc_ref = db.collection('config').document('global')
+        changes = {
+            "maintenance_mode": True,
+            "is_scheduled": False,
+            "scheduled_maintenance_start": firestore.DELETE_FIELD,
+            "updated_by": "system_scheduler"
+        }
+
+        @firestore_async.async_transactional
+        async def flip(transaction) -> bool:
+            snapshot = await doc_ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else {}
+            if not data.get('is_scheduled', False) or data.get('scheduled_maintenance_start') != start_str:
+                return False
+            transaction.update(doc_ref, changes)
+            return True
+
+        if not await flip(db.transaction()):
+            return False
+        self._merge_local(changes)
+        return True
+
+    async def _trigger_maintenance(self, start_str: str) -> None:
+        try:
+            if await self._start_scheduled_maintenance(start_str):
+                logger.info("maintenance_triggered", scheduled_for=start_str)
+            else:
+                logger.info("maintenance_trigger_skipped", scheduled_for=start_str, reason="schedule_changed")
+                await self.refresh()
+        except Exception as e:
+            logger.error("scheduler_error", error=str(e))
+            self._timer = self._loop.call_later(TRIGGER_RETRY_SECONDS, self._on_timer)
+        finally:
+            self._triggering = False
+
+    def stats(self) -> dict:
+        return {
+            "listener_active": bool(self._watch is not None and self._watch.is_active),
+            "reads": self.reads,
+            "pushes": self.pushes,
+            "timer_armed": self._timer is not None,
+        }
+
+
+config_cache = GlobalConfigCache()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import structlog
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class DietCache:
+    """
+    Content-addressed cache for parsed diets.
+    Key = SHA-256(pdf bytes) + SHA-256(system instruction) + Gemini model, so a
+    re-uploaded PDF skips pdfplumber and Gemini entirely.
+
+    Tier 1: bounded in-memory LRU.
+    Tier 2: JSON files on disk, evicted by TTL and by total size (oldest first).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = settings.DIET_CACHE_DIR,
+        memory_items: int = settings.DIET_CACHE_MEMORY_ITEMS,
+        max_disk_bytes: int = settings.DIET_CACHE_DISK_MAX_MB * 1024 * 1024,
+        ttl_seconds: int = settings.DIET_CACHE_TTL_SECONDS,
+    ):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(maxsize=memory_items, ttl=ttl_seconds)
+        self._disk_lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(pdf_bytes: bytes, system_instruction: str, model_name: str) -> str:
+        pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+        prompt_hash = hashlib.sha256((system_instruction or "").encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{pdf_hash}:{prompt_hash}:{model_name}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                self.disk_misses += 1
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            self.disk_misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("diet_cache_read_error", key=key, error=str(e))
+            self.disk_misses += 1
+            return None
+
+        self.disk_hits += 1
+        self.memory.set(key, data)
+        return data
+
+    def set(self, key: str, data: dict) -> None:
+        try:
+            payload = json.dumps(data, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.warning("diet_cache_unserializable", key=key, error=str(e))
+            return
+
+        self.memory.set(key, data)
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("diet_cache_write_error", key=key, error=str(e))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        with self._disk_lock:
+            now = time.time()
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if now - st.st_mtime > self.ttl_seconds:
+                    self._remove(path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+            entries.sort()
+            while entries and total > self.max_disk_bytes:
+                _, size, path = entries.pop(0)
+                self._remove(path)
+                total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "disk_misses": self.disk_misses,
+        }
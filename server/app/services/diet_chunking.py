@@ -0,0 +1,96 @@
+import re
+from typing import List
+
+# Day headings in the languages the default prompt accepts
+DAY_HEADING = re.compile(
+    r"^[ \t]*(luned[iì]|marted[iì]|mercoled[iì]|gioved[iì]|venerd[iì]|sabato|domenica|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+    r"lunes|martes|mi[eé]rcoles|jueves|viernes|s[aá]bado|domingo|"
+    r"lundi|mardi|mercredi|jeudi|vendredi|samedi|dimanche|"
+    r"montag|dienstag|mittwoch|donnerstag|freitag|samstag|sonntag)\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+SUBSTITUTIONS_HEADING = re.compile(r"^[ \t]*(tabella\s+(delle\s+)?sostituzioni|sostituzioni|substitutions?)\b", re.IGNORECASE | re.MULTILINE)
+CAD_GROUP_HEADING = re.compile(r"^[ \t]*CAD\s*\d+", re.IGNORECASE | re.MULTILINE)
+# Context repeated at the top of every plan chunk (title, patient, legend)
+PREAMBLE_MAX_CHARS = 1500
+
+
+def _pack(sections: List[str], target_chars: int) -> List[str]:
+    """Groups consecutive sections into chunks of about target_chars, never splitting one."""
+    chunks, current = [], ""
+    for section in sections:
+        if current and len(current) + len(section) > target_chars:
+            chunks.append(current)
+            current = ""
+        current += section
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def _split_at(text: str, pattern: re.Pattern) -> List[str]:
+    starts = [m.start() for m in pattern.finditer(text)]
+    if not starts:
+        return [text]
+    if starts[0] > 0:
+        starts.insert(0, 0)
+    return [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+
+def split_diet_text(text: str, target_chars: int) -> List[str]:
+    """
+    Cuts the extracted PDF text at day headings and at the substitution
+    table (itself cut at its "CAD n" groups), then packs the pieces into
+    chunks of about target_chars. Returns [text] when nothing can be split.
+    """
+    subs_match = SUBSTITUTIONS_HEADING.search(text)
+    plan_text, subs_text = (text[:subs_match.start()], text[subs_match.start():]) if subs_match else (text, "")
+
+    days = _split_at(plan_text, DAY_HEADING)
+    preamble = ""
+    if days and not DAY_HEADING.match(days[0]):
+        preamble = days.pop(0)
+    plan_chunks = _pack(days, target_chars)
+    if preamble.strip() and len(preamble) <= PREAMBLE_MAX_CHARS:
+        plan_chunks = [preamble + chunk for chunk in plan_chunks]
+    elif preamble.strip():
+        plan_chunks.insert(0, preamble)
+
+    subs_chunks = []
+    if subs_text:
+        groups = _split_at(subs_text, CAD_GROUP_HEADING)
+        heading = groups.pop(0) if len(groups) > 1 and not CAD_GROUP_HEADING.match(groups[0]) else ""
+        subs_chunks = [heading + chunk for chunk in _pack(groups, target_chars)]
+
+    chunks = plan_chunks + subs_chunks
+    return chunks if len(chunks) > 1 else [text]
+
+
+def merge_partial_results(parts: List[dict]) -> dict:
+    """
+    Joins chunk outputs in document order: a day split across chunks gets its
+    meals concatenated, substitution groups are deduplicated by cad_code
+    (options merged by name).
+    """
+    days: dict = {}
+    groups: dict = {}
+    for part in parts:
+        for day in (part or {}).get("piano_settimanale") or []:
+            key = str(day.get("giorno", "")).strip().lower()
+            if key in days:
+                days[key]["pasti"].extend(day.get("pasti") or [])
+            else:
+                days[key] = {"giorno": day.get("giorno", ""), "pasti": list(day.get("pasti") or [])}
+        for group in (part or {}).get("tabella_sostituzioni") or []:
+            cad = group.get("cad_code", 0)
+            if cad in groups:
+                known = {str(o.get("nome", "")).strip().lower() for o in groups[cad]["opzioni"]}
+                groups[cad]["opzioni"].extend(
+                    o for o in group.get("opzioni") or [] if str(o.get("nome", "")).strip().lower() not in known
+                )
+                if not groups[cad].get("titolo"):
+                    groups[cad]["titolo"] = group.get("titolo", "")
+            else:
+                groups[cad] = {**group, "opzioni": list(group.get("opzioni") or [])}
+    return {"piano_settimanale": list(days.values()), "tabella_sostituzioni": list(groups.values())}
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.normalization import normalize_meal_name
+
+MEAL_ORDER = [
+    "Colazione", "Seconda Colazione", "Spuntino", "Pranzo",
+    "Merenda", "Cena", "Spuntino Serale", "Nell'Arco Della Giornata"
+]
+
+DAY_MAP = {"lun": "Lunedì", "mar": "Martedì", "mer": "Mercoledì", "gio": "Giovedì", "ven": "Venerdì", "sab": "Sabato", "dom": "Domenica"}
+
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _as_str(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _order_meals(meals: Dict[str, List[dict]]) -> Dict[str, List[dict]]:
+    ordered = {k: meals[k] for k in MEAL_ORDER if k in meals}
+    for k in meals:
+        if k not in ordered: ordered[k] = meals[k]
+    return ordered
+
+
+def format_substitutions(groups: List[dict]) -> Tuple[Dict[str, dict], Dict[str, int]]:
+    """tabella_sostituzioni -> ({cad: SubstitutionGroup}, {lowercase title: cad})."""
+    app_substitutions: Dict[str, dict] = {}
+    cad_map: Dict[str, int] = {}
+    for g in groups or []:
+        cad_code = _as_int(g.get('cad_code'))
+        if cad_code > 0:
+            title = _as_str(g.get('titolo'))
+            cad_map[title.strip().lower()] = cad_code
+            app_substitutions[str(cad_code)] = {
+                "name": title,
+                "options": [{"name": _as_str(o.get('nome')), "qty": _as_str(o.get('quantita'))} for o in g.get('opzioni') or []],
+            }
+    return app_substitutions, cad_map
+
+
+def format_day(day: dict, cad_map: Optional[Dict[str, int]] = None) -> Tuple[str, Dict[str, List[dict]]]:
+    """One GiornoDieta -> (app day name, {meal: [Dish]}), meals in MEAL_ORDER."""
+    cad_map = cad_map or {}
+    raw_name = _as_str(day.get('giorno')).lower().strip()
+    day_name = DAY_MAP.get(raw_name[:3], raw_name.capitalize())
+    meals: Dict[str, List[dict]] = {}
+    for meal in day.get('pasti') or []:
+        m_name = normalize_meal_name(_as_str(meal.get('tipo_pasto')))
+        dishes = meals.setdefault(m_name, [])
+        for d in meal.get('elenco_piatti') or []:
+            d_name = _as_str(d.get('nome_piatto')) or 'Piatto'
+            dishes.append({
+                "name": d_name,
+                "qty": _as_str(d.get('quantita_totale') or ''),
+                "cad_code": _as_int(d.get('cad_code')) or cad_map.get(d_name.lower(), 0),
+                "is_composed": d.get('tipo') == 'composto',
+                "ingredients": [{"name": _as_str(i.get('nome')), "qty": _as_str(i.get('quantita'))} for i in d.get('ingredienti') or []],
+            })
+    return day_name, _order_meals(meals)
+
+
+def merge_day(app_plan: Dict[str, Dict[str, List[dict]]], day_name: str, meals: Dict[str, List[dict]]) -> None:
+    """Adds one formatted day to app_plan; a day listed twice (e.g. one entry per week) has its meals merged."""
+    if day_name in app_plan:
+        merged = app_plan[day_name]
+        for m_name, dishes in meals.items():
+            merged.setdefault(m_name, []).extend(dishes)
+        app_plan[day_name] = _order_meals(merged)
+    else:
+        app_plan[day_name] = meals
+
+
+def to_app_format(gemini_output: dict) -> Dict[str, Any]:
+    """
+    Gemini's OutputDietaCompleto -> the DietResponse shape, as plain dicts.
+
+    [PERF] The parser output is already schema-constrained, so no pydantic
+    models are built (and validated) per dish/ingredient; the result goes
+    straight to orjson and to Firestore. Fields are coerced to the types
+    DietResponse declares, so DietResponse.model_validate() always accepts it.
+    """
+    if not gemini_output:
+        return {"plan": {}, "substitutions": {}}
+    app_substitutions, cad_map = format_substitutions(gemini_output.get('tabella_sostituzioni'))
+
+    app_plan: Dict[str, Dict[str, List[dict]]] = {}
+    for day in gemini_output.get('piano_settimanale') or []:
+        merge_day(app_plan, *format_day(day, cad_map))
+
+    return {"plan": app_plan, "substitutions": app_substitutions}
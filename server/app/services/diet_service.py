@@ -1,11 +1,18 @@
+import asyncio
 import json
 import re
-import io
-import pdfplumber
-import os
-from google import genai
-from google.genai import types
+import structlog
+from google.genai import errors, types
 from app.core.config import settings
+from app.core.metrics import span
+from app.core.uploads import UploadSource, read_source
+from app.services.diet_cache import DietCache
+from app.services.pdf_extraction import extract_pdf_text
+from app.services.gemini_gateway import gemini_gateway
+from app.services.prompt_cache import prompt_cache
+from app.services.template_parser import TemplateParser
+from app.services.diet_chunking import merge_partial_results, split_diet_text
+from app.services.json_stream import ArrayItemStream
 from app.models.schemas import (
     DietResponse, 
     Dish, 
@@ -14,6 +21,9 @@ from app.models.schemas import (
     SubstitutionOption
 )
 import typing_extensions as typing
+from typing import AsyncIterator
+
+logger = structlog.get_logger()
 
 # --- DATA SCHEMAS (Your Original TypedDicts) ---
 class Ingrediente(typing.TypedDict):
@@ -50,13 +60,14 @@ class OutputDietaCompleto(typing.TypedDict):
 
 class DietParser:
     def __init__(self):
-        api_key = settings.GOOGLE_API_KEY
-        if not api_key:
-            print("❌ CRITICAL ERROR: GOOGLE_API_KEY not found in settings!")
-            self.client = None
-        else:
-            clean_key = api_key.strip().replace('"', '').replace("'", "")
-            self.client = genai.Client(api_key=clean_key)
+        # [PERF] Shared async client: connection reuse, no threadpool slot per LLM call
+        self.gemini = gemini_gateway
+
+        # [CACHE] Content-addressed cache: identical PDF + prompt + model -> same result
+        self.cache = DietCache() if settings.DIET_CACHE_ENABLED else None
+
+        # [PERF] PDFs from known nutritionist software are parsed locally, no LLM call
+        self.templates = TemplateParser() if settings.DIET_TEMPLATES_ENABLED else None
 
         # [DEFAULT SYSTEM INSTRUCTION]
         self.system_instruction = """
@@ -102,30 +113,15 @@ OUTPUT FORMAT (Strict JSON):
   "tabella_sostituzioni": []
 }"""
 
-    def _extract_text_from_pdf(self, pdf_path: str) -> str:
-        # [PRESERVED] Your Memory Optimization using StringIO
-        text_buffer = io.StringIO()
+    def _extract_text_from_pdf(self, pdf_bytes: bytes) -> str:
+        # [PERF] Pages are extracted in parallel worker processes (see pdf_extraction)
         try:
-            file_size = os.path.getsize(pdf_path)
-            if file_size > 10 * 1024 * 1024: 
+            if len(pdf_bytes) > 10 * 1024 * 1024: 
                 raise ValueError("PDF troppo grande per l'elaborazione (Max 10MB).")
-
-            with pdfplumber.open(pdf_path) as pdf:
-                if len(pdf.pages) > 50:
-                    raise ValueError("Il PDF ha troppe pagine (Max 50).")
-                
-                for page in pdf.pages:
-                    extracted = page.extract_text(layout=True) 
-                    if extracted:
-                        text_buffer.write(extracted)
-                        text_buffer.write("\n")
-            
-            return text_buffer.getvalue()
+            return extract_pdf_text(pdf_bytes, max_pages=50, layout=True)
         except Exception as e:
-            print(f"❌ Errore lettura PDF: {e}")
+            logger.warning("diet_pdf_read_error", error=str(e))
             raise e
-        finally:
-            text_buffer.close()
 
     def _extract_json_from_text(self, text: str):
         # [PRESERVED] Your Robust JSON extraction
@@ -145,41 +141,178 @@ OUTPUT FORMAT (Strict JSON):
         
         raise ValueError("Impossibile estrarre JSON valido dalla risposta Gemini.")
 
-    # [UPDATED] Added optional custom_instructions parameter
-    def parse_complex_diet(self, file_path: str, custom_instructions: str = None):
-        if not self.client:
+    async def _local_result(self, pdf_bytes: bytes, final_instruction: str, model_name: str, custom_instructions: str = None):
+        """Result without an LLM call (cache hit or known template), plus the cache key."""
+        cache_key = None
+        if self.cache:
+            cache_key = DietCache.make_key(pdf_bytes, final_instruction, model_name)
+            with span("diet_cache"):
+                cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info("diet_cache_hit", key=cache_key[:12])
+                return cached, cache_key
+
+        # A custom prompt asks for something a fixed layout cannot honour: Gemini only
+        if self.templates and not custom_instructions and len(pdf_bytes) <= 10 * 1024 * 1024:
+            with span("template_parse"):
+                result = await asyncio.to_thread(self.templates.parse, pdf_bytes)
+            if result is not None:
+                return result, cache_key
+        return None, cache_key
+
+    async def _diet_text(self, pdf_bytes: bytes) -> str:
+        if not self.gemini.available:
             raise ValueError("Client Gemini non inizializzato (manca API KEY).")
 
-        diet_text = self._extract_text_from_pdf(file_path)
+        # CPU-bound extraction runs in the process pool; this thread only waits on it
+        with span("pdf_extract", size=len(pdf_bytes)):
+            diet_text = await asyncio.to_thread(self._extract_text_from_pdf, pdf_bytes)
         if not diet_text:
             raise ValueError("PDF vuoto o illeggibile.")
+        return diet_text
 
+    # [UPDATED] Added optional custom_instructions parameter
+    # [PERF] source may be a path, raw bytes or an in-memory upload buffer
+    async def parse_complex_diet(self, source: UploadSource, custom_instructions: str = None):
         model_name = settings.GEMINI_MODEL
         
         # [NEW LOGIC] Determine which prompt to use
         # If custom_instructions exists, use it. Otherwise, use self.system_instruction.
         final_instruction = custom_instructions if custom_instructions else self.system_instruction
-        
-        try:
-            print(f"🤖 Analisi Gemini ({model_name})... Using Custom Prompt: {bool(custom_instructions)}")
-            
-            prompt = f"""
+
+        pdf_bytes = await asyncio.to_thread(read_source, source)
+        result, cache_key = await self._local_result(pdf_bytes, final_instruction, model_name, custom_instructions)
+        if result is not None:
+            return result
+
+        diet_text = await self._diet_text(pdf_bytes)
+
+        # [PERF] Long plans are split by day / substitution table and parsed concurrently
+        chunks = [diet_text]
+        if len(diet_text) >= settings.DIET_CHUNK_MIN_CHARS:
+            chunks = split_diet_text(diet_text, settings.DIET_CHUNK_TARGET_CHARS)
+        if len(chunks) > 1:
+            result = await self._call_gemini_chunked(chunks, final_instruction, model_name, bool(custom_instructions))
+        else:
+            result = await self._call_gemini(diet_text, final_instruction, model_name, bool(custom_instructions))
+        if self.cache:
+            await asyncio.to_thread(self.cache.set, cache_key, result)
+        return result
+
+    async def stream_complex_diet(self, source: UploadSource, custom_instructions: str = None) -> AsyncIterator[tuple]:
+        """
+        Same result as parse_complex_diet, delivered progressively:
+        ("day", GiornoDieta) as soon as each day of piano_settimanale is complete
+        in the model's streamed output, then ("done", OutputDietaCompleto).
+        """
+        model_name = settings.GEMINI_MODEL
+        final_instruction = custom_instructions if custom_instructions else self.system_instruction
+
+        pdf_bytes = await asyncio.to_thread(read_source, source)
+        result, cache_key = await self._local_result(pdf_bytes, final_instruction, model_name, custom_instructions)
+        if result is None:
+            diet_text = await self._diet_text(pdf_bytes)
+            logger.info("diet_gemini_stream", model=model_name, custom_prompt=bool(custom_instructions))
+            stream = ArrayItemStream("piano_settimanale")
+            async for fragment in self._generate_stream(self._build_prompt(diet_text), final_instruction, model_name):
+                for day in stream.feed(fragment):
+                    yield "day", day
+            try:
+                result = stream.result()
+            except ValueError:
+                result = self._extract_json_from_text(stream.text)
+            if self.cache:
+                await asyncio.to_thread(self.cache.set, cache_key, result)
+        else:
+            for day in result.get('piano_settimanale') or []:
+                yield "day", day
+        yield "done", result
+
+    def _gemini_config(self, final_instruction: str, handle: str = None) -> types.GenerateContentConfig:
+        if handle:
+            return types.GenerateContentConfig(
+                cached_content=handle,
+                response_mime_type="application/json",
+                response_schema=OutputDietaCompleto
+            )
+        return types.GenerateContentConfig(
+            system_instruction=final_instruction, # <--- Uses the dynamic prompt
+            response_mime_type="application/json",
+            response_schema=OutputDietaCompleto
+        )
+
+    async def _discard_cached_prompt(self, error: Exception, final_instruction: str, model_name: str) -> None:
+        # Handle expired or deleted server-side: drop it and resend the prompt inline
+        logger.warning("diet_cached_prompt_unusable", error=str(error))
+        await prompt_cache.discard(prompt_cache.prompt_hash(final_instruction), model_name)
+
+    async def _generate(self, prompt: str, final_instruction: str, model_name: str):
+        # [PERF] Long prompts are referenced through a server-side context cache
+        handle = await prompt_cache.get_handle(final_instruction, model_name)
+        if handle:
+            try:
+                return await self.gemini.generate(model=model_name, contents=prompt, config=self._gemini_config(final_instruction, handle))
+            except errors.ClientError as e:
+                if e.code not in (400, 403, 404):
+                    raise
+                await self._discard_cached_prompt(e, final_instruction, model_name)
+
+        return await self.gemini.generate(model=model_name, contents=prompt, config=self._gemini_config(final_instruction))
+
+    async def _generate_stream(self, prompt: str, final_instruction: str, model_name: str) -> AsyncIterator[str]:
+        handle = await prompt_cache.get_handle(final_instruction, model_name)
+        if handle:
+            started = False
+            try:
+                async for fragment in self.gemini.generate_stream(model=model_name, contents=prompt, config=self._gemini_config(final_instruction, handle)):
+                    started = True
+                    yield fragment
+                return
+            except errors.ClientError as e:
+                # Once output has been forwarded the request can't be replayed
+                if started or e.code not in (400, 403, 404):
+                    raise
+                await self._discard_cached_prompt(e, final_instruction, model_name)
+
+        async for fragment in self.gemini.generate_stream(model=model_name, contents=prompt, config=self._gemini_config(final_instruction)):
+            yield fragment
+
+    def _build_prompt(self, diet_text: str, part_note: str = "") -> str:
+        return f"""
             Analizza il seguente testo ed estrai i dati della dieta e le sostituzioni CAD.
+            {part_note}
             
             <source_document>
             {diet_text}
             </source_document>
             """
 
-            response = self.client.models.generate_content(
-                model=model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=final_instruction, # <--- Uses the dynamic prompt
-                    response_mime_type="application/json",
-                    response_schema=OutputDietaCompleto
+    async def _call_gemini_chunked(self, chunks: list[str], final_instruction: str, model_name: str, is_custom: bool):
+        logger.info("diet_chunked", chunks=len(chunks), concurrency=settings.DIET_CHUNK_CONCURRENCY)
+        semaphore = asyncio.Semaphore(settings.DIET_CHUNK_CONCURRENCY)
+
+        async def run(index: int, chunk: str):
+            async with semaphore:
+                return await self._call_gemini(chunk, final_instruction, model_name, is_custom, part=(index + 1, len(chunks)))
+
+        parts = await asyncio.gather(*(run(i, chunk) for i, chunk in enumerate(chunks)))
+        return merge_partial_results(parts)
+
+    async def _call_gemini(self, diet_text: str, final_instruction: str, model_name: str, is_custom: bool, part: tuple = None):
+        try:
+            logger.info("diet_gemini", model=model_name, custom_prompt=is_custom, part=part)
+
+            # Chunks must not invent the days / groups that live in the other parts
+            part_note = ""
+            if part:
+                part_note = (
+                    f"Questo è l'estratto {part[0]} di {part[1]} del documento: estrai solo i giorni "
+                    f"e i gruppi di sostituzione presenti in questo estratto."
                 )
-            )
+
+            prompt = self._build_prompt(diet_text, part_note)
+
+            response = await self._generate(prompt, final_instruction, model_name)
             
             # Prioritize structured parsing provided by SDK
             if hasattr(response, 'parsed') and response.parsed:
@@ -192,5 +325,5 @@ OUTPUT FORMAT (Strict JSON):
             raise ValueError("Risposta vuota da Gemini")
 
         except Exception as e:
-            print(f"⚠️ Errore con Gemini: {e}")
+            logger.warning("diet_gemini_error", error=str(e))
             raise e
\ No newline at end of file
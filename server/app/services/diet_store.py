@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import zlib
+from dataclasses import dataclass
+from typing import Collection, Optional, Tuple
+
+import orjson
+import structlog
+from firebase_admin import firestore
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.firebase_io import firebase_io
+
+logger = structlog.get_logger()
+
+
+class DietBlobStore:
+    """
+    Content-addressed store for parsed diet plans.
+
+    The canonical payload (orjson, sorted keys) is hashed with SHA-256 and
+    stored once, zlib-compressed, in diet_blobs/{hash}. Payloads larger than
+    DIET_BLOB_CHUNK_BYTES after compression are split into
+    diet_blobs/{hash}/chunks/{n}, so no document nears Firestore's 1 MiB
+    limit. Diet records only carry the hash (dietRef). Re-uploading the same
+    plan, or saving it for several users, writes nothing new.
+
+    Reads are served from a bounded in-memory LRU of decoded plans.
+    """
+
+    ENCODING = "zlib"
+
+    def __init__(
+        self,
+        collection: str = settings.DIET_BLOB_COLLECTION,
+        chunk_bytes: int = settings.DIET_BLOB_CHUNK_BYTES,
+        level: int = settings.DIET_BLOB_COMPRESSION_LEVEL,
+        memory_items: int = settings.DIET_BLOB_MEMORY_ITEMS,
+    ):
+        self.collection = collection
+        self.chunk_bytes = chunk_bytes
+        self.level = level
+        self.memory = TTLCache(maxsize=memory_items)
+        # Hashes known to be stored: skips the existence read on repeated uploads
+        self._stored = TTLCache(maxsize=4096, ttl=3600)
+        self.written = 0
+        self.deduplicated = 0
+        self.bytes_raw = 0
+        self.bytes_stored = 0
+
+    @staticmethod
+    def canonical(dict_data: dict) -> bytes:
+        return orjson.dumps(dict_data, option=orjson.OPT_SORT_KEYS)
+
+    @classmethod
+    def content_hash(cls, dict_data: dict) -> str:
+        return hashlib.sha256(cls.canonical(dict_data)).hexdigest()
+
+    def encode(self, dict_data: dict) -> Tuple[str, bytes, int]:
+        """Returns (content hash, compressed payload, raw size)."""
+        raw = self.canonical(dict_data)
+        return hashlib.sha256(raw).hexdigest(), zlib.compress(raw, self.level), len(raw)
+
+    @staticmethod
+    def decode(data: bytes) -> dict:
+        return orjson.loads(zlib.decompress(data))
+
+    async def stage(self, db, batch, dict_data: dict) -> dict:
+        """
+        Adds the blob writes to batch, unless the plan is already stored.
+        Returns the reference fields for the diet records; call committed()
+        once the batch went through.
+        """
+        diet_ref, data, raw_size = self.encode(dict_data)
+        fields = {"dietRef": diet_ref, "dietSize": raw_size}
+        doc_ref = db.collection(self.collection).document(diet_ref)
+        if diet_ref in self._stored or (await doc_ref.get(field_paths=["chunks"])).exists:
+            self.deduplicated += 1
+            return fields
+
+        chunks = [data[i:i + self.chunk_bytes] for i in range(0, len(data), self.chunk_bytes)] or [b""]
+        blob = {
+            "encoding": self.ENCODING,
+            "size": raw_size,
+            "storedSize": len(data),
+            "chunks": len(chunks),
+            "createdAt": firestore.SERVER_TIMESTAMP,
+        }
+        if len(chunks) == 1:
+            blob["data"] = chunks[0]
+        else:
+            for n, chunk in enumerate(chunks):
+                batch.set(doc_ref.collection("chunks").document(f"{n:04d}"), {"data": chunk})
+        batch.set(doc_ref, blob)
+        self.written += 1
+        self.bytes_raw += raw_size
+        self.bytes_stored += len(data)
+        return fields
+
+    def committed(self, diet_ref: str, dict_data: dict) -> None:
+        self._stored.set(diet_ref, True)
+        self.memory.set(diet_ref, dict_data)
+
+    async def load(self, diet_ref: str, db=None) -> Optional[dict]:
+        """The plan stored under diet_ref, or None if there is no such blob."""
+        dict_data = self.memory.get(diet_ref)
+        if dict_data is not None:
+            return dict_data
+
+        db = db or firebase_io.db
+        doc_ref = db.collection(self.collection).document(diet_ref)
+        snapshot = await doc_ref.get()
+        if not snapshot.exists:
+            return None
+        blob = snapshot.to_dict()
+        if blob.get("chunks", 1) > 1:
+            parts = await asyncio.gather(*(
+                doc_ref.collection("chunks").document(f"{n:04d}").get() for n in range(blob["chunks"])
+            ))
+            if not all(part.exists for part in parts):
+                logger.error("diet_blob_incomplete", diet_ref=diet_ref, chunks=blob["chunks"])
+                return None
+            data = b"".join(part.to_dict()["data"] for part in parts)
+        else:
+            data = blob.get("data", b"")
+
+        dict_data = self.decode(data)
+        self._stored.set(diet_ref, True)
+        self.memory.set(diet_ref, dict_data)
+        return dict_data
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "written": self.written,
+            "deduplicated": self.deduplicated,
+            "bytes_raw": self.bytes_raw,
+            "bytes_stored": self.bytes_stored,
+        }
+
+
+@dataclass
+class DietView:
+    diet_id: str
+    etag: str
+    data: Optional[dict]
+
+
+class UserDietCache:
+    """
+    (uid, diet id | "latest") -> DietView for GET /diet/*, so an unchanged
+    diet is answered (304 or 200) without touching Firestore.
+    _save_diet_records invalidates the uploader's target; the TTL bounds
+    staleness for diets written elsewhere (other workers, the client app).
+    """
+
+    LATEST = "latest"
+
+    def __init__(self, ttl: int = settings.DIET_VIEW_CACHE_TTL_SECONDS, maxsize: int = settings.DIET_VIEW_CACHE_MAX_ENTRIES):
+        self._views = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, uid: str, diet_id: str) -> Optional[DietView]:
+        return self._views.get((uid, diet_id))
+
+    def set(self, uid: str, diet_id: str, view: DietView) -> None:
+        self._views.set((uid, diet_id), view)
+
+    def invalidate(self, uid: str, diet_id: str = LATEST) -> None:
+        self._views.pop((uid, diet_id))
+
+    def stats(self) -> dict:
+        return self._views.stats()
+
+
+async def load_user_diet(uid: str, diet_id: Optional[str] = None, known_etags: Collection[str] = (), db=None) -> Optional[DietView]:
+    """
+    The user's latest diet (diet_id=None) or users/{uid}/diets/{diet_id}.
+    The ETag is the plan's content hash: dietRef for blob-backed records,
+    computed from the inline plan for records written before the blob store.
+    When the client already has it (known_etags) the blob is not loaded (data=None).
+    """
+    db = db or firebase_io.db
+    diets = db.collection("users").document(uid).collection("diets")
+    if diet_id is None:
+        snapshots = await diets.order_by("uploadedAt", direction=firestore.Query.DESCENDING).limit(1).get()
+        if not snapshots:
+            return None
+        snapshot = snapshots[0]
+    else:
+        snapshot = await diets.document(diet_id).get()
+        if not snapshot.exists:
+            return None
+
+    record = snapshot.to_dict() or {}
+    diet_ref = record.get("dietRef")
+    if diet_ref:
+        if diet_ref in known_etags or "*" in known_etags:
+            return DietView(snapshot.id, diet_ref, None)
+        data = await diet_blob_store.load(diet_ref, db)
+        if data is not None:
+            return DietView(snapshot.id, diet_ref, data)
+    data = {"plan": record.get("plan") or {}, "substitutions": record.get("substitutions") or {}}
+    return DietView(snapshot.id, DietBlobStore.content_hash(data), data)
+
+
+diet_blob_store = DietBlobStore()
+user_diet_cache = UserDietCache()
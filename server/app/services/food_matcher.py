@@ -0,0 +1,158 @@
+import hashlib
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from thefuzz import fuzz
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+STOPWORDS = {"di", "da", "del", "della", "al", "alla", "con", "e", "in", "il", "la", "lo", "le", "gr", "g", "kg", "ml", "l", "pz", "x", "bio"}
+
+# Receipt lines that are never products: totals, payment and footer lines (dropped)
+TOTAL_LINE_PATTERN = re.compile(
+    r"^\W*(sub\s?-?totale|totale|resto|contant[ei]|bancomat|pagamento|carta di (?:credito|debito)|"
+    r"importo|di cui iva|p\.?\s?iva|documento commerciale|grazie|arrivederci)\b",
+    re.IGNORECASE,
+)
+# Lines that are probably not foods (tax codes, discounts, household goods): never matched
+# locally, but still sent to Gemini with the unresolved lines
+NON_FOOD_PATTERN = re.compile(
+    r"\b(iva|euro|cassa|cassiere|sconto|scontrino|rt|detersiv\w*|detergent[ei]|shampoo|sapone|"
+    r"ammorbident[ei]|candeggin[ae]|shopper|sacchett[oi])\b",
+    re.IGNORECASE,
+)
+PRICE_PATTERN = re.compile(r"\s*-?\d+[.,]\d{2}\s*[a-zA-Z*]{0,2}\s*$")
+QTY_PATTERN = re.compile(
+    r"(?:(\d+)\s*[xX]\s*)|(?:[xX]\s*(\d+)\b)|(\d+(?:[.,]\d+)?\s*(?:kg|g|gr|ml|l|lt|pz))\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_food(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"[^a-z\s]", " ", text)
+    return " ".join(t for t in text.split() if t not in STOPWORDS and len(t) > 1)
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class ReceiptLine:
+    raw: str
+    name: str
+    normalized: str
+    quantity: str
+    # False for NON_FOOD_PATTERN hits: resolve() leaves them to the LLM
+    local: bool = True
+
+
+def parse_receipt_lines(text: str) -> List[ReceiptLine]:
+    """Splits OCR text into candidate product lines (prices/quantities peeled off, totals and payments dropped)."""
+    lines = []
+    for raw in text.splitlines():
+        raw = raw.strip()
+        if len(raw) < 3 or TOTAL_LINE_PATTERN.search(raw):
+            continue
+        name = PRICE_PATTERN.sub("", raw)
+        quantity = ""
+        qty_match = QTY_PATTERN.search(name)
+        if qty_match:
+            quantity = next(g for g in qty_match.groups() if g).strip()
+            name = (name[:qty_match.start()] + " " + name[qty_match.end():]).strip()
+        normalized = normalize_food(name)
+        if len(normalized) < 3:
+            continue
+        lines.append(ReceiptLine(raw=raw, name=name, normalized=normalized, quantity=quantity or "1",
+                                 local=not NON_FOOD_PATTERN.search(raw)))
+    return lines
+
+
+class FoodIndex:
+    """
+    Trigram index over a normalized allowed-foods list.
+    Trigram overlap shortlists candidates, thefuzz scores them.
+    """
+
+    def __init__(self, foods: List[str]):
+        self.foods: List[Tuple[str, str]] = []
+        seen = set()
+        for food in foods:
+            if not food:
+                continue
+            normalized = normalize_food(food)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                self.foods.append((str(food).strip(), normalized))
+
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for idx, (_, normalized) in enumerate(self.foods):
+            for gram in _trigrams(normalized):
+                self._postings[gram].append(idx)
+
+    def candidates(self, normalized: str, limit: int = settings.FOOD_MATCH_CANDIDATES) -> List[int]:
+        counts = Counter()
+        for gram in _trigrams(normalized):
+            counts.update(self._postings.get(gram, ()))
+        return [idx for idx, _ in counts.most_common(limit)]
+
+    def _score(self, normalized: str, food_normalized: str) -> int:
+        line_tokens = set(normalized.split())
+        extra = len(line_tokens - set(food_normalized.split()))
+        # token_set_ratio ignores extra words ("latte intero" ~ "latte"), so only trust it
+        # when the line adds at most one word; otherwise require the stricter sorted ratio.
+        if extra <= 1:
+            return fuzz.token_set_ratio(normalized, food_normalized)
+        return fuzz.token_sort_ratio(normalized, food_normalized)
+
+    def match(self, normalized: str) -> Tuple[Optional[str], int]:
+        best, best_score = None, 0
+        for idx in self.candidates(normalized):
+            score = self._score(normalized, self.foods[idx][1])
+            if score > best_score:
+                best, best_score = self.foods[idx][0], score
+        return best, best_score
+
+    def resolve(self, lines: List[ReceiptLine], threshold: int = settings.FOOD_MATCH_THRESHOLD):
+        resolved, unresolved = [], []
+        for line in lines:
+            food, score = self.match(line.normalized) if line.local else (None, 0)
+            if food and score >= threshold:
+                resolved.append({"name": food, "quantity": line.quantity, "original_scan": line.name})
+            else:
+                unresolved.append(line)
+        return resolved, unresolved
+
+    def prune(self, lines: List[ReceiptLine], per_line: int = settings.FOOD_MATCH_CANDIDATES) -> List[str]:
+        """Foods worth showing the LLM for the lines we could not resolve."""
+        picked = []
+        seen = set()
+        for line in lines:
+            for idx in self.candidates(line.normalized, per_line):
+                if idx not in seen:
+                    seen.add(idx)
+                    picked.append(self.foods[idx][0])
+        return picked
+
+
+_index_cache = TTLCache(maxsize=settings.FOOD_INDEX_CACHE_SIZE, ttl=settings.FOOD_INDEX_CACHE_TTL_SECONDS)
+
+
+def foods_key(foods: List[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(str(f).strip() for f in foods if f)).encode()).hexdigest()
+
+
+def get_food_index(foods: List[str]) -> FoodIndex:
+    # Same diet -> same list: repeat scans reuse the built index
+    key = foods_key(foods)
+    index = _index_cache.get(key)
+    if index is None:
+        index = FoodIndex(foods)
+        _index_cache.set(key, index)
+    return index
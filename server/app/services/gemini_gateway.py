@@ -0,0 +1,98 @@
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+import structlog
+from google import genai
+from google.genai import types
+
+from app.core.config import settings
+from app.core.metrics import GEMINI_IN_FLIGHT, span
+
+logger = structlog.get_logger()
+
+
+class GeminiGateway:
+    """
+    Process-wide access point to Gemini.
+    Owns a single genai.Client with a pooled keep-alive HTTP transport and
+    exposes the SDK's async (aio) surface, so no thread is held per LLM call.
+    """
+
+    def __init__(self):
+        self._client: Optional[genai.Client] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._configured = False
+
+    def _configure(self) -> None:
+        self._configured = True
+        api_key = settings.GOOGLE_API_KEY
+        if not api_key:
+            logger.error("gemini_api_key_missing")
+            return
+
+        clean_key = api_key.strip().replace('"', '').replace("'", "")
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GEMINI_MAX_CONNECTIONS,
+                keepalive_expiry=settings.GEMINI_KEEPALIVE_SECONDS,
+            ),
+            timeout=settings.GEMINI_TIMEOUT_SECONDS,
+        )
+        self._client = genai.Client(
+            api_key=clean_key,
+            http_options=types.HttpOptions(
+                timeout=settings.GEMINI_TIMEOUT_SECONDS * 1000,
+                httpx_async_client=self._http,
+            ),
+        )
+
+    @property
+    def client(self) -> Optional[genai.Client]:
+        if not self._configured:
+            self._configure()
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        return self.client is not None
+
+    def set_client(self, client: Any) -> None:
+        """Swap the underlying client (e.g. an offline fake for benchmarks)."""
+        self._client = client
+        self._configured = True
+
+    async def generate(self, model: str, contents: Any, config: types.GenerateContentConfig):
+        if not self.available:
+            raise ValueError("Client Gemini non inizializzato (manca API KEY).")
+        with span("gemini", model=model), GEMINI_IN_FLIGHT.track_inprogress():
+            return await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+
+    async def generate_stream(self, model: str, contents: Any, config: types.GenerateContentConfig) -> AsyncIterator[str]:
+        """Yields the response text as the model produces it."""
+        if not self.available:
+            raise ValueError("Client Gemini non inizializzato (manca API KEY).")
+        # The span covers the whole stream, up to the last chunk (or the consumer stopping)
+        with span("gemini_stream", model=model), GEMINI_IN_FLIGHT.track_inprogress():
+            stream = await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+
+    async def warmup(self) -> None:
+        # Opens the TLS connection at startup so the first upload doesn't pay for it
+        if not self.available:
+            return
+        try:
+            await self.client.aio.models.get(model=settings.GEMINI_MODEL)
+            logger.info("gemini_warmup_ok", model=settings.GEMINI_MODEL)
+        except Exception as e:
+            logger.warning("gemini_warmup_failed", error=str(e))
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+gemini_gateway = GeminiGateway()
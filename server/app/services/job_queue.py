@@ -0,0 +1,321 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+TERMINAL_STATUSES = {"done", "failed"}
+
+# handler(job_id, payload, report) -> JSON-serializable result
+Reporter = Callable[[str, float], None]
+JobHandler = Callable[[str, dict, Reporter], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Persistent background job queue backed by a local SQLite file (WAL mode).
+
+    - submit() stores the job and wakes a worker; it never blocks on the work itself.
+    - A bounded pool of asyncio workers claims jobs atomically, so several
+      processes can share the same database file.
+    - A payload 'upload_path' is treated as owned by the job and deleted once
+      the job reaches a terminal status.
+    - Running jobs heartbeat; a job whose heartbeat goes stale (process killed,
+      redeploy) is put back in the queue and retried up to JOB_MAX_ATTEMPTS.
+    """
+
+    def __init__(
+        self,
+        db_path: str = settings.JOB_QUEUE_DB_PATH,
+        workers: int = settings.JOB_WORKERS,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        stale_seconds: int = settings.JOB_STALE_SECONDS,
+        retention_hours: int = settings.JOB_RETENTION_HOURS,
+    ):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.stale_seconds = stale_seconds
+        self.retention_seconds = retention_hours * 3600
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                owner_uid TEXT,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs(status, created_at)")
+
+    # --- REGISTRATION & LIFECYCLE ---
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Condition()
+        self._purge_expired()
+        self._release_own()
+        self._tasks = [asyncio.create_task(self._worker_loop(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper_loop()))
+        logger.info("job_queue_started", workers=self.workers, db=self.db_path)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._release_own()
+
+    # --- PUBLIC API ---
+
+    def submit(self, kind: str, payload: dict, owner_uid: Optional[str] = None) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, kind, owner_uid, status, stage, progress, payload, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', 'queued', 0, ?, ?, ?)",
+            (job_id, kind, owner_uid, json.dumps(payload), now, now),
+        )
+        if self._wakeup:
+            self._wakeup.set()
+        logger.info("job_submitted", job_id=job_id, kind=kind)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    async def events(self, job_id: str, keepalive: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """
+        Yields a job snapshot whenever it changes, until it reaches a terminal status.
+        Yields None on keep-alive ticks (and re-reads the DB, covering other processes).
+        """
+        last_marker = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            marker = (job["status"], job["stage"], job["progress"], job["updated_at"])
+            if marker != last_marker:
+                last_marker = marker
+                yield job
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+            else:
+                yield None
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    pass
+
+    # --- WORKERS ---
+
+    async def _worker_loop(self, index: int) -> None:
+        while True:
+            try:
+                job = self._claim_next()
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=2.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("job_worker_error", worker=index, error=str(e))
+                await asyncio.sleep(1)
+
+    async def _run(self, job: dict) -> None:
+        job_id = job["id"]
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            await self._finish(job_id, "failed", error=f"No handler for kind '{job['kind']}'")
+            return
+
+        def report(stage: str, progress: float) -> None:
+            self._execute(
+                "UPDATE jobs SET stage = ?, progress = ?, updated_at = ? WHERE id = ?",
+                (stage, max(0.0, min(1.0, progress)), time.time(), job_id),
+            )
+            self._notify()
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            logger.info("job_started", job_id=job_id, kind=job["kind"], attempt=job["attempts"])
+            result = await handler(job_id, job["payload"], report)
+            await self._finish(job_id, "done", result=result)
+        except asyncio.CancelledError:
+            # Shutdown: leave it 'running' so the reaper re-queues it on next start.
+            raise
+        except Exception as e:
+            logger.error("job_failed", job_id=job_id, error=str(e))
+            await self._finish(job_id, "failed", error=str(e))
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        interval = max(1.0, self.stale_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            self._execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    async def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, stage = ?, progress = COALESCE(?, progress), result = ?, error = ?, "
+            "updated_at = ? WHERE id = ?",
+            (
+                status, status, 1.0 if status == "done" else None,
+                json.dumps(result) if result is not None else None,
+                error, time.time(), job_id,
+            ),
+        )
+        job = self.get(job_id)
+        if job:
+            self._cleanup(job["payload"])
+        self._notify()
+
+    def _claim_next(self) -> Optional[dict]:
+        with self._lock:
+            cur = self._conn.cursor()
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+                row = cur.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    cur.execute("COMMIT")
+                    return None
+                cur.execute(
+                    "UPDATE jobs SET status = 'running', stage = 'started', attempts = attempts + 1, "
+                    "worker = ?, updated_at = ? WHERE id = ?",
+                    (self.worker_id, time.time(), row["id"]),
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        job = self._row_to_dict(row)
+        job["attempts"] += 1
+        self._notify()
+        return job
+
+    async def _reaper_loop(self) -> None:
+        while True:
+            try:
+                self._requeue_stale()
+            except Exception as e:
+                logger.error("job_reaper_error", error=str(e))
+            await asyncio.sleep(max(5.0, self.stale_seconds / 2))
+
+    def _requeue_stale(self) -> None:
+        cutoff = time.time() - self.stale_seconds
+        now = time.time()
+        exhausted = self._execute(
+            "SELECT id, payload FROM jobs WHERE status = 'running' AND updated_at < ? AND attempts >= ?",
+            (cutoff, self.max_attempts),
+        ).fetchall()
+        for row in exhausted:
+            self._execute(
+                "UPDATE jobs SET status = 'failed', stage = 'failed', error = 'Too many attempts', updated_at = ? "
+                "WHERE id = ?",
+                (now, row["id"]),
+            )
+            self._cleanup(json.loads(row["payload"]))
+        cur = self._execute(
+            "UPDATE jobs SET status = 'queued', stage = 'requeued', updated_at = ? "
+            "WHERE status = 'running' AND updated_at < ?",
+            (now, cutoff),
+        )
+        if cur.rowcount:
+            logger.warning("jobs_requeued", count=cur.rowcount)
+            self._wakeup.set()
+
+    def _release_own(self) -> None:
+        # Jobs left 'running' under our worker id cannot be in progress: either we
+        # are shutting down or a previous process with the same host:pid died.
+        cur = self._execute(
+            "UPDATE jobs SET status = 'queued', stage = 'requeued', updated_at = ? "
+            "WHERE status = 'running' AND worker = ?",
+            (time.time(), self.worker_id),
+        )
+        if cur.rowcount:
+            logger.info("jobs_released", count=cur.rowcount)
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        self._execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+        )
+
+    # --- HELPERS ---
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    @staticmethod
+    def _cleanup(payload: dict) -> None:
+        path = payload.get("upload_path")
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _notify(self) -> None:
+        if self._changed is None:
+            return
+
+        async def _notify_all():
+            async with self._changed:
+                self._changed.notify_all()
+
+        asyncio.ensure_future(_notify_all())
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job.get("payload") else {}
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        return job
@@ -0,0 +1,68 @@
+import json
+from typing import Iterator, Optional
+
+
+class ArrayItemStream:
+    """
+    Incremental scanner for a JSON object arriving in text fragments.
+
+    feed() returns the elements of the top-level array `key` that have been
+    fully received so far (each one exactly once), without waiting for the
+    rest of the document. Only string/escape state and nesting depth are
+    tracked; complete elements are decoded with json.loads.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._in_array = False
+        self._item_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, fragment: str) -> Iterator[dict]:
+        self._text += fragment
+        text = self._text
+        for pos in range(self._pos, len(text)):
+            ch = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start:pos]
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos + 1
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._last_string == self.key:
+                    self._in_array = True
+                elif ch == "{" and self._in_array and self._depth == 3:
+                    self._item_start = pos
+            elif ch in "}]":
+                if ch == "}" and self._in_array and self._depth == 3 and self._item_start is not None:
+                    item = json.loads(text[self._item_start:pos + 1])
+                    self._item_start = None
+                    yield item
+                elif ch == "]" and self._in_array and self._depth == 2:
+                    self._in_array = False
+                    self._last_string = None
+                self._depth -= 1
+        self._pos = len(text)
+
+    def result(self) -> dict:
+        """The whole document, once the stream is over."""
+        return json.loads(self._text)
@@ -0,0 +1,208 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import List, Optional
+
+import structlog
+from firebase_admin import exceptions, messaging
+
+from app.broadcast import BROADCAST_TOPIC, broadcast_payload
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.firebase_io import firebase_io
+from app.services.notification_service import diet_ready_message
+
+logger = structlog.get_logger()
+
+# The token is gone for good: the app was uninstalled or the token rotated
+DEAD_TOKEN_ERRORS = (messaging.UnregisteredError, messaging.SenderIdMismatchError)
+# Worth another try later; everything else (bad payload, auth) is dropped
+TRANSIENT_ERRORS = (
+    exceptions.UnavailableError, exceptions.InternalError, exceptions.DeadlineExceededError,
+    exceptions.ResourceExhaustedError, exceptions.UnknownError,
+)
+
+
+@dataclass
+class _Pending:
+    message: messaging.Message
+    key: tuple
+    attempts: int = 0
+
+
+class NotificationDispatcher:
+    """
+    Fire-and-forget FCM delivery for the endpoints.
+
+    send_diet_ready() / broadcast() only enqueue. A single consumer task
+    drains the queue every NOTIFY_BATCH_WINDOW_MS, drops duplicates (same
+    target and content) and sends up to NOTIFY_BATCH_SIZE messages per
+    messaging.send_each call, on the firebase_io executor. Transient failures
+    are re-queued with exponential backoff and jitter, up to
+    NOTIFY_MAX_ATTEMPTS. Tokens reported as unregistered are remembered and
+    skipped from then on.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.NOTIFY_BATCH_SIZE,
+        batch_window: float = settings.NOTIFY_BATCH_WINDOW_MS / 1000,
+        max_attempts: int = settings.NOTIFY_MAX_ATTEMPTS,
+        backoff: float = settings.NOTIFY_BACKOFF_SECONDS,
+        max_backoff: float = settings.NOTIFY_BACKOFF_MAX_SECONDS,
+        queue_size: int = settings.NOTIFY_QUEUE_MAX_SIZE,
+    ):
+        self.batch_size = min(batch_size, 500)  # send_each limit
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.queue_size = queue_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._retries: set = set()
+        self._dead_tokens = TTLCache(maxsize=settings.NOTIFY_DEAD_TOKEN_MAX_ENTRIES, ttl=settings.NOTIFY_DEAD_TOKEN_TTL_SECONDS)
+        self.enqueued = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.dropped = 0
+        self.pruned = 0
+        self.skipped_dead = 0
+
+    # --- LIFECYCLE ---
+
+    async def start(self) -> None:
+        # A fresh queue per event loop (asyncio primitives bind to the first loop that waits on them)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        # Flush what is already queued; pending retries are abandoned
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("notifications_unsent", queued=self._queue.qsize())
+        for handle in self._retries:
+            handle.cancel()
+        if self._retries:
+            logger.warning("notification_retries_abandoned", count=len(self._retries))
+        self._retries.clear()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    # --- PUBLIC API ---
+
+    def send_diet_ready(self, fcm_token: str, data: dict = None) -> bool:
+        if not fcm_token or not isinstance(fcm_token, str):
+            logger.warning("notification_skipped", reason="invalid_fcm_token")
+            return False
+        if fcm_token in self._dead_tokens:
+            self.skipped_dead += 1
+            return False
+        message = diet_ready_message(fcm_token, data)
+        return self._enqueue(_Pending(message, ("token", fcm_token, tuple(sorted(message.data.items())))))
+
+    def broadcast(self, title: str, body: str, data: dict = None, topic: str = BROADCAST_TOPIC) -> bool:
+        message = broadcast_payload(title, body, data, topic)
+        return self._enqueue(_Pending(message, ("topic", topic, title, body, tuple(sorted((data or {}).items())))))
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "retry_pending": len(self._retries),
+            "dead_tokens": len(self._dead_tokens),
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "pruned": self.pruned,
+            "skipped_dead": self.skipped_dead,
+        }
+
+    # --- INTERNALS ---
+
+    def _enqueue(self, pending: _Pending, retry: bool = False) -> bool:
+        try:
+            self._queue.put_nowait(pending)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("notification_dropped", reason="queue_full", retry=retry)
+            return False
+        if not retry:
+            self.enqueued += 1
+        return True
+
+    def _drain(self, batch: List[_Pending]) -> None:
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.batch_size and self.batch_window > 0:
+                # [PERF] Let a burst (broadcast fan-out, job completions) fill the batch
+                await asyncio.sleep(self.batch_window)
+                self._drain(batch)
+            try:
+                await self._send(batch)
+            except Exception as e:
+                logger.error("notification_batch_error", error=str(e), size=len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send(self, batch: List[_Pending]) -> None:
+        unique = {}
+        for pending in batch:
+            if pending.key in unique:
+                self.coalesced += 1
+            else:
+                unique[pending.key] = pending
+        pending_list = list(unique.values())
+
+        self.batches += 1
+        try:
+            response = await firebase_io.call("fcm_batch", messaging.send_each, [p.message for p in pending_list])
+        except Exception as e:
+            for pending in pending_list:
+                self._retry_or_fail(pending, e)
+            return
+
+        for pending, result in zip(pending_list, response.responses):
+            if result.success:
+                self.sent += 1
+            elif isinstance(result.exception, DEAD_TOKEN_ERRORS) and pending.message.token:
+                self._dead_tokens.set(pending.message.token, True)
+                self.pruned += 1
+            else:
+                self._retry_or_fail(pending, result.exception)
+        logger.info("notifications_sent", batch=len(pending_list), success=response.success_count, failure=response.failure_count)
+
+    def _retry_or_fail(self, pending: _Pending, error: Exception) -> None:
+        pending.attempts += 1
+        if not isinstance(error, TRANSIENT_ERRORS) or pending.attempts >= self.max_attempts:
+            self.failed += 1
+            logger.warning("notification_failed", error=str(error), error_type=type(error).__name__, attempts=pending.attempts)
+            return
+        self.retried += 1
+        delay = min(self.max_backoff, self.backoff * 2 ** (pending.attempts - 1)) * random.uniform(0.5, 1.0)
+
+        def requeue():
+            self._retries.discard(handle)
+            self._enqueue(pending, retry=True)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries.add(handle)
+
+
+notification_dispatcher = NotificationDispatcher()
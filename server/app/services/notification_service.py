@@ -1,7 +1,22 @@
 import firebase_admin
+import structlog
 from firebase_admin import credentials, messaging
 import os
 
+from app.core.metrics import span
+
+logger = structlog.get_logger()
+
+def diet_ready_message(fcm_token: str, data: dict = None) -> messaging.Message:
+    return messaging.Message(
+        notification=messaging.Notification(
+            title="Dieta Pronta! 🥗",
+            body="Il tuo piano nutrizionale è stato elaborato."
+        ),
+        data={k: str(v) for k, v in (data or {}).items()},
+        token=fcm_token,
+    )
+
 class NotificationService:
     _initialized = False
 
@@ -20,26 +35,21 @@ class NotificationService:
             try:
                 cred = credentials.Certificate(key_path)
                 firebase_admin.initialize_app(cred)
-                print("🔥 Firebase Admin Initialized")
+                logger.info("firebase_initialized")
             except Exception as e:
-                print(f"⚠️ Firebase Init Error: {e}")
+                logger.warning("firebase_init_error", error=str(e))
         else:
-            print("⚠️ serviceAccountKey.json not found. Notifications disabled.")
+            logger.warning("notifications_disabled", reason="serviceAccountKey.json not found")
             
-    def send_diet_ready(self, fcm_token: str) -> None:
+    def send_diet_ready(self, fcm_token: str, data: dict = None) -> None:
         if not fcm_token or not isinstance(fcm_token, str):
-            print("⚠️ Skipping notification: Invalid FCM token")
+            logger.warning("notification_skipped", reason="invalid_fcm_token")
             return
         
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title="Dieta Pronta! 🥗",
-                    body="Il tuo piano nutrizionale è stato elaborato."
-                ),
-                token=fcm_token,
-            )
-            response = messaging.send(message)
-            print(f"✅ Notification sent: {response}")
+            message = diet_ready_message(fcm_token, data)
+            with span("fcm_send"):
+                response = messaging.send(message)
+            logger.info("notification_sent", message_id=response)
         except Exception as e:
-            print(f"⚠️ Notification Error: {e}")
\ No newline at end of file
+            logger.warning("notification_error", error=str(e))
\ No newline at end of file
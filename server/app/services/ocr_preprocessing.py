@@ -0,0 +1,115 @@
+import os
+from typing import List
+
+import cv2
+import numpy as np
+import pytesseract
+
+from app.core.config import settings
+from app.core.workers import process_pool_size, run_in_process_pool
+
+# Thermal receipts are ~80mm wide: target width in pixels for OCR_TARGET_DPI
+RECEIPT_WIDTH_INCHES = 80 / 25.4
+# Contour detection runs on a small preview, never on the 12+ MP original
+PREVIEW_MAX_SIDE = 1000
+MAX_DESKEW_DEGREES = 15
+
+
+def _largest_document_contour(gray: np.ndarray):
+    scale = min(1.0, PREVIEW_MAX_SIDE / max(gray.shape))
+    preview = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    blurred = cv2.GaussianBlur(preview, (5, 5), 0)
+    _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    contour = max(contours, key=cv2.contourArea)
+    # Ignore specks: the receipt should cover a meaningful part of the photo
+    if cv2.contourArea(contour) < 0.15 * preview.shape[0] * preview.shape[1]:
+        return None
+    return (contour / scale).astype(np.int32)
+
+
+def _crop_and_deskew(gray: np.ndarray) -> np.ndarray:
+    contour = _largest_document_contour(gray)
+    if contour is None:
+        return gray
+
+    (cx, cy), (w, h), angle = cv2.minAreaRect(contour)
+    # minAreaRect angles are in (0, 90]: map to the smallest rotation, (-45, 45]
+    if angle > 45:
+        angle -= 90
+        w, h = h, w
+    if abs(angle) > MAX_DESKEW_DEGREES:
+        angle = 0.0
+
+    if abs(angle) >= 0.5:
+        matrix = cv2.getRotationMatrix2D((cx, cy), angle, 1.0)
+        gray = cv2.warpAffine(gray, matrix, (gray.shape[1], gray.shape[0]),
+                              flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    x0, y0 = max(0, int(cx - w / 2)), max(0, int(cy - h / 2))
+    x1, y1 = min(gray.shape[1], int(cx + w / 2)), min(gray.shape[0], int(cy + h / 2))
+    if x1 - x0 < 50 or y1 - y0 < 50:
+        return gray
+    return gray[y0:y1, x0:x1]
+
+
+def preprocess_receipt(data: bytes) -> np.ndarray:
+    """
+    Photo -> clean binary image for Tesseract:
+    grayscale, crop to the receipt contour, deskew, downscale to OCR_TARGET_DPI,
+    adaptive threshold (uneven lighting, thermal-paper fading).
+    """
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Immagine non decodificabile")
+
+    gray = _crop_and_deskew(gray)
+
+    target_width = int(RECEIPT_WIDTH_INCHES * settings.OCR_TARGET_DPI)
+    if gray.shape[1] > target_width:
+        scale = target_width / gray.shape[1]
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+
+
+def split_strips(binary: np.ndarray, strip_height: int) -> List[np.ndarray]:
+    """
+    Splits a tall receipt into horizontal strips, moving each cut to the
+    whitest row nearby so no text line is sliced in half.
+    """
+    height = binary.shape[0]
+    if height <= strip_height * 1.5:
+        return [binary]
+
+    ink_per_row = (binary < 128).sum(axis=1)
+    window = strip_height // 5
+    cuts = [0]
+    while height - cuts[-1] > strip_height * 1.5:
+        nominal = cuts[-1] + strip_height
+        lo, hi = nominal - window, min(height - 1, nominal + window)
+        cuts.append(lo + int(np.argmin(ink_per_row[lo:hi])))
+    cuts.append(height)
+    return [binary[a:b] for a, b in zip(cuts, cuts[1:])]
+
+
+def _ocr_strip(png_bytes: bytes, lang: str, config: str) -> str:
+    # Runs in a worker process; one Tesseract thread each, the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    strip = cv2.imdecode(np.frombuffer(png_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    return pytesseract.image_to_string(strip, lang=lang, config=config)
+
+
+def ocr_receipt_image(data: bytes, lang: str = 'ita', parallel: bool = True) -> str:
+    binary = preprocess_receipt(data)
+    strips = split_strips(binary, settings.OCR_STRIP_HEIGHT)
+    config = settings.OCR_TESSERACT_CONFIG
+
+    if not parallel or len(strips) == 1 or process_pool_size() < 2:
+        return "\n".join(pytesseract.image_to_string(s, lang=lang, config=config) for s in strips)
+
+    encoded = [cv2.imencode(".png", s)[1].tobytes() for s in strips]
+    return "\n".join(run_in_process_pool(_ocr_strip, ((png, lang, config) for png in encoded)))
@@ -0,0 +1,42 @@
+import io
+import math
+
+import pdfplumber
+
+from app.core.config import settings
+from app.core.workers import process_pool_size, run_in_process_pool
+
+
+def _extract_page_range(pdf_bytes: bytes, start: int, end: int, layout: bool) -> list[str]:
+    # Runs inside a worker process: each worker opens its own copy of the document.
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return [pdf.pages[i].extract_text(layout=layout) or "" for i in range(start, end)]
+
+
+def _page_ranges(page_count: int, workers: int) -> list[tuple[int, int]]:
+    chunk = max(settings.PDF_PAGES_PER_CHUNK, math.ceil(page_count / workers))
+    return [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+
+
+def extract_pdf_text(pdf_bytes: bytes, max_pages: int, layout: bool = True, parallel: bool = True) -> str:
+    """
+    Extracts the text of every page, one line break after each non-empty page.
+    Documents above PDF_PARALLEL_MIN_PAGES are split into page ranges and fanned
+    out to the shared process pool; pages are reassembled in their original order.
+    """
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        page_count = len(pdf.pages)
+        if page_count > max_pages:
+            raise ValueError(f"Il PDF ha troppe pagine (Max {max_pages}).")
+
+        workers = process_pool_size()
+        if not parallel or workers < 2 or page_count < settings.PDF_PARALLEL_MIN_PAGES:
+            pages = [page.extract_text(layout=layout) or "" for page in pdf.pages]
+            return "".join(f"{text}\n" for text in pages if text)
+
+    chunks = run_in_process_pool(
+        _extract_page_range,
+        ((pdf_bytes, start, end, layout) for start, end in _page_ranges(page_count, workers)),
+    )
+    pages = [text for chunk in chunks for text in chunk]
+    return "".join(f"{text}\n" for text in pages if text)
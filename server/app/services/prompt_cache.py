@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import structlog
+from google.genai import types
+
+from app.core.config import settings
+from app.services.gemini_gateway import GeminiGateway, gemini_gateway
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class CachedPrompt:
+    name: str
+    expires_at: float
+
+
+class PromptCacheManager:
+    """
+    Server-side Gemini context caches for long system instructions.
+
+    The default prompt and each nutritionist's custom_parser_prompt are uploaded
+    once as cached content and referenced by handle, instead of being resent
+    (and re-processed) on every parse. Handles are keyed by (prompt hash, model),
+    have their TTL extended when close to expiry, and are evicted when
+    upload_parser_config replaces a prompt. Handles live in this process:
+    evict() only affects the current worker, the others keep using the old
+    handle until it expires (PROMPT_CACHE_TTL_SECONDS).
+    Prompts shorter than PROMPT_CACHE_MIN_CHARS are sent inline: the API
+    rejects caches below its minimum token count.
+    """
+
+    def __init__(self, gateway: GeminiGateway = gemini_gateway):
+        self.gateway = gateway
+        self.ttl_seconds = settings.PROMPT_CACHE_TTL_SECONDS
+        self.refresh_margin = max(60, self.ttl_seconds // 5)
+        self._handles: Dict[Tuple[str, str], CachedPrompt] = {}
+        # Creation failures (quota, unsupported model...) are not retried on every call
+        self._failed_until: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.created = 0
+        self.reused = 0
+        self.refreshed = 0
+        self.evicted = 0
+
+    @staticmethod
+    def prompt_hash(system_instruction: str) -> str:
+        return hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()
+
+    async def get_handle(self, system_instruction: str, model: str) -> Optional[str]:
+        if not settings.PROMPT_CACHE_ENABLED or len(system_instruction) < settings.PROMPT_CACHE_MIN_CHARS:
+            return None
+        key = (self.prompt_hash(system_instruction), model)
+        if self._failed_until.get(key, 0) > time.time():
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = self._handles.get(key)
+            now = time.time()
+            if cached and cached.expires_at - now > self.refresh_margin:
+                self.reused += 1
+                return cached.name
+            if cached and cached.expires_at > now:
+                if await self._refresh(key, cached):
+                    return cached.name
+            return await self._create(key, system_instruction, model)
+
+    async def _create(self, key: Tuple[str, str], system_instruction: str, model: str) -> Optional[str]:
+        try:
+            content = await self.gateway.client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    display_name=f"kybo-prompt-{key[0][:16]}",
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning("prompt_cache_create_failed", prompt=key[0][:12], model=model, error=str(e))
+            self._failed_until[key] = time.time() + settings.PROMPT_CACHE_RETRY_SECONDS
+            return None
+        self._handles[key] = CachedPrompt(name=content.name, expires_at=time.time() + self.ttl_seconds)
+        self.created += 1
+        logger.info("prompt_cache_created", prompt=key[0][:12], model=model, name=content.name)
+        return content.name
+
+    async def _refresh(self, key: Tuple[str, str], cached: CachedPrompt) -> bool:
+        try:
+            await self.gateway.client.aio.caches.update(
+                name=cached.name,
+                config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"),
+            )
+        except Exception as e:
+            logger.warning("prompt_cache_refresh_failed", name=cached.name, error=str(e))
+            self._handles.pop(key, None)
+            return False
+        cached.expires_at = time.time() + self.ttl_seconds
+        self.refreshed += 1
+        return True
+
+    async def evict(self, system_instruction: str, model: Optional[str] = None) -> None:
+        """Drops (and deletes server-side) the handles of a prompt that is no longer in use."""
+        prompt_hash = self.prompt_hash(system_instruction)
+        keys = {*self._handles, *self._locks, *self._failed_until}
+        for key in [k for k in keys if k[0] == prompt_hash and (model is None or k[1] == model)]:
+            await self.discard(key[0], key[1])
+
+    async def discard(self, prompt_hash: str, model: str) -> None:
+        cached = self._handles.pop((prompt_hash, model), None)
+        self._failed_until.pop((prompt_hash, model), None)
+        # A caller still holding the lock finishes normally; the next one gets a new lock
+        self._locks.pop((prompt_hash, model), None)
+        if cached is None:
+            return
+        self.evicted += 1
+        try:
+            await self.gateway.client.aio.caches.delete(name=cached.name)
+        except Exception as e:
+            # Already expired server-side: nothing left to clean up
+            logger.info("prompt_cache_delete_failed", name=cached.name, error=str(e))
+
+    def stats(self) -> dict:
+        return {
+            "handles": len(self._handles),
+            "created": self.created,
+            "reused": self.reused,
+            "refreshed": self.refreshed,
+            "evicted": self.evicted,
+        }
+
+
+prompt_cache = PromptCacheManager()
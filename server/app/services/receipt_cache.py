@@ -0,0 +1,108 @@
+import hashlib
+import io
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+# 64x64 gradient bits: at 16x16, two receipts with the same layout differed by fewer
+# bits than a re-encode of the same photo; at 64x64 they are ~5x further apart
+DHASH_SIZE = 64
+PHASHES_PER_USER = 16
+_WHITESPACE = re.compile(r"[ \t]+")
+
+
+def image_dhash(data: bytes, size: int = DHASH_SIZE) -> Optional[int]:
+    """Difference hash of a photo: stable across re-encoding and resizing, not across a re-crop."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # [PERF] JPEGs are decoded at a reduced scale (~40 ms for 12 MP instead of ~200 ms);
+            # 4x the hash size, so a half-size copy decodes to the same dimensions
+            img.draft("L", ((size + 1) * 4, size * 4))
+            small = img.convert("L").resize((size + 1, size), Image.LANCZOS)
+    except Exception:
+        return None
+    pixels = np.asarray(small, dtype=np.int16)
+    return int.from_bytes(np.packbits(pixels[:, :-1] > pixels[:, 1:]).tobytes(), "big")
+
+
+def normalize_receipt_text(text: str) -> str:
+    lines = (_WHITESPACE.sub(" ", line).strip().lower() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class ReceiptCache:
+    """
+    Two levels, both keyed per user (a receipt never leaks to another account):
+
+    1. OCR text by file hash; for photos also by perceptual hash (dHash within
+       RECEIPT_PHASH_MAX_DISTANCE bits of one of the user's recent scans), so
+       a recompressed or resized copy of the same photo skips Tesseract.
+    2. Scan result by normalized OCR text + allowed-foods hash + mode, so the
+       same text skips local matching and Gemini.
+
+    Only complete results are stored (not the local-only fallback used when
+    Gemini fails). Entries expire after RECEIPT_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(
+        self,
+        ttl: int = settings.RECEIPT_CACHE_TTL_SECONDS,
+        text_items: int = settings.RECEIPT_TEXT_CACHE_ITEMS,
+        result_items: int = settings.RECEIPT_RESULT_CACHE_ITEMS,
+        max_distance: int = settings.RECEIPT_PHASH_MAX_DISTANCE,
+    ):
+        self.texts = TTLCache(maxsize=text_items, ttl=ttl)
+        self.results = TTLCache(maxsize=result_items, ttl=ttl)
+        self._phashes = TTLCache(maxsize=text_items, ttl=ttl)  # uid -> [(dhash, file hash)]
+        self.max_distance = max_distance
+        self.phash_hits = 0
+
+    @staticmethod
+    def file_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def get_text(self, uid: str, file_hash: str, phash: Optional[int]) -> Optional[str]:
+        text = self.texts.get((uid, file_hash))
+        if text is not None or phash is None or self.max_distance < 0:
+            return text
+        for known, known_hash in self._phashes.get(uid, ()):
+            if (known ^ phash).bit_count() <= self.max_distance:
+                text = self.texts.get((uid, known_hash))
+                if text is not None:
+                    self.phash_hits += 1
+                    return text
+        return None
+
+    def set_text(self, uid: str, file_hash: str, phash: Optional[int], text: str) -> None:
+        self.texts.set((uid, file_hash), text)
+        if phash is not None:
+            # Copy-on-write: readers in other threads iterate the old list
+            recent = [entry for entry in self._phashes.get(uid, ()) if entry[1] != file_hash]
+            self._phashes.set(uid, (recent + [(phash, file_hash)])[-PHASHES_PER_USER:])
+
+    @staticmethod
+    def result_key(uid: str, text: str, foods_key: str, mode: str) -> Tuple[str, str, str, str]:
+        text_hash = hashlib.sha256(normalize_receipt_text(text).encode("utf-8")).hexdigest()
+        return uid, text_hash, foods_key, mode
+
+    def get_result(self, key: tuple) -> Optional[List[dict]]:
+        items = self.results.get(key)
+        return list(items) if items is not None else None
+
+    def set_result(self, key: tuple, items: List[dict]) -> None:
+        self.results.set(key, list(items))
+
+    def stats(self) -> dict:
+        return {
+            "text": self.texts.stats(),
+            "result": self.results.stats(),
+            "phash_hits": self.phash_hits,
+        }
+
+
+receipt_cache = ReceiptCache()
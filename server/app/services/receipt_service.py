@@ -1,12 +1,21 @@
 import pytesseract
+import structlog
 from PIL import Image, UnidentifiedImageError
-import pdfplumber
-import os
+import io
 import json
+import asyncio
 import typing_extensions as typing
-from google import genai
 from google.genai import types
 from app.core.config import settings
+from app.core.metrics import span
+from app.core.uploads import UploadSource, read_source
+from app.services.pdf_extraction import extract_pdf_text
+from app.services.ocr_preprocessing import ocr_receipt_image
+from app.services.gemini_gateway import gemini_gateway
+from app.services.food_matcher import foods_key, get_food_index, parse_receipt_lines
+from app.services.receipt_cache import ReceiptCache, image_dhash, receipt_cache
+
+logger = structlog.get_logger()
 
 # --- DATA SCHEMAS ---
 class ReceiptItem(typing.TypedDict):
@@ -18,18 +27,14 @@ class ReceiptAnalysis(typing.TypedDict):
 
 class ReceiptScanner:
     def __init__(self, allowed_foods_list: list[str]):
-        # [INIT] Setup Gemini Client (The "Diet Way")
-        api_key = settings.GOOGLE_API_KEY
-        if not api_key:
-            print("❌ CRITICAL ERROR: GOOGLE_API_KEY not found!")
-            self.client = None
-        else:
-            clean_key = api_key.strip().replace('"', '').replace("'", "")
-            self.client = genai.Client(api_key=clean_key)
-
-        # Optimize list for Prompt Context
-        self.allowed_foods_str = ", ".join([str(f).lower().strip() for f in allowed_foods_list if f])
-        print(f"[INFO] Receipt Context: {len(allowed_foods_list)} allowed foods loaded for AI context.")
+        # [INIT] Shared process-wide Gemini client (no per-request client/TLS setup)
+        self.gemini = gemini_gateway
+
+        # [PERF] Local matcher: cached per distinct food list, resolves obvious lines without Gemini
+        self.food_index = get_food_index(allowed_foods_list)
+        self.foods_key = foods_key(allowed_foods_list)
+        self.cache = receipt_cache if settings.RECEIPT_CACHE_ENABLED else None
+        logger.debug("receipt_context_loaded", allowed_foods=len(allowed_foods_list))
 
         # [FIX] Relaxed rules to allow all food items while prioritizing the diet list
         self.system_instruction = """
@@ -44,65 +49,111 @@ class ReceiptScanner:
         4. **Output Format**: Return a strictly structured JSON with a list of items.
         """
 
-    def extract_text_from_file(self, file_path):
+    def extract_text_from_file(self, source: UploadSource, filename: str = None):
+        # [PERF] Accepts a path, raw bytes or an in-memory upload buffer
         text = ""
+        filename = filename or (source if isinstance(source, str) else "")
         try:
+            data = read_source(source)
             # DoS Protection: Check file size (Max 10MB)
-            if os.path.getsize(file_path) > 10 * 1024 * 1024:
-                print("❌ File too large for OCR")
+            if len(data) > 10 * 1024 * 1024:
+                logger.warning("receipt_file_too_large", size=len(data))
                 return ""
 
-            if file_path.lower().endswith('.pdf'):
-                print("  📄 Mode: Digital PDF")
-                with pdfplumber.open(file_path) as pdf:
-                    if len(pdf.pages) > 20:
-                        print("❌ PDF exceeds page limit (20)")
-                        return ""
-                    for page in pdf.pages:
-                        extracted = page.extract_text()
-                        if extracted: text += extracted + "\n"
+            if filename.lower().endswith('.pdf'):
+                logger.debug("receipt_extract", mode="pdf")
+                text = extract_pdf_text(data, max_pages=20, layout=False)
             else:
-                print("  📷 Mode: Image OCR")
-                with Image.open(file_path) as img:
+                logger.debug("receipt_extract", mode="ocr")
+                Image.MAX_IMAGE_PIXELS = 20000000
+                with Image.open(io.BytesIO(data)) as img:
                     img.verify()
-                with Image.open(file_path) as img:
-                    Image.MAX_IMAGE_PIXELS = 20000000
-                    text = pytesseract.image_to_string(img, lang='ita')
+                    if img.width * img.height > Image.MAX_IMAGE_PIXELS:
+                        raise ValueError("Image too large for OCR")
+                try:
+                    # [PERF] Crop/deskew/downscale/threshold, then OCR strips in parallel
+                    text = ocr_receipt_image(data, lang='ita')
+                except ValueError:
+                    # Formats OpenCV can't decode: plain Tesseract on the Pillow image
+                    with Image.open(io.BytesIO(data)) as img:
+                        text = pytesseract.image_to_string(img, lang='ita')
         except UnidentifiedImageError:
-            print("[FILE ERROR] Invalid image format")
+            logger.warning("receipt_file_error", error="Invalid image format")
         except Exception as e:
-            print(f"[FILE ERROR] {e}")
+            logger.warning("receipt_file_error", error=str(e))
         return text
 
-    def scan_receipt(self, file_path):
-        print(f"\n--- Receipt Analysis (Gemini Powered): {file_path} ---")
-        
+    def _extract_text_cached(self, source: UploadSource, filename: str, user_id: str) -> str:
+        # [PERF] Same file, or a photo of the same receipt, scanned again by this user: no OCR
+        filename = filename or (source if isinstance(source, str) else "")
+        data = read_source(source)
+        file_hash = ReceiptCache.file_hash(data)
+        phash = None if filename.lower().endswith('.pdf') else image_dhash(data)
+        text = self.cache.get_text(user_id, file_hash, phash)
+        if text is None:
+            text = self.extract_text_from_file(data, filename)
+            if text:
+                self.cache.set_text(user_id, file_hash, phash, text)
+        return text
+
+    # mode: "hybrid" (local matches + Gemini for the rest), "local_only", or "llm" (whole receipt to Gemini)
+    async def scan_receipt(self, source: UploadSource, filename: str = None, mode: str = "hybrid", user_id: str = None):
+        # Caching is per user: anonymous calls (scripts, benchmarks) skip it
+        cache = self.cache if user_id else None
+
         # 1. Extract Raw Text (OCR)
-        full_text = self.extract_text_from_file(file_path)
+        with span("receipt_extract"):
+            if cache:
+                full_text = await asyncio.to_thread(self._extract_text_cached, source, filename, user_id)
+            else:
+                full_text = await asyncio.to_thread(self.extract_text_from_file, source, filename)
         if not full_text: 
             return []
+
+        result_key = None
+        if cache:
+            result_key = cache.result_key(user_id, full_text, self.foods_key, mode)
+            cached_items = cache.get_result(result_key)
+            if cached_items is not None:
+                logger.info("receipt_cache_hit", items=len(cached_items), mode=mode)
+                return cached_items
+
+        # 2. Resolve high-confidence lines locally
+        resolved = []
+        receipt_text = full_text
+        candidate_foods = [food for food, _ in self.food_index.foods]
+        if mode != "llm":
+            with span("receipt_match"):
+                lines = parse_receipt_lines(full_text)
+                resolved, unresolved = self.food_index.resolve(lines)
+            logger.info("receipt_local_matches", resolved=len(resolved), lines=len(lines))
+            if mode == "local_only" or not unresolved:
+                if result_key: cache.set_result(result_key, resolved)
+                return resolved
+            receipt_text = "\n".join(line.raw for line in unresolved)
+            candidate_foods = self.food_index.prune(unresolved)
         
-        # 2. Prepare Prompt
-        if not self.client:
-            print("⚠️ Gemini Client missing. Returning empty.")
-            return []
+        # 3. Prepare Prompt (only what's left, with a pruned food list)
+        if not self.gemini.available:
+            logger.warning("receipt_gemini_unavailable", returned="local_matches")
+            return resolved
 
+        allowed_foods_str = ", ".join(f.lower() for f in candidate_foods)
         prompt = f"""
         <allowed_foods_list>
-        {self.allowed_foods_str}
+        {allowed_foods_str}
         </allowed_foods_list>
 
         <receipt_text>
-        {full_text}
+        {receipt_text}
         </receipt_text>
         """
 
         try:
             model_name = settings.GEMINI_MODEL
-            print(f"🤖 Sending to Gemini ({model_name})...")
 
-            # 3. Call Gemini
-            response = self.client.models.generate_content(
+            # 4. Call Gemini
+            response = await self.gemini.generate(
                 model=model_name,
                 contents=prompt,
                 config=types.GenerateContentConfig(
@@ -112,8 +163,8 @@ class ReceiptScanner:
                 )
             )
 
-            # 4. Parse Response
-            found_items = []
+            # 5. Parse Response
+            found_items = list(resolved)
             if hasattr(response, 'parsed') and response.parsed:
                 data = response.parsed
                 # Handle both dict and object return types from SDK
@@ -124,16 +175,16 @@ class ReceiptScanner:
                     qty = item.get('quantity') if isinstance(item, dict) else item.quantity
                     
                     if name:
-                        print(f"  ✅ MATCH: {name} (Qty: {qty})")
                         found_items.append({
                             "name": name,
                             "quantity": qty, 
                             "original_scan": name 
                         })
             
-            print(f"[SUCCESS] Extracted {len(found_items)} items.")
+            logger.info("receipt_scanned", items=len(found_items), mode=mode)
+            if result_key: cache.set_result(result_key, found_items)
             return found_items
 
         except Exception as e:
-            print(f"⚠️ Gemini Error: {e}")
-            return []
\ No newline at end of file
+            logger.warning("receipt_gemini_error", error=str(e))
+            return resolved
\ No newline at end of file
@@ -0,0 +1,297 @@
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import pdfplumber
+import structlog
+
+from app.core.config import settings
+from app.core.workers import run_in_process_pool
+
+logger = structlog.get_logger()
+
+DAY_PATTERN = r"(?P<day>luned[iì]|marted[iì]|mercoled[iì]|gioved[iì]|venerd[iì]|sabato|domenica)"
+
+
+def _compile(pattern: Optional[str]) -> Optional[re.Pattern]:
+    return re.compile(pattern, re.IGNORECASE | re.MULTILINE) if pattern else None
+
+
+class DietTemplate:
+    """
+    One PDF layout, described as data (JSON in DIET_TEMPLATES_DIR):
+
+        name           unique id, reported in metrics
+        fingerprint    {"all": [regex...], "none": [regex...]} tested on the first page text
+        layout         "lines" (day/meal headings followed by dish lines)
+                       or "grid" (table: first row = days, first column = meals)
+        day_pattern    regex with a (?P<day>) group; default: Italian weekday names
+        meal_pattern   regex with a (?P<meal>) group
+        dish_pattern   regex with (?P<name>), optional (?P<qty>) and (?P<cad>) groups
+        ingredient_pattern  optional, "lines" only: lines after a dish, making it 'composto'
+        ignore_patterns     lines that are expected but carry no data (page numbers...)
+        table_settings      "grid" only: pdfplumber table_settings
+        substitutions  optional {"start_pattern", "group_pattern" (cad, title), "option_pattern" (name, qty)}
+        min_coverage   share of non-empty lines the template must account for (default 0.9)
+    """
+
+    def __init__(self, spec: dict):
+        self.name = spec["name"]
+        self.layout = spec.get("layout", "lines")
+        if self.layout not in ("lines", "grid"):
+            raise ValueError(f"Unknown template layout: {self.layout}")
+        fingerprint = spec.get("fingerprint", {})
+        self.fingerprint_all = [_compile(p) for p in fingerprint.get("all", [])]
+        self.fingerprint_none = [_compile(p) for p in fingerprint.get("none", [])]
+        self.day = _compile(spec.get("day_pattern") or rf"^{DAY_PATTERN}\b")
+        self.meal = _compile(spec["meal_pattern"])
+        self.dish = _compile(spec["dish_pattern"])
+        self.ingredient = _compile(spec.get("ingredient_pattern"))
+        self.ignore = [_compile(p) for p in spec.get("ignore_patterns", [])]
+        self.table_settings = spec.get("table_settings") or {}
+        subs = spec.get("substitutions") or {}
+        self.subs_start = _compile(subs.get("start_pattern"))
+        self.subs_group = _compile(subs.get("group_pattern"))
+        self.subs_option = _compile(subs.get("option_pattern"))
+        self.min_coverage = spec.get("min_coverage", 0.9)
+
+    def matches(self, first_page_text: str) -> bool:
+        return all(p.search(first_page_text) for p in self.fingerprint_all) and \
+            not any(p.search(first_page_text) for p in self.fingerprint_none)
+
+    def _ignored(self, line: str) -> bool:
+        return any(p.search(line) for p in self.ignore)
+
+    def _dish(self, match: re.Match) -> dict:
+        groups = match.groupdict()
+        return {
+            "nome_piatto": groups["name"].strip(),
+            "tipo": "semplice",
+            "cad_code": int(groups.get("cad") or 0),
+            "quantita_totale": (groups.get("qty") or "").strip(),
+            "ingredienti": [],
+        }
+
+    # --- lines layout ---
+
+    def parse_lines(self, lines: List[str], days: List[dict]) -> int:
+        """Fills days from day/meal headings and dish lines; returns how many lines were understood."""
+        understood = 0
+        day = meal = dish = None
+        for line in lines:
+            if m := self.day.search(line):
+                day = {"giorno": m.group("day").capitalize(), "pasti": []}
+                days.append(day)
+                meal = dish = None
+            elif day is not None and (m := self.meal.search(line)):
+                meal = {"tipo_pasto": m.group("meal").strip().title(), "elenco_piatti": []}
+                day["pasti"].append(meal)
+                dish = None
+            elif meal is not None and (m := self.dish.search(line)):
+                dish = self._dish(m)
+                meal["elenco_piatti"].append(dish)
+            elif dish is not None and self.ingredient and (m := self.ingredient.search(line)):
+                dish["tipo"] = "composto"
+                dish["ingredienti"].append({"nome": m.group("name").strip(), "quantita": (m.groupdict().get("qty") or "").strip()})
+            elif not self._ignored(line):
+                continue
+            understood += 1
+        return understood
+
+    # --- grid layout ---
+
+    def parse_table(self, table: List[List[Optional[str]]], days: List[dict]) -> tuple[int, int]:
+        """Returns (understood, total) cell lines."""
+        if not table or len(table) < 2:
+            return 0, 0
+        columns = {}
+        for idx, cell in enumerate(table[0]):
+            if cell and (m := self.day.search(cell.strip())):
+                columns[idx] = m.group("day").capitalize()
+        if not columns:
+            return 0, 0
+        by_day = {idx: {"giorno": name, "pasti": []} for idx, name in columns.items()}
+        understood = total = 0
+        for row in table[1:]:
+            meal_match = self.meal.search((row[0] or "").strip())
+            if not meal_match:
+                total += sum(len((c or "").split("\n")) for c in row if c)
+                continue
+            meal_name = meal_match.group("meal").strip().title()
+            for idx, day in by_day.items():
+                cell = row[idx] if idx < len(row) else None
+                dishes = []
+                for line in (cell or "").split("\n"):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    total += 1
+                    if m := self.dish.search(line):
+                        dishes.append(self._dish(m))
+                        understood += 1
+                    elif self._ignored(line):
+                        understood += 1
+                if dishes:
+                    day["pasti"].append({"tipo_pasto": meal_name, "elenco_piatti": dishes})
+        days.extend(by_day[idx] for idx in sorted(by_day))
+        return understood, total
+
+    # --- substitutions ---
+
+    def split_substitutions(self, lines: List[str]) -> tuple[List[str], List[str]]:
+        if not self.subs_start:
+            return lines, []
+        for i, line in enumerate(lines):
+            if self.subs_start.search(line):
+                return lines[:i], lines[i + 1:]
+        return lines, []
+
+    def parse_substitutions(self, lines: List[str], groups: List[dict]) -> int:
+        understood = 0
+        group = None
+        for line in lines:
+            if self.subs_group and (m := self.subs_group.search(line)):
+                group = {"cad_code": int(m.group("cad")), "titolo": m.group("title").strip(), "opzioni": []}
+                groups.append(group)
+            elif group is not None and self.subs_option and (m := self.subs_option.search(line)):
+                group["opzioni"].append({"nome": m.group("name").strip(), "quantita": (m.groupdict().get("qty") or "").strip()})
+            elif not self._ignored(line):
+                continue
+            understood += 1
+        return understood
+
+
+# Compiled templates per worker process, keyed by a hash of the specs they came from
+_worker_templates: Dict[str, List[DietTemplate]] = {}
+
+
+def _parse_in_worker(specs_key: str, specs: List[dict], pdf_bytes: bytes, max_pages: int):
+    # Runs inside a worker process; returns (result, name of the matching template)
+    templates = _worker_templates.get(specs_key)
+    if templates is None:
+        templates = _worker_templates[specs_key] = [DietTemplate(spec) for spec in specs]
+    result, template = _parse_with(templates, pdf_bytes, max_pages)
+    return result, template.name if template is not None else None
+
+
+def _parse_with(templates: List[DietTemplate], pdf_bytes: bytes, max_pages: int):
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        if not pdf.pages or len(pdf.pages) > max_pages:
+            return None, None
+        first_page = pdf.pages[0].extract_text() or ""
+        template = next((t for t in templates if t.matches(first_page)), None)
+        if template is None:
+            return None, None
+
+        days: List[dict] = []
+        groups: List[dict] = []
+        texts = [first_page] + [page.extract_text() or "" for page in pdf.pages[1:]]
+        lines = [l.strip() for text in texts for l in text.splitlines() if l.strip()]
+        plan_lines, subs_lines = template.split_substitutions(lines)
+        understood = template.parse_substitutions(subs_lines, groups) + (1 if subs_lines else 0)
+        total = len(subs_lines) + (1 if subs_lines else 0)
+
+        if template.layout == "lines":
+            understood += template.parse_lines(plan_lines, days)
+            total += len(plan_lines)
+        else:
+            for page in pdf.pages:
+                for table in page.extract_tables(template.table_settings):
+                    ok, seen = template.parse_table(table, days)
+                    understood += ok
+                    total += seen
+
+    dishes = sum(len(m["elenco_piatti"]) for d in days for m in d["pasti"])
+    if not dishes or not total or understood / total < template.min_coverage:
+        logger.info("diet_template_rejected", template=template.name, understood=understood, total=total)
+        return None, template
+    return {"piano_settimanale": days, "tabella_sostituzioni": groups}, template
+
+
+class TemplateParser:
+    """
+    Deterministic fast path for PDFs produced by known nutritionist software.
+
+    If the first page matches a registered template fingerprint, the document
+    is parsed with pdfplumber (text lines or extract_tables) into the same
+    OutputDietaCompleto structure Gemini returns, in milliseconds. Results
+    that account for too few lines (min_coverage) or contain no dish are
+    rejected, and the caller falls back to Gemini. pdfplumber runs in the
+    shared process pool, which receives the template specs (compiled once
+    per worker).
+    """
+
+    def __init__(self, templates_dir: str = settings.DIET_TEMPLATES_DIR):
+        self.templates: List[DietTemplate] = []
+        self._specs: List[dict] = []
+        self._specs_key = ""
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.misses = 0
+        self.rejected = 0
+        self.hits: Dict[str, int] = {}
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+        if templates_dir and os.path.isdir(templates_dir):
+            for path in sorted(glob.glob(os.path.join(templates_dir, "*.json"))):
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        self.register(json.load(f))
+                except Exception as e:
+                    logger.warning("diet_template_ignored", file=os.path.basename(path), error=str(e))
+
+    def register(self, spec: dict) -> DietTemplate:
+        template = DietTemplate(spec)
+        self.templates = [t for t in self.templates if t.name != template.name] + [template]
+        self._specs = [s for s in self._specs if s["name"] != template.name] + [spec]
+        self._specs_key = hashlib.sha256(json.dumps(self._specs, sort_keys=True).encode("utf-8")).hexdigest()
+        return template
+
+    def parse(self, pdf_bytes: bytes, max_pages: int = 50) -> Optional[dict]:
+        """OutputDietaCompleto, or None when no template applies."""
+        if not self.templates:
+            return None
+        start = time.perf_counter()
+        result, name = None, None
+        try:
+            # [PERF] pdfplumber is pure Python: in a worker process it does not hold this process's GIL
+            [(result, name)] = run_in_process_pool(
+                _parse_in_worker, [(self._specs_key, self._specs, pdf_bytes, max_pages)]
+            )
+        except Exception as e:
+            logger.warning("diet_template_error", error=str(e))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.attempts += 1
+            if result is not None:
+                self.hits[name] = self.hits.get(name, 0) + 1
+                self.hit_seconds += elapsed
+            else:
+                if name is None:
+                    self.misses += 1
+                else:
+                    self.rejected += 1
+                self.miss_seconds += elapsed
+        if result is not None:
+            logger.info("diet_template_hit", template=name, duration_ms=round(elapsed * 1000, 1))
+        return result
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        return {
+            "templates": len(self.templates),
+            "attempts": self.attempts,
+            "hits": hits,
+            "hit_rate": round(hits / self.attempts, 3) if self.attempts else 0.0,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "avg_hit_ms": round(1000 * self.hit_seconds / hits, 2) if hits else 0.0,
+            "avg_miss_ms": round(1000 * self.miss_seconds / (self.attempts - hits), 2) if self.attempts > hits else 0.0,
+            "by_template": dict(self.hits),
+        }
@@ -0,0 +1,152 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import structlog
+from firebase_admin import auth, firestore
+from google.api_core.exceptions import AlreadyExists
+
+from app.core.firebase_io import firebase_io
+
+logger = structlog.get_logger()
+
+# Firestore hard limit of operations per batched write
+BATCH_LIMIT = 500
+
+Reporter = Callable[[str, float], None]
+
+
+@dataclass
+class SyncPlan:
+    auth_users: int = 0
+    firestore_docs: int = 0
+    # Docs sharing an Auth user's email under a different id (orphans / duplicates)
+    to_delete: List[str] = field(default_factory=list)
+    # Auth users with no users/{uid} document
+    to_create: List[Dict] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            "auth_users": self.auth_users,
+            "firestore_docs": self.firestore_docs,
+            "to_delete": len(self.to_delete),
+            "to_create": len(self.to_create),
+        }
+
+
+class UserSyncEngine:
+    """
+    Reconciles Firebase Auth users with the Firestore 'users' collection.
+
+    1. Pages through every Auth user (list_users().iterate_all()).
+    2. Loads the 'users' collection once into an email -> doc ids index.
+    3. Computes the diff in memory.
+    4. Applies it with batched writes of up to 500 operations. Missing docs
+       are created with create(), never set(): a profile written meanwhile
+       (e.g. by /admin/create-user) is kept and counted as already synced.
+    Firestore goes through the async client; the Auth listing (no async API)
+    runs on firebase_io's executor, concurrently with the collection scan.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or firebase_io.db
+
+    async def _load_email_index(self) -> tuple:
+        email_index: Dict[str, List[str]] = {}
+        doc_ids = set()
+        async for doc in self.db.collection('users').select(['email']).stream():
+            doc_ids.add(doc.id)
+            email = (doc.to_dict() or {}).get('email')
+            if email:
+                email_index.setdefault(email, []).append(doc.id)
+        return email_index, doc_ids
+
+    async def plan(self, report: Optional[Reporter] = None) -> SyncPlan:
+        report = report or (lambda stage, progress: None)
+        plan = SyncPlan()
+
+        report("loading_users", 0.05)
+        users, (email_index, doc_ids) = await asyncio.gather(
+            firebase_io.call("auth_admin", lambda: list(auth.list_users().iterate_all())),
+            self._load_email_index(),
+        )
+        plan.auth_users = len(users)
+        auth_uids = {u.uid for u in users}
+        plan.firestore_docs = len(doc_ids)
+
+        report("computing_diff", 0.5)
+        to_delete = set()
+        for user in users:
+            # 1. GHOST BUSTER: docs with this email but the WRONG id. Never delete a doc
+            #    that belongs to another live Auth user (e.g. after an email change).
+            for doc_id in email_index.get(user.email, []) if user.email else []:
+                if doc_id != user.uid and doc_id not in auth_uids:
+                    to_delete.add(doc_id)
+            # 2. Missing document
+            if user.uid not in doc_ids:
+                plan.to_create.append({'uid': user.uid, 'email': user.email})
+        plan.to_delete = sorted(to_delete)
+        return plan
+
+    @staticmethod
+    def _new_user_doc(target: Dict) -> dict:
+        return {
+            'uid': target['uid'],
+            'email': target['email'],
+            'role': 'independent',
+            'first_name': 'App',
+            'last_name': '',
+            'created_at': firestore.SERVER_TIMESTAMP
+        }
+
+    async def _create_each(self, targets: List[Dict]) -> int:
+        # A batch fails as a whole on the first existing doc: retry its creates one by one
+        created = 0
+        for target in targets:
+            try:
+                await self.db.collection('users').document(target['uid']).create(self._new_user_doc(target))
+                created += 1
+            except AlreadyExists:
+                pass
+        return created
+
+    async def apply(self, plan: SyncPlan, report: Optional[Reporter] = None) -> dict:
+        report = report or (lambda stage, progress: None)
+        users_ref = self.db.collection('users')
+        total = len(plan.to_delete) + len(plan.to_create)
+        commits = 0
+        created = 0
+        done = 0
+
+        # Deletes and creates never share a batch, so an existing doc can't roll back a delete
+        chunks = [('delete', plan.to_delete[i:i + BATCH_LIMIT]) for i in range(0, len(plan.to_delete), BATCH_LIMIT)]
+        chunks += [('create', plan.to_create[i:i + BATCH_LIMIT]) for i in range(0, len(plan.to_create), BATCH_LIMIT)]
+        for op, chunk in chunks:
+            batch = self.db.batch()
+            for target in chunk:
+                if op == 'delete':
+                    batch.delete(users_ref.document(target))
+                else:
+                    batch.create(users_ref.document(target['uid']), self._new_user_doc(target))
+            try:
+                await batch.commit()
+                if op == 'create': created += len(chunk)
+            except AlreadyExists:
+                created += await self._create_each(chunk)
+            commits += 1
+            done += len(chunk)
+            report("applying", 0.6 + 0.4 * done / total)
+
+        already_synced = len(plan.to_create) - created
+        logger.info("user_sync_applied", deleted=len(plan.to_delete), created=created, already_synced=already_synced, batches=commits)
+        return {"deleted": len(plan.to_delete), "created": created, "already_synced": already_synced, "batches": commits}
+
+    async def run(self, dry_run: bool = False, report: Optional[Reporter] = None) -> dict:
+        plan = await self.plan(report)
+        result = {"dry_run": dry_run, **plan.summary()}
+        if dry_run:
+            result["would_delete"] = plan.to_delete
+            result["would_create"] = [u['uid'] for u in plan.to_create]
+        else:
+            result.update(await self.apply(plan, report))
+        return result
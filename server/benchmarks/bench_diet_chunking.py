@@ -0,0 +1,58 @@
+"""
+Single-prompt vs chunked concurrent diet parsing on long PDFs, fully offline.
+
+The fake LLM sleeps per output token, so latency grows with the size of the
+JSON it returns, like the real model. Chunks are cut by day and substitution
+section and run with DIET_CHUNK_CONCURRENCY in flight.
+
+    python -m benchmarks.bench_diet_chunking [--token-latency 0.0002] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.diet_service import DietParser
+from app.services.gemini_gateway import gemini_gateway
+from benchmarks.fakes import FakeGenaiClient
+from benchmarks.fixtures import make_diet_pdf
+
+
+def _summary(result: dict) -> tuple[int, int]:
+    dishes = sum(len(m["elenco_piatti"]) for d in result["piano_settimanale"] for m in d["pasti"])
+    return dishes, len(result["tabella_sostituzioni"])
+
+
+async def _timed(parser: DietParser, pdf: bytes, min_chars: int) -> tuple[float, dict, int]:
+    settings.DIET_CHUNK_MIN_CHARS = min_chars
+    calls_before = len(gemini_gateway.client.calls)
+    start = time.perf_counter()
+    result = await parser.parse_complex_diet(pdf)
+    return time.perf_counter() - start, result, len(gemini_gateway.client.calls) - calls_before
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-latency", type=float, default=0.0002)
+    parser.add_argument("--concurrency", type=int, default=settings.DIET_CHUNK_CONCURRENCY)
+    args = parser.parse_args()
+
+    settings.DIET_CACHE_ENABLED = False
+    settings.DIET_TEMPLATES_ENABLED = False
+    settings.DIET_CHUNK_CONCURRENCY = args.concurrency
+    gemini_gateway.set_client(FakeGenaiClient(latency=0.3, per_output_token_latency=args.token_latency))
+    diet_parser = DietParser()
+    diet_parser.cache = None
+    diet_parser.templates = None
+
+    print(f"{'pages':>5} {'single s':>9} {'chunked s':>10} {'calls':>6} {'speedup':>8}  dishes/groups (single | chunked)")
+    for pages in (20, 30, 45):
+        pdf = make_diet_pdf(pages, substitution_groups=40)
+        single, single_result, _ = await _timed(diet_parser, pdf, 10 ** 9)
+        chunked, chunked_result, calls = await _timed(diet_parser, pdf, 0)
+        print(f"{pages:>5} {single:>9.2f} {chunked:>10.2f} {calls:>6} {single / chunked:>7.2f}x  "
+              f"{_summary(single_result)} | {_summary(chunked_result)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
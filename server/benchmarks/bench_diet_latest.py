@@ -0,0 +1,103 @@
+"""
+GET /diet/latest: Firestore reads, latency and bytes per app open.
+
+Uploads a large plan for one user through /upload-diet/{uid} (fake Gemini
+and Firebase, --latency per Firestore call), then opens the "app" --opens
+times in each mode and counts the fake Firestore reads it costs:
+
+- firestore (old): the client reads the latest users/{uid}/diets document;
+- cold: GET /diet/latest with the per-user cache empty;
+- 200 warm: cached view, no If-None-Match;
+- 304: cached view, If-None-Match with the ETag of the previous response.
+
+Also checks that a new upload invalidates the cached view.
+
+    python -m benchmarks.bench_diet_latest [--opens 50] [--latency 0.02]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("RATE_LIMIT_STORAGE_URI", "memory://")
+os.environ.setdefault("LEADER_BACKEND", "none")
+os.environ.setdefault("DIET_CACHE_ENABLED", "false")
+os.environ.setdefault("DIET_TEMPLATES_ENABLED", "false")
+
+import orjson
+from fastapi.testclient import TestClient
+
+from benchmarks.fakes import PROJECT_ID, FakeFirestore, FakeGenaiClient, FakeServices
+from benchmarks.fixtures import large_gemini_output, make_diet_pdf
+
+os.environ.setdefault("FIREBASE_PROJECT_ID", PROJECT_ID)
+UID = "user-0"
+ADMIN_UID = "nutritionist-0"
+
+
+def _measure(fakes, opens: int, request) -> tuple:
+    reads = fakes.db.reads
+    start = time.perf_counter()
+    for _ in range(opens):
+        status, size = request()
+    elapsed = (time.perf_counter() - start) / opens
+    return status, (fakes.db.reads - reads) / opens, 1e3 * elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--opens", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per fake Firestore call")
+    args = parser.parse_args()
+
+    plan = large_gemini_output()
+    fakes = FakeServices(
+        genai=FakeGenaiClient(latency=0, responder=lambda model, prompt, config: plan),
+        db=FakeFirestore(latency=args.latency),
+    ).install()
+    fakes.db.seed(f"users/{UID}", {"uid": UID, "role": "user", "parent_id": ADMIN_UID})
+    fakes.db.seed(f"users/{ADMIN_UID}", {"uid": ADMIN_UID, "role": "nutritionist"})
+    user = {"Authorization": f"Bearer {fakes.auth.mint_token(UID, role='user')}", "Accept-Encoding": "gzip, br"}
+    admin = {"Authorization": f"Bearer {fakes.auth.mint_token(ADMIN_UID, role='nutritionist')}"}
+
+    from app.main import app, limiter, user_diet_cache
+    limiter.enabled = False
+
+    with TestClient(app) as client:
+        def upload():
+            files = {"file": ("dieta.pdf", make_diet_pdf(3), "application/pdf")}
+            assert client.post(f"/upload-diet/{UID}", files=files, headers=admin).status_code == 200
+
+        def firestore_read():
+            docs = fakes.db.collection(f"users/{UID}/diets").order_by("uploadedAt", "DESCENDING").limit(1).get()
+            return 200, len(orjson.dumps(docs[0].to_dict(), default=str))
+
+        etag = None
+
+        def get_latest(conditional: bool = False):
+            nonlocal etag
+            headers = dict(user, **({"If-None-Match": etag} if conditional else {}))
+            response = client.get("/diet/latest", headers=headers)
+            etag = response.headers.get("etag", etag)
+            return response.status_code, len(response.content)
+
+        def cold():
+            user_diet_cache.invalidate(UID)
+            return get_latest()
+
+        upload()
+        print(f"{'mode':<16} {'status':>6} {'reads/open':>10} {'ms/open':>8} {'body bytes':>10}")
+        for name, request in (("firestore (old)", firestore_read), ("cold", cold), ("200 warm", get_latest),
+                              ("304", lambda: get_latest(conditional=True))):
+            status, reads, ms, size = _measure(fakes, args.opens, request)
+            print(f"{name:<16} {status:>6} {reads:>10.1f} {ms:>8.2f} {size:>10,}")
+
+        plan = large_gemini_output(seed=7)
+        upload()
+        status, _ = get_latest(conditional=True)
+        assert status == 200, "upload did not invalidate the cached view"
+        print("new upload -> 200 with a new ETag")
+    fakes.uninstall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+DietResponse conversion + serialization cost on a large synthetic plan.
+
+Old path: pydantic models built per dish/ingredient, re-validated by FastAPI
+against response_model, stdlib JSON. New path: plain dicts, orjson, gzip/br.
+Both are measured end-to-end through FastAPI (TestClient), plus body sizes.
+
+    python -m benchmarks.bench_diet_response [--requests 50]
+"""
+import argparse
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.responses import json_response
+from app.models.schemas import DietResponse, Dish, Ingredient, SubstitutionGroup, SubstitutionOption
+from app.services.diet_format import DAY_MAP, MEAL_ORDER, to_app_format
+from app.services.normalization import normalize_meal_name
+from benchmarks.fixtures import large_gemini_output
+
+
+def legacy_convert(gemini_output) -> DietResponse:
+    """The per-model conversion the endpoints used before diet_format."""
+    app_plan, app_substitutions, cad_map = {}, {}, {}
+    for g in gemini_output.get('tabella_sostituzioni', []):
+        if g.get('cad_code', 0) > 0:
+            cad_map[g.get('titolo', '').strip().lower()] = g['cad_code']
+            app_substitutions[str(g['cad_code'])] = SubstitutionGroup(
+                name=g.get('titolo', ''),
+                options=[SubstitutionOption(name=o.get('nome', ''), qty=o.get('quantita', '')) for o in g.get('opzioni', [])]
+            )
+    for day in gemini_output.get('piano_settimanale', []):
+        raw_name = day.get('giorno', '').lower().strip()
+        day_name = DAY_MAP.get(raw_name[:3], raw_name.capitalize())
+        app_plan[day_name] = {}
+        for meal in day.get('pasti', []):
+            m_name = normalize_meal_name(meal.get('tipo_pasto', ''))
+            dishes = []
+            for d in meal.get('elenco_piatti', []):
+                d_name = d.get('nome_piatto') or 'Piatto'
+                dishes.append(Dish(
+                    name=d_name,
+                    qty=str(d.get('quantita_totale') or ''),
+                    cad_code=d.get('cad_code', 0) or cad_map.get(d_name.lower(), 0),
+                    is_composed=(d.get('tipo') == 'composto'),
+                    ingredients=[Ingredient(name=str(i.get('nome', '')), qty=str(i.get('quantita', ''))) for i in d.get('ingredienti', [])]
+                ))
+            app_plan[day_name].setdefault(m_name, []).extend(dishes)
+    for d, meals in app_plan.items():
+        ordered = {k: meals[k] for k in MEAL_ORDER if k in meals}
+        ordered.update({k: v for k, v in meals.items() if k not in ordered})
+        app_plan[d] = ordered
+    return DietResponse(plan=app_plan, substitutions=app_substitutions)
+
+
+def _build_app(raw: dict) -> FastAPI:
+    api = FastAPI()
+
+    @api.get("/old", response_model=DietResponse)
+    async def old():
+        return legacy_convert(raw)
+
+    @api.get("/new", response_model=DietResponse)
+    async def new(request: Request):
+        return json_response(request, to_app_format(raw))
+
+    return api
+
+
+def _timed(client: TestClient, path: str, n: int, encoding: str) -> tuple[float, int]:
+    headers = {"Accept-Encoding": encoding}
+    client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(n):
+        response = client.get(path, headers=headers)
+    elapsed = (time.perf_counter() - start) / n
+    return elapsed, int(response.headers.get("content-length", len(response.content)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    raw = large_gemini_output()
+    dishes = sum(len(m["elenco_piatti"]) for d in raw["piano_settimanale"] for m in d["pasti"])
+    print(f"plan: {len(raw['piano_settimanale'])} days, {dishes} dishes, {len(raw['tabella_sostituzioni'])} substitution groups")
+
+    # Same data either way
+    assert legacy_convert(raw).model_dump() == DietResponse.model_validate(to_app_format(raw)).model_dump()
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        legacy_convert(raw)
+    print(f"{'convert: pydantic models':<34} {1e3 * (time.perf_counter() - start) / args.requests:>8.2f} ms")
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        to_app_format(raw)
+    print(f"{'convert: plain dicts':<34} {1e3 * (time.perf_counter() - start) / args.requests:>8.2f} ms")
+
+    client = TestClient(_build_app(raw))
+    print(f"\n{'end-to-end':<34} {'ms/req':>8} {'bytes on wire':>14}")
+    for label, path, encoding in (
+        ("old (response_model + json)", "/old", "identity"),
+        ("new, identity", "/new", "identity"),
+        ("new, gzip", "/new", "gzip"),
+        ("new, br", "/new", "br"),
+    ):
+        elapsed, size = _timed(client, path, args.requests, encoding)
+        print(f"{label:<34} {1e3 * elapsed:>8.2f} {size:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Bytes written per diet upload, before and after the diet blob store.
+
+Saves the same plans through _save_diet_records against the fake Firestore
+(so the blob writes, the dedup read and the batch are the real code paths)
+and counts the payload bytes of every document stored:
+
+- inline: the old layout, the plan in diet_history and again in users/{uid}/diets;
+- blob + legacy: DIET_INLINE_LEGACY_FIELDS=True (the default while the apps
+  still read the inline fields): one inline copy, in users/{uid}/diets;
+- blob only: records carry just the dietRef.
+
+Each plan is uploaded --repeat times for --users users (re-uploads and one
+plan shared by several patients are the dedup case). Also times
+encode/decode and checks a plan large enough to be chunked round-trips.
+
+    python -m benchmarks.bench_diet_store [--users 5] [--repeat 2]
+"""
+import argparse
+import asyncio
+import time
+
+import orjson
+
+from app.core.config import settings
+from app.services.diet_format import to_app_format
+from app.services.diet_store import DietBlobStore
+from benchmarks.fakes import FakeAsyncFirestore, FakeFirestore
+from benchmarks.fixtures import large_gemini_output
+
+
+def _doc_bytes(data: dict) -> int:
+    return sum(len(v) if isinstance(v, bytes) else len(orjson.dumps(v, default=str)) for v in data.values())
+
+
+def stored_bytes(db: FakeFirestore) -> int:
+    return sum(_doc_bytes(doc) for docs in db.collections.values() for doc in docs.values())
+
+
+async def save_all(plans: list, users: int, repeat: int, inline_legacy: bool) -> tuple:
+    import app.main as main
+
+    db = FakeFirestore()
+    store = DietBlobStore()
+    main.diet_blob_store = store
+    settings.DIET_INLINE_LEGACY_FIELDS = inline_legacy
+    async_db = FakeAsyncFirestore(db)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for u in range(users):
+            for plan in plans:
+                await main._save_diet_records(async_db, f"user-{u}", "dieta.pdf", plan, "nutritionist-0")
+    return stored_bytes(db), db.writes, time.perf_counter() - start, store
+
+
+def inline_bytes(plans: list, users: int, repeat: int) -> int:
+    per_upload = sum(_doc_bytes({"parsedData": p}) + _doc_bytes({"plan": p.get("plan"), "substitutions": p.get("substitutions")}) for p in plans)
+    return per_upload * users * repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    plans = [to_app_format(large_gemini_output(seed=s, groups=g)) for s, g in ((1, 150), (2, 60), (3, 20))]
+    uploads = len(plans) * args.users * args.repeat
+    print(f"{uploads} uploads of {len(plans)} plans ({', '.join(f'{len(orjson.dumps(p)) / 1024:.0f} KiB' for p in plans)})")
+
+    inline = inline_bytes(plans, args.users, args.repeat)
+    print(f"{'layout':<16} {'bytes stored':>19} {'per upload':>11}")
+    print(f"{'inline (old)':<16} {inline / 1024:>15.0f} KiB {inline / uploads / 1024:>7.1f} KiB")
+    for name, legacy in (("blob + legacy", True), ("blob only", False)):
+        total, _, elapsed, store = asyncio.run(save_all(plans, args.users, args.repeat, legacy))
+        print(f"{name:<16} {total / 1024:>15.0f} KiB {total / uploads / 1024:>7.1f} KiB  "
+              f"(blobs written {store.written}, deduplicated {store.deduplicated}, {1e3 * elapsed / uploads:.2f} ms/save)")
+
+    store = DietBlobStore()
+    start = time.perf_counter()
+    for _ in range(20):
+        diet_ref, data, raw_size = store.encode(plans[0])
+    encode = (time.perf_counter() - start) / 20
+    start = time.perf_counter()
+    for _ in range(20):
+        store.decode(data)
+    decode = (time.perf_counter() - start) / 20
+    print(f"encode {1e3 * encode:.2f} ms, decode {1e3 * decode:.2f} ms, {raw_size / 1024:.0f} KiB -> {len(data) / 1024:.0f} KiB")
+
+    # A plan spread over several chunk documents reads back identical
+    chunked = DietBlobStore(chunk_bytes=2048)
+    chunked.memory.maxsize = 1
+    db = FakeAsyncFirestore(FakeFirestore())
+
+    async def roundtrip():
+        batch = db.batch()
+        fields = await chunked.stage(db, batch, plans[0])
+        await batch.commit()
+        chunked.memory.clear()
+        return fields["dietRef"], await chunked.load(fields["dietRef"], db)
+
+    diet_ref, loaded = asyncio.run(roundtrip())
+    assert loaded == plans[0], "chunked blob did not round-trip"
+    print(f"chunked round-trip ok ({-(-len(data) // chunked.chunk_bytes)} chunks)")
+
+
+if __name__ == "__main__":
+    main()
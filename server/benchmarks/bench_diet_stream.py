@@ -0,0 +1,118 @@
+"""
+Time-to-first-day for POST /upload-diet/stream vs the full /upload-diet response,
+fully offline: FakeGenaiClient streams its JSON with per-token latency, auth is
+overridden. The app runs in an in-process uvicorn server on localhost
+(httpx's ASGITransport buffers whole bodies), so the timings include FastAPI,
+the NDJSON/SSE encoding and real chunked transfer.
+
+Each stream is also checked against /upload-diet: after applying the
+day_update events and merging same-named days, its plan and substitutions
+must equal the full response. One dish per meal comes back from the fake
+without a cad_code, so the substitution-title fallback is exercised.
+
+    python -m benchmarks.bench_diet_stream [--pages 7] [--token-latency 0.002]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import uvicorn
+
+from app.core.config import settings
+from app.services.diet_format import merge_day
+from app.services.gemini_gateway import gemini_gateway
+from benchmarks.fakes import FakeGenaiClient, fake_response_for
+from benchmarks.fixtures import make_diet_pdf
+
+
+def responder_without_some_cads(model, prompt, config):
+    # The first dish of every meal is named after its substitution group and loses its cad_code
+    diet = fake_response_for(model, prompt, config)
+    for day in diet.get("piano_settimanale", []):
+        for meal in day["pasti"]:
+            for dish in meal["elenco_piatti"][:1]:
+                dish["nome_piatto"] = f"Gruppo {dish['cad_code']}"
+                dish["cad_code"] = 0
+    return diet
+
+
+def plan_from_events(events: list) -> dict:
+    days = {e["index"]: e for e in events if e["type"] == "day"}
+    for e in events:
+        if e["type"] == "day_update":
+            days[e["index"]] = e
+    plan = {}
+    for index in sorted(days):
+        merge_day(plan, days[index]["day"], days[index]["meals"])
+    substitutions = next(e["substitutions"] for e in events if e["type"] == "substitutions")
+    return {"plan": plan, "substitutions": substitutions}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=7)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    settings.DIET_CACHE_ENABLED = False
+    settings.DIET_TEMPLATES_ENABLED = False
+    settings.DIET_CHUNK_MIN_CHARS = 10 ** 9
+    gemini_gateway.set_client(FakeGenaiClient(
+        latency=0.5, per_output_token_latency=args.token_latency, responder=responder_without_some_cads,
+    ))
+
+    from app import main as server
+    server.diet_parser.cache = None
+    server.diet_parser.templates = None
+    server.app.dependency_overrides[server.verify_token] = lambda: "bench-user"
+    server.limiter.enabled = False
+
+    pdf = make_diet_pdf(args.pages)
+    files = {"file": ("diet.pdf", pdf, "application/pdf")}
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="off")
+    uvicorn_server = uvicorn.Server(config)
+    serve_task = asyncio.create_task(uvicorn_server.serve())
+    while not uvicorn_server.started:
+        await asyncio.sleep(0.05)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None) as client:
+        start = time.perf_counter()
+        response = await client.post("/upload-diet", files=files)
+        full = time.perf_counter() - start
+        assert response.status_code == 200, response.text
+        expected = response.json()
+        print(f"{'/upload-diet (full JSON)':<30} total {full:6.2f} s")
+
+        for stream_format in ("ndjson", "sse"):
+            start = time.perf_counter()
+            first_day = None
+            days = 0
+            events = []
+            async with client.stream("POST", "/upload-diet/stream", files=files, data={"stream_format": stream_format}) as response:
+                async for line in response.aiter_lines():
+                    if stream_format == "sse":
+                        if not line.startswith("data: "):
+                            continue
+                        line = line[len("data: "):]
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    events.append(event)
+                    if event["type"] == "day":
+                        days += 1
+                        first_day = first_day or time.perf_counter() - start
+                    assert event["type"] != "error", event
+            total = time.perf_counter() - start
+            assert plan_from_events(events) == expected, f"{stream_format} stream differs from /upload-diet"
+            updates = sum(e["type"] == "day_update" for e in events)
+            print(f"{'/upload-diet/stream ' + stream_format:<30} total {total:6.2f} s   first day {first_day:6.2f} s   days {days}   updates {updates}   matches full")
+
+    uvicorn_server.should_exit = True
+    await serve_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+Event-loop lag during a burst of admin requests.
+
+A ticker task sleeps 1 ms in a loop and records how late it wakes up; the
+overshoot is the time the loop spent unable to run anything else (other
+requests, streaming responses, health checks). Two apps serve the same burst
+of update-user + log-access calls, in-process through httpx's ASGI transport,
+against the fake Firebase services (--latency per Firestore/Auth call):
+
+- "blocking": async handlers calling the sync firebase_admin client inline,
+  the way the admin endpoints used to;
+- "app.main": the real app (AsyncClient for Firestore, bounded executor for Auth).
+
+    python -m benchmarks.bench_event_loop_lag [--requests 64] [--concurrency 16] [--latency 0.03]
+"""
+import argparse
+import asyncio
+import math
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("RATE_LIMIT_STORAGE_URI", "memory://")
+os.environ.setdefault("LEADER_BACKEND", "none")
+
+import httpx
+from fastapi import FastAPI, Header
+from firebase_admin import auth, firestore
+
+from benchmarks.fakes import PROJECT_ID, FakeAuth, FakeFirestore, FakeServices
+
+os.environ.setdefault("FIREBASE_PROJECT_ID", PROJECT_ID)
+ADMIN_UID = "admin-0"
+USERS = 20
+
+
+def blocking_app() -> FastAPI:
+    app = FastAPI()
+
+    def _require_admin(authorization: str) -> None:
+        token = auth.verify_id_token(authorization.split(" ", 1)[1])
+        firestore.client().collection("users").document(token["uid"]).get()
+
+    @app.put("/admin/update-user/{uid}")
+    async def update_user(uid: str, body: dict, authorization: str = Header(...)):
+        _require_admin(authorization)
+        db = firestore.client()
+        db.collection("users").document(uid).update(body)
+        auth.update_user(uid, display_name=body.get("first_name"))
+        return {"message": "User updated"}
+
+    @app.post("/admin/log-access")
+    async def log_access(body: dict, authorization: str = Header(...)):
+        _require_admin(authorization)
+        firestore.client().collection("access_logs").add(body)
+        return {"status": "logged"}
+
+    return app
+
+
+def _seed(fakes: FakeServices) -> None:
+    for i, role in [(ADMIN_UID, "admin")] + [(f"user-{n}", "user") for n in range(USERS)]:
+        fakes.auth.users[i] = SimpleNamespace(
+            uid=i, email=f"{i}@kybo.test", display_name=i, email_verified=True, disabled=False, custom_claims={"role": role},
+        )
+        fakes.db.seed(f"users/{i}", {"uid": i, "email": f"{i}@kybo.test", "role": role, "first_name": i})
+
+
+async def _ticker(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)] if sorted_values else 0.0
+
+
+async def burst(app, token: str, total: int, concurrency: int) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    lags: list = []
+    counter = iter(range(total))
+    statuses: dict = {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            for n in counter:
+                target = f"user-{n % USERS}"
+                if n % 2:
+                    response = await client.put(f"/admin/update-user/{target}", json={"first_name": f"Bench{n}"}, headers=headers)
+                else:
+                    response = await client.post("/admin/log-access", json={"target_uid": target, "reason": "bench"}, headers=headers)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(_ticker(stop, lags))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+        stop.set()
+        await ticker
+
+    lags.sort()
+    return {
+        "rps": total / wall,
+        "lag_p50_ms": 1e3 * _percentile(lags, 50),
+        "lag_p99_ms": 1e3 * _percentile(lags, 99),
+        "lag_max_ms": 1e3 * (lags[-1] if lags else 0.0),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds per fake Firestore/Auth call")
+    args = parser.parse_args()
+
+    fakes = FakeServices(
+        db=FakeFirestore(latency=args.latency),
+        auth=FakeAuth(latency=args.latency),
+    ).install()
+    _seed(fakes)
+    token = fakes.auth.mint_token(ADMIN_UID, role="admin")
+
+    from app.main import app, limiter
+    limiter.enabled = False
+
+    print(f"{'app':<10} {'req/s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}  statuses")
+    for name, target in (("blocking", blocking_app()), ("app.main", app)):
+        row = asyncio.run(burst(target, token, args.requests, args.concurrency))
+        print(f"{name:<10} {row['rps']:>8.1f} {row['lag_p50_ms']:>11.2f} {row['lag_p99_ms']:>11.2f} {row['lag_max_ms']:>11.2f}  {row['statuses']}")
+    fakes.uninstall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Cost of the metrics layer on the request path.
+
+span(): one histogram observation per pipeline stage (no log line below
+METRICS_SPAN_LOG_MIN_MS). MetricsMiddleware: one histogram observation, an
+in-flight gauge and the structlog request context, measured around a
+trivial ASGI app (so the number is pure overhead). Also times a /metrics render.
+
+    python -m benchmarks.bench_metrics [--iterations 200000]
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.metrics import MetricsMiddleware, render_metrics, span
+
+
+async def _plain_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def _time_asgi(app, n: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/bench", "headers": []}
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), _receive, _send)
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    start = time.perf_counter()
+    for _ in range(n):
+        pass
+    bare = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for _ in range(n):
+        with span("bench"):
+            pass
+    spanned = (time.perf_counter() - start) / n
+    print(f"{'span() overhead':<34} {1e6 * (spanned - bare):>8.2f} us/stage")
+
+    requests = n // 10
+    plain = asyncio.run(_time_asgi(_plain_app, requests))
+    wrapped = asyncio.run(_time_asgi(MetricsMiddleware(_plain_app), requests))
+    print(f"{'MetricsMiddleware overhead':<34} {1e6 * (wrapped - plain):>8.2f} us/request")
+
+    start = time.perf_counter()
+    body = render_metrics()
+    print(f"{'/metrics render':<34} {1e3 * (time.perf_counter() - start):>8.2f} ms ({len(body):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+FCM delivery: one messaging.send per notification vs the NotificationDispatcher.
+
+Against the fake FCM backend (--latency per round trip, every 1/--error-rate
+call fails with UnavailableError, --dead tokens unregistered), delivers
+--count diet-ready pushes (about one in ten a duplicate of an earlier one)
+plus one broadcast:
+
+- inline: what the endpoints used to await, one send() per push on the
+  firebase_io executor;
+- dispatcher: enqueue only (the time an endpoint waits), then the time until
+  the queue is drained, the send_each batches it took and its delivery stats.
+
+    python -m benchmarks.bench_notifications [--count 2000] [--latency 0.05] [--error-rate 0.25] [--dead 50]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import structlog
+
+from app.core.firebase_io import firebase_io
+from app.services.notification_dispatcher import NotificationDispatcher
+from app.services.notification_service import NotificationService
+from benchmarks.fakes import FakeMessaging, FakeServices
+
+
+def _tokens(count: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    tokens = [f"token-{n}" for n in range(count)]
+    # Job completions re-sent to the same device (retries, double taps)
+    return [rng.choice(tokens[:max(1, n)]) if n and rng.random() < 0.1 else token for n, token in enumerate(tokens)]
+
+
+async def inline(tokens: list, service: NotificationService) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(firebase_io.call("fcm", service.send_diet_ready, token, {"status": "done"}) for token in tokens))
+    return time.perf_counter() - start
+
+
+async def dispatched(tokens: list, dispatcher: NotificationDispatcher) -> tuple:
+    await dispatcher.start()
+    start = time.perf_counter()
+    for token in tokens:
+        dispatcher.send_diet_ready(token, {"status": "done"})
+    dispatcher.broadcast("System Update", "Manutenzione programmata", {"type": "maintenance_alert"})
+    enqueue = time.perf_counter() - start
+    while dispatcher.stats()["queued"] or dispatcher.stats()["retry_pending"]:
+        await asyncio.sleep(0.01)
+    await dispatcher.stop()
+    return enqueue, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.25)
+    parser.add_argument("--dead", type=int, default=50, help="unregistered tokens among the first --count")
+    args = parser.parse_args()
+    # One log line per failed send would dominate the inline timing
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.ERROR))
+
+    tokens = _tokens(args.count)
+    dead = {f"token-{n}" for n in range(0, args.count, max(1, args.count // max(1, args.dead)))}
+
+    fcm = FakeMessaging(latency=args.latency, error_rate=args.error_rate, invalid_tokens=dead)
+    with FakeServices(messaging=fcm):
+        elapsed = asyncio.run(inline(tokens, NotificationService()))
+        print(f"{'inline send()':<22} {len(tokens)} pushes in {elapsed:.2f} s, {fcm.calls} FCM calls, {len(fcm.sent)} delivered")
+
+    fcm = FakeMessaging(latency=args.latency, error_rate=args.error_rate, invalid_tokens=dead)
+    dispatcher = NotificationDispatcher(backoff=0.05, max_backoff=0.5)
+    with FakeServices(messaging=fcm):
+        enqueue, drained = asyncio.run(dispatched(tokens, dispatcher))
+    print(f"{'dispatcher enqueue':<22} {1e6 * enqueue / (len(tokens) + 1):.1f} us per push on the request path")
+    print(f"{'dispatcher delivery':<22} drained in {drained:.2f} s, {fcm.calls} FCM calls, {len(fcm.sent)} delivered")
+    print(f"{'':<22} {dispatcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
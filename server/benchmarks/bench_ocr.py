@@ -0,0 +1,60 @@
+"""
+Receipt OCR wall time and character count per image:
+raw Tesseract on the full photo vs preprocessing (serial and parallel strips).
+Needs the tesseract binary with the 'ita' language pack (as in the Dockerfile).
+
+    python -m benchmarks.bench_ocr [photo.jpg ...]
+"""
+import argparse
+import io
+import time
+
+import pytesseract
+from PIL import Image
+
+from app.core.workers import get_process_pool, process_pool_size, shutdown_process_pool
+from app.services.ocr_preprocessing import ocr_receipt_image, preprocess_receipt
+from benchmarks.fixtures import make_receipt_photo
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="*", help="real receipt photos (default: synthetic 12 MP photos)")
+    args = parser.parse_args()
+
+    if args.images:
+        corpus = [(path, open(path, "rb").read()) for path in args.images]
+    else:
+        corpus = [(f"synthetic-{n}-items", make_receipt_photo(item_count=n)) for n in (15, 40, 80)]
+
+    pool = get_process_pool()
+    list(pool.map(abs, range(process_pool_size())))
+    print(f"workers={process_pool_size()}")
+    print(f"{'image':<22} {'mode':<14} {'wall s':>8} {'chars':>7}")
+
+    for name, data in corpus:
+        def raw():
+            with Image.open(io.BytesIO(data)) as img:
+                return pytesseract.image_to_string(img, lang="ita")
+
+        prep_s, _ = _timed(lambda: preprocess_receipt(data))
+        for mode, fn in (
+            ("raw", raw),
+            ("prep+serial", lambda: ocr_receipt_image(data, parallel=False)),
+            ("prep+parallel", lambda: ocr_receipt_image(data, parallel=True)),
+        ):
+            elapsed, text = _timed(fn)
+            print(f"{name:<22} {mode:<14} {elapsed:>8.2f} {len(text.strip()):>7}")
+        print(f"{name:<22} {'(preprocess)':<14} {prep_s:>8.2f}")
+
+    shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Serial vs parallel PDF text extraction throughput.
+
+    python -m benchmarks.bench_pdf_extraction [--repeat 3]
+"""
+import argparse
+import time
+
+from app.core.workers import get_process_pool, process_pool_size, shutdown_process_pool
+from app.services.pdf_extraction import extract_pdf_text
+from benchmarks.fixtures import make_diet_pdf
+
+
+def _timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Warm the pool so worker start-up is not billed to the first run
+    pool = get_process_pool()
+    list(pool.map(abs, range(process_pool_size())))
+
+    print(f"workers={process_pool_size()}")
+    print(f"{'pages':>5} {'serial s':>10} {'parallel s':>11} {'speedup':>8} {'pages/s':>8}")
+    for pages in (1, 10, 50):
+        pdf = make_diet_pdf(pages)
+        serial = _timed(lambda: extract_pdf_text(pdf, max_pages=50, parallel=False), args.repeat)
+        parallel = _timed(lambda: extract_pdf_text(pdf, max_pages=50, parallel=True), args.repeat)
+        assert extract_pdf_text(pdf, 50, parallel=False) == extract_pdf_text(pdf, 50, parallel=True)
+        print(f"{pages:>5} {serial:>10.3f} {parallel:>11.3f} {serial / parallel:>7.2f}x {pages / parallel:>8.1f}")
+
+    shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
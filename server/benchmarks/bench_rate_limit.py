@@ -0,0 +1,94 @@
+"""
+Rate-limiter overhead per request and cross-process correctness, fully offline.
+
+1. Per-hit cost of memory:// vs the shared sqlite storage (microseconds).
+2. N processes hammer the same uid against one limit: with shared storage the
+   total number of allowed hits equals the limit, not limit x processes.
+3. Through FastAPI: the key comes from the uid set by the auth dependency.
+
+    python -m benchmarks.bench_rate_limit [--hits 20000] [--procs 4]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+from limits import parse, storage, strategies
+
+import app.core.rate_limit  # noqa: F401  (registers sqlite://)
+
+
+def _per_hit(label: str, uri: str, hits: int, users: int = 100) -> None:
+    limiter = strategies.FixedWindowRateLimiter(storage.storage_from_string(uri))
+    item = parse("1000000/minute")
+    keys = [f"uid:user-{i}" for i in range(users)]
+    start = time.perf_counter()
+    for i in range(hits):
+        limiter.hit(item, keys[i % users])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {1e6 * elapsed / hits:>8.1f} us/hit")
+
+
+def _hammer(uri: str, attempts: int, queue) -> None:
+    limiter = strategies.FixedWindowRateLimiter(storage.storage_from_string(uri))
+    item = parse("50/minute")
+    queue.put(sum(limiter.hit(item, "uid:shared-user") for _ in range(attempts)))
+
+
+def _across_processes(label: str, uri: str, procs: int) -> None:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    workers = [ctx.Process(target=_hammer, args=(uri, 50, queue)) for _ in range(procs)]
+    for w in workers:
+        w.start()
+    allowed = sum(queue.get() for _ in workers)
+    for w in workers:
+        w.join()
+    print(f"{label:<28} {allowed:>4} allowed of {procs * 50} (limit 50/minute, {procs} processes)")
+
+
+def _through_fastapi(uri: str) -> None:
+    from fastapi import Depends, FastAPI, Request
+    from fastapi.testclient import TestClient
+    from slowapi import Limiter, _rate_limit_exceeded_handler
+    from slowapi.errors import RateLimitExceeded
+
+    from app.core.rate_limit import rate_limit_key
+
+    limiter = Limiter(key_func=rate_limit_key, storage_uri=uri)
+    api = FastAPI()
+    api.state.limiter = limiter
+    api.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+    async def fake_auth(request: Request):
+        request.state.uid = request.headers.get("x-uid")
+        return request.state.uid
+
+    @api.post("/upload")
+    @limiter.limit("5/minute")
+    async def upload(request: Request, uid: str = Depends(fake_auth)):
+        return {"uid": uid}
+
+    client = TestClient(api)
+    codes = {uid: [client.post("/upload", headers={"x-uid": uid}).status_code for _ in range(7)] for uid in ("a", "b")}
+    print(f"{'fastapi, same IP':<28} user a: {codes['a']}  user b: {codes['b']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hits", type=int, default=20000)
+    parser.add_argument("--procs", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_uri = f"sqlite:///{os.path.join(tmp, 'ratelimit.sqlite3')}"
+        _per_hit("memory://", "memory://", args.hits)
+        _per_hit("sqlite (shared)", sqlite_uri, args.hits)
+        _across_processes("memory:// per process", "memory://", args.procs)
+        _across_processes("sqlite (shared)", sqlite_uri, args.procs)
+        _through_fastapi(f"sqlite:///{os.path.join(tmp, 'api.sqlite3')}")
+
+
+if __name__ == "__main__":
+    main()
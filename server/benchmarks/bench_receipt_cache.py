@@ -0,0 +1,89 @@
+"""
+Receipt rescans with the two-level receipt cache.
+
+1. Perceptual hash: dHash distance between a synthetic 12 MP receipt photo
+   and variants of it (re-encoded, resized, re-cropped, re-shot at another
+   angle) and other receipts with the same layout, against
+   RECEIPT_PHASH_MAX_DISTANCE. Also the hashing time.
+2. End to end: ReceiptScanner.scan_receipt on a receipt PDF with a fake
+   Gemini (--gemini-latency), in "llm" mode so every miss calls Gemini. The
+   sequence is a first scan, a rescan, a rescan by another user (scoped:
+   miss), and the same receipt with a different food list (text hit,
+   Gemini called). Reports wall time and Gemini calls per step.
+
+    python -m benchmarks.bench_receipt_cache [--gemini-latency 0.5]
+"""
+import argparse
+import asyncio
+import time
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.receipt_cache import image_dhash, receipt_cache
+from app.services.receipt_service import ReceiptScanner
+from benchmarks.fakes import FakeGenaiClient, FakeServices
+from benchmarks.fixtures import FOODS, RECEIPT_ITEMS, make_receipt_pdf, make_receipt_photo
+
+
+def _encode(img: np.ndarray, quality: int = 90) -> bytes:
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def phash_table() -> None:
+    original = make_receipt_photo(seed=7)
+    img = cv2.imdecode(np.frombuffer(original, np.uint8), cv2.IMREAD_COLOR)
+    h, w = img.shape[:2]
+    variants = [
+        ("re-encoded q70", True, _encode(img, 70)),
+        ("resized 50%", True, _encode(cv2.resize(img, (w // 2, h // 2), interpolation=cv2.INTER_AREA))),
+        ("re-cropped 2%", True, _encode(img[int(h * .02):int(h * .98), int(w * .02):int(w * .98)])),
+        ("re-shot at 8 deg", True, make_receipt_photo(seed=7, rotation=8)),
+        ("other receipt", False, make_receipt_photo(seed=8)),
+        ("other receipt 2", False, make_receipt_photo(seed=9, item_count=38)),
+    ]
+    start = time.perf_counter()
+    reference = image_dhash(original)
+    elapsed = time.perf_counter() - start
+    limit = settings.RECEIPT_PHASH_MAX_DISTANCE
+    print(f"dHash of a 12 MP photo: {1e3 * elapsed:.0f} ms; match if distance <= {limit}")
+    print(f"{'variant':<18} {'same receipt':>12} {'distance':>9} {'matched':>8}")
+    for name, same, data in variants:
+        distance = (reference ^ image_dhash(data)).bit_count()
+        print(f"{name:<18} {str(same):>12} {distance:>9} {str(distance <= limit):>8}")
+
+
+async def rescans(gemini: FakeGenaiClient) -> None:
+    receipt = make_receipt_pdf()
+    foods = [name.lower() for name, _ in FOODS] + [item.lower() for item in RECEIPT_ITEMS[:4]]
+    steps = [
+        ("first scan", "user-0", foods),
+        ("rescan", "user-0", foods),
+        ("other user", "user-1", foods),
+        ("new food list", "user-0", foods[:-1]),
+    ]
+    print(f"{'step':<14} {'ms':>8} {'gemini calls':>13} {'items':>6}")
+    for name, uid, allowed in steps:
+        calls = len(gemini.calls)
+        start = time.perf_counter()
+        items = await ReceiptScanner(allowed).scan_receipt(receipt, "receipt.pdf", mode="llm", user_id=uid)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14} {1e3 * elapsed:>8.1f} {len(gemini.calls) - calls:>13} {len(items):>6}")
+    print(receipt_cache.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    phash_table()
+    print()
+    gemini = FakeGenaiClient(latency=args.gemini_latency)
+    with FakeServices(genai=gemini):
+        asyncio.run(rescans(gemini))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Template fast path vs Gemini on a mixed corpus, fully offline.
+
+Known layouts (line-based CAD sections, weekly grid) are parsed locally;
+unknown ones fall back to a FakeGenaiClient with --llm-latency seconds.
+Prints per-document latency by route and the parser's hit-rate metrics.
+
+    python -m benchmarks.bench_template_parser [--llm-latency 2.0]
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.diet_service import DietParser
+from app.services.gemini_gateway import gemini_gateway
+from app.services.template_parser import TemplateParser
+from benchmarks.fakes import FakeGenaiClient
+from benchmarks.fixtures import TEMPLATES_DIR, build_pdf, diet_pages, make_diet_pdf, make_grid_diet_pdf
+
+
+def _free_text_pdf(seed: int) -> bytes:
+    # Same content, no template: meals inline after the day, no dotted leaders
+    pages = [[f"{lines[0]}"] + [f"{l.strip().replace(' ........ ', ', ')}" for l in lines[1:]] for lines in diet_pages(3, seed)]
+    return build_pdf(pages)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    settings.DIET_CACHE_ENABLED = False
+    settings.DIET_TEMPLATES_ENABLED = True
+    gemini_gateway.set_client(FakeGenaiClient(latency=args.llm_latency))
+    diet_parser = DietParser()
+    diet_parser.cache = None
+    diet_parser.templates = TemplateParser(TEMPLATES_DIR)
+
+    corpus = (
+        [("cad sections", make_diet_pdf(7, seed=s, substitution_groups=40)) for s in range(4)]
+        + [("weekly grid", make_grid_diet_pdf(weeks=2, seed=s)) for s in range(4)]
+        + [("unknown layout", _free_text_pdf(s)) for s in range(2)]
+    )
+    print(f"{'document':<16} {'ms':>9} {'days':>5} {'dishes':>7}")
+    for label, pdf in corpus:
+        start = time.perf_counter()
+        result = await diet_parser.parse_complex_diet(pdf)
+        elapsed = time.perf_counter() - start
+        dishes = sum(len(m["elenco_piatti"]) for d in result["piano_settimanale"] for m in d["pasti"])
+        print(f"{label:<16} {1000 * elapsed:>9.1f} {len(result['piano_settimanale']):>5} {dishes:>7}")
+
+    print()
+    for key, value in diet_parser.templates.stats().items():
+        print(f"{key:<12} {value}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Firebase ID-token verification throughput (tokens/sec), fully offline.
+
+Compares the old request path shape (threadpool hop + full verification on
+every call) with local verification on the event loop, cold and cached.
+
+    python -m benchmarks.bench_token_verify [--tokens 2000]
+"""
+import argparse
+import asyncio
+import datetime
+import time
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.token_verifier import FirebaseTokenVerifier
+
+PROJECT_ID = "kybo-bench"
+
+
+def _make_signing_material():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name)
+        .public_key(key.public_key()).serial_number(1)
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+    return key, pem
+
+
+def _mint(key, uid: str) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}", "aud": PROJECT_ID,
+        "sub": uid, "iat": now, "auth_time": now, "exp": now + 3600, "role": "admin",
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": "bench-kid"})
+
+
+async def _run(label: str, tokens: list[str], verify) -> None:
+    start = time.perf_counter()
+    for token in tokens:
+        await verify(token)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<38} {len(tokens) / elapsed:>10.0f} tokens/s  {1e6 * elapsed / len(tokens):>8.1f} us/token")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    key, pem = _make_signing_material()
+    tokens = [_mint(key, f"user-{i % args.users}") for i in range(args.users)]
+    workload = [tokens[i % len(tokens)] for i in range(args.tokens)]
+
+    def fresh_verifier() -> FirebaseTokenVerifier:
+        verifier = FirebaseTokenVerifier(project_id=PROJECT_ID, cache_size=10000)
+        verifier.set_keys({"bench-kid": pem}, max_age=3600)
+        return verifier
+
+    # Before: every request re-verifies the signature in the threadpool
+    uncached = fresh_verifier()
+
+    def full_verify(token: str) -> dict:
+        return uncached._decode(token, uncached._keys["bench-kid"], PROJECT_ID)
+
+    await _run("before: threadpool + full verify", workload, lambda t: run_in_threadpool(full_verify, t))
+
+    # After, worst case: every token is new
+    await _run("after: event loop, cold (no token cache)", workload, lambda t: asyncio.sleep(0, full_verify(t)))
+
+    # After, steady state: a dashboard session re-sends the same few tokens
+    cached = fresh_verifier()
+    await _run("after: event loop + token LRU", workload, cached.verify)
+    print("stats:", cached.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
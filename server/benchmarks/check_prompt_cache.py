@@ -0,0 +1,63 @@
+"""
+Offline walk-through of the prompt context-cache lifecycle against FakeGenaiClient:
+create -> reuse -> TTL refresh -> server-side expiry fallback -> eviction on prompt change.
+
+    python -m benchmarks.check_prompt_cache
+"""
+import asyncio
+
+from app.core.config import settings
+from app.services.diet_service import DietParser
+from app.services.gemini_gateway import gemini_gateway
+from app.services.prompt_cache import prompt_cache
+from benchmarks.fakes import FakeGenaiClient
+from benchmarks.fixtures import make_diet_pdf
+
+MODEL = settings.GEMINI_MODEL
+
+
+async def main():
+    settings.DIET_CACHE_ENABLED = False
+    fake = FakeGenaiClient()
+    gemini_gateway.set_client(fake)
+    parser = DietParser()
+    parser.cache = None
+
+    custom_prompt = "Regole del nutrizionista.\n" * 400
+    pdf = make_diet_pdf(2)
+
+    # 1. First parse creates the cache; later parses reuse it and send no system_instruction
+    await parser.parse_complex_diet(pdf, custom_prompt)
+    await parser.parse_complex_diet(pdf, custom_prompt)
+    assert fake.caches.created == 1, fake.caches.created
+    assert all(c["config"].cached_content and not c["config"].system_instruction for c in fake.calls)
+    print("create + reuse:", prompt_cache.stats())
+
+    # 2. Close to expiry -> TTL is extended, not recreated
+    key = (prompt_cache.prompt_hash(custom_prompt), MODEL)
+    prompt_cache._handles[key].expires_at -= settings.PROMPT_CACHE_TTL_SECONDS - 30
+    await parser.parse_complex_diet(pdf, custom_prompt)
+    assert fake.caches.updated == 1 and fake.caches.created == 1
+    print("refresh:", prompt_cache.stats())
+
+    # 3. Server dropped the cache -> inline retry succeeds, handle is discarded, next call recreates
+    fake.caches.expire(prompt_cache._handles[key].name)
+    await parser.parse_complex_diet(pdf, custom_prompt)
+    assert fake.calls[-1]["config"].system_instruction == custom_prompt
+    await parser.parse_complex_diet(pdf, custom_prompt)
+    assert fake.caches.created == 2
+    print("expiry fallback:", prompt_cache.stats())
+
+    # 4. Nutritionist uploads a new prompt -> old cache deleted server-side
+    await prompt_cache.evict(custom_prompt)
+    assert not fake.caches.store and fake.caches.deleted == 1
+    print("evict:", prompt_cache.stats())
+
+    # 5. Short prompts stay inline
+    await parser.parse_complex_diet(pdf, "breve")
+    assert fake.calls[-1]["config"].system_instruction == "breve"
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
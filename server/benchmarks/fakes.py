@@ -0,0 +1,964 @@
+"""
+In-process stand-ins for external services, for offline benchmarks and checks.
+
+FakeGenaiClient mimics the parts of google.genai.Client the server uses
+(client.aio.models.*, client.aio.caches.*) with configurable latency.
+Plug it in with: gemini_gateway.set_client(FakeGenaiClient())
+
+FakeFirestore (and its AsyncClient view, FakeAsyncFirestore), FakeAuth and
+FakeMessaging cover the firebase_admin calls made by app.main and the
+services; FakeServices swaps all four in at once.
+Every fake takes a latency (seconds per call) and an error_rate (share of
+calls failing with the SDK's "unavailable" error, deterministically).
+
+RecordingGenaiClient wraps a real client and saves its responses to a
+directory; replay_responder(directory) serves them back from a fake.
+"""
+import asyncio
+import copy
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from google.genai import errors
+
+DAY_PATTERN = re.compile(r"\b(luned[iì]|marted[iì]|mercoled[iì]|gioved[iì]|venerd[iì]|sabato|domenica)\b", re.IGNORECASE)
+MEAL_PATTERN = re.compile(r"^[ \t]*(COLAZIONE|SECONDA COLAZIONE|PRANZO|MERENDA|CENA)[ \t]*$", re.MULTILINE)
+FOOD_PATTERN = re.compile(r"^[ \t]*(\S.*?)[ \t]*\.{3,}[ \t]*(\S.*?)[ \t]*\(CAD (\d+)\)", re.MULTILINE)
+
+
+def fake_diet_from_text(text: str) -> dict:
+    """A plausible OutputDietaCompleto for the synthetic fixtures (benchmarks.fixtures)."""
+    days = []
+    sections = DAY_PATTERN.split(text)
+    # split() with a group returns [before, day, body, day, body, ...]
+    for day, body in zip(sections[1::2], sections[2::2]):
+        meals = []
+        meal_parts = MEAL_PATTERN.split(body)
+        for meal, meal_body in zip(meal_parts[1::2], meal_parts[2::2]):
+            dishes = [
+                {"nome_piatto": name, "tipo": "semplice", "cad_code": int(cad), "quantita_totale": qty, "ingredienti": []}
+                for name, qty, cad in FOOD_PATTERN.findall(meal_body)
+            ]
+            meals.append({"tipo_pasto": meal.title(), "elenco_piatti": dishes})
+        days.append({"giorno": day.capitalize(), "pasti": meals})
+    cads = sorted({int(c) for c in re.findall(r"\(CAD (\d+)\)", text)})
+    substitutions = [
+        {"cad_code": c, "titolo": f"Gruppo {c}", "opzioni": [{"nome": f"Alternativa {c}", "quantita": "100 g"}]}
+        for c in cads
+    ]
+    return {"piano_settimanale": days, "tabella_sostituzioni": substitutions}
+
+
+RECEIPT_TEXT_PATTERN = re.compile(r"<receipt_text>(.*?)</receipt_text>", re.DOTALL)
+RECEIPT_LINE_PATTERN = re.compile(r"^[ \t]*([A-Za-z].*?)[ \t]+\d+,\d{2}[ \t]*$", re.MULTILINE)
+
+
+def fake_receipt_from_text(text: str) -> dict:
+    """A plausible ReceiptAnalysis: every priced line of the receipt, quantity 1."""
+    match = RECEIPT_TEXT_PATTERN.search(text)
+    lines = RECEIPT_LINE_PATTERN.findall(match.group(1) if match else text)
+    return {"items": [{"name": name.strip().lower(), "quantity": "1"} for name in lines]}
+
+
+def fake_response_for(model: str, prompt: str, config: Any) -> dict:
+    """Default responder: receipt prompts get items, everything else a diet."""
+    if "<receipt_text>" in prompt:
+        return fake_receipt_from_text(prompt)
+    return fake_diet_from_text(prompt)
+
+
+def _prompt_text(contents: Any) -> str:
+    return contents if isinstance(contents, str) else json.dumps(contents, default=str)
+
+
+class FakeResponse:
+    def __init__(self, payload: dict):
+        self.parsed = payload
+        self.text = json.dumps(payload, ensure_ascii=False)
+
+
+class _FakeModels:
+    def __init__(self, owner: "FakeGenaiClient"):
+        self.owner = owner
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None):
+        owner = self.owner
+        owner.calls.append({"model": model, "contents": contents, "config": config})
+        cached_content = getattr(config, "cached_content", None)
+        if cached_content and cached_content not in owner.caches.store:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": "Cached content not found", "status": "NOT_FOUND"}})
+        owner.maybe_fail()
+
+        payload = owner.responder(model, _prompt_text(contents), config)
+        output_tokens = len(json.dumps(payload)) // 4
+        await asyncio.sleep(owner.latency + owner.per_output_token_latency * output_tokens)
+        return FakeResponse(payload)
+
+    async def generate_content_stream(self, *, model: str, contents: Any, config: Any = None):
+        owner = self.owner
+        owner.calls.append({"model": model, "contents": contents, "config": config, "stream": True})
+        cached_content = getattr(config, "cached_content", None)
+        if cached_content and cached_content not in owner.caches.store:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": "Cached content not found", "status": "NOT_FOUND"}})
+        owner.maybe_fail()
+        text = json.dumps(owner.responder(model, _prompt_text(contents), config), ensure_ascii=False)
+
+        async def chunks():
+            await asyncio.sleep(owner.latency)
+            # ~4 chars per token, delivered a few tokens at a time like the real stream
+            step = 4 * owner.stream_chunk_tokens
+            for i in range(0, len(text), step):
+                await asyncio.sleep(owner.per_output_token_latency * owner.stream_chunk_tokens)
+                yield SimpleNamespace(text=text[i:i + step])
+
+        return chunks()
+
+    async def get(self, *, model: str, config: Any = None):
+        return SimpleNamespace(name=model)
+
+
+class _FakeCaches:
+    def __init__(self):
+        self.store: dict = {}
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+
+    async def create(self, *, model: str, config: Any = None):
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        ttl = int(str(getattr(config, "ttl", "3600s")).rstrip("s"))
+        self.store[name] = {"model": model, "system_instruction": config.system_instruction, "expires_at": time.time() + ttl}
+        self.created += 1
+        return SimpleNamespace(name=name, model=model)
+
+    async def update(self, *, name: str, config: Any = None):
+        if name not in self.store:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+        self.store[name]["expires_at"] = time.time() + int(str(config.ttl).rstrip("s"))
+        self.updated += 1
+        return SimpleNamespace(name=name)
+
+    async def delete(self, *, name: str, config: Any = None):
+        if self.store.pop(name, None) is None:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+        self.deleted += 1
+
+    def expire(self, name: str) -> None:
+        """Simulates the server dropping a cache before we expected it."""
+        self.store.pop(name, None)
+
+
+class FakeGenaiClient:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        per_output_token_latency: float = 0.0,
+        error_rate: float = 0.0,
+        responder: Optional[Callable[[str, str, Any], dict]] = None,
+        stream_chunk_tokens: int = 20,
+    ):
+        self.latency = latency
+        self.per_output_token_latency = per_output_token_latency
+        self.error_rate = error_rate
+        self.stream_chunk_tokens = stream_chunk_tokens
+        self.responder = responder or fake_response_for
+        self.calls: list = []
+        self.caches = _FakeCaches()
+        self._failures = 0.0
+        self.aio = SimpleNamespace(models=_FakeModels(self), caches=self.caches)
+        self.models = self.aio.models
+
+    def maybe_fail(self) -> None:
+        # Deterministic error injection: every 1/error_rate-th call fails
+        if self.error_rate <= 0:
+            return
+        self._failures += self.error_rate
+        if self._failures >= 1:
+            self._failures -= 1
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "injected", "status": "UNAVAILABLE"}})
+
+
+# --- Record / replay of real Gemini responses ---
+
+def recording_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode()).hexdigest()
+
+
+class _RecordingModels:
+    def __init__(self, inner: Any, directory: str):
+        self.inner = inner
+        self.directory = directory
+
+    def _save(self, model: str, contents: Any, text: str) -> None:
+        prompt = _prompt_text(contents)
+        path = os.path.join(self.directory, f"{recording_key(model, prompt)}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"model": model, "prompt_chars": len(prompt), "text": text}, f, ensure_ascii=False)
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None):
+        response = await self.inner.generate_content(model=model, contents=contents, config=config)
+        if response.text:
+            self._save(model, contents, response.text)
+        return response
+
+    async def generate_content_stream(self, *, model: str, contents: Any, config: Any = None):
+        stream = await self.inner.generate_content_stream(model=model, contents=contents, config=config)
+
+        async def chunks():
+            parts = []
+            async for chunk in stream:
+                parts.append(chunk.text or "")
+                yield chunk
+            self._save(model, contents, "".join(parts))
+
+        return chunks()
+
+    async def get(self, *, model: str, config: Any = None):
+        return await self.inner.get(model=model, config=config)
+
+
+class RecordingGenaiClient:
+    """Wraps a real genai.Client; every response is saved as <directory>/<key>.json for replay."""
+
+    def __init__(self, client: Any, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.aio = SimpleNamespace(models=_RecordingModels(client.aio.models, directory), caches=client.aio.caches)
+        self.models = self.aio.models
+
+
+class ReplayResponder:
+    """FakeGenaiClient responder serving recorded responses; unknown prompts get synthetic output."""
+
+    def __init__(self, directory: str, fallback: Callable[[str, str, Any], dict] = fake_response_for):
+        self.fallback = fallback
+        self.recordings: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".json"):
+                    with open(os.path.join(directory, name), encoding="utf-8") as f:
+                        self.recordings[name[:-5]] = json.loads(json.load(f)["text"])
+
+    def __call__(self, model: str, prompt: str, config: Any) -> dict:
+        recorded = self.recordings.get(recording_key(model, prompt))
+        if recorded is None:
+            self.misses += 1
+            return self.fallback(model, prompt, config)
+        self.hits += 1
+        return recorded
+
+
+# --- Firebase ---
+
+class FaultInjector:
+    """
+    Latency and error injection for the blocking firebase_admin fakes.
+    The sleep blocks the calling thread, as the real SDKs do.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self._failures = 0.0
+        self._fault_lock = threading.Lock()
+
+    def _unavailable(self) -> Exception:
+        from firebase_admin import exceptions
+        return exceptions.UnavailableError("injected")
+
+    def _should_fail(self) -> bool:
+        with self._fault_lock:
+            self.calls += 1
+            if self.error_rate > 0:
+                # Deterministic: every 1/error_rate-th call fails
+                self._failures += self.error_rate
+                if self._failures >= 1:
+                    self._failures -= 1
+                    return True
+        return False
+
+    def _io(self) -> None:
+        fail = self._should_fail()
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise self._unavailable()
+
+    async def _aio(self) -> None:
+        """Same as _io for the async clients: the latency is awaited, not slept."""
+        fail = self._should_fail()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if fail:
+            raise self._unavailable()
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _transform(current: Optional[dict], data: dict) -> dict:
+    from firebase_admin import firestore
+    result = copy.deepcopy(current) if current else {}
+    for key, value in data.items():
+        if value is firestore.DELETE_FIELD:
+            result.pop(key, None)
+        elif value is firestore.SERVER_TIMESTAMP:
+            result[key] = _now()
+        else:
+            result[key] = copy.deepcopy(value)
+    return result
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(v in a for v in b),
+}
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[dict], fields: Optional[List[str]] = None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        if data is not None and fields is not None:
+            data = {k: v for k, v in data.items() if k in fields}
+        self._data = data
+        self.read_time = _now()
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class FakeWatch:
+    def __init__(self, db: "FakeFirestore", path: str, callback: Callable):
+        self.db = db
+        self.path = path
+        self.callback = callback
+        self.is_active = True
+
+    def notify(self) -> None:
+        if self.is_active:
+            snapshot = self.db.document(self.path)._snapshot()
+            self.callback([snapshot], [], _now())
+
+    def unsubscribe(self) -> None:
+        self.is_active = False
+        self.db._remove_watch(self)
+
+
+class FakeDocumentReference:
+    def __init__(self, db: "FakeFirestore", path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+    def _snapshot(self) -> FakeDocumentSnapshot:
+        return FakeDocumentSnapshot(self, self._db._read(self.path))
+
+    def get(self, field_paths: Optional[List[str]] = None, transaction: Any = None) -> FakeDocumentSnapshot:
+        self._db._io()
+        return FakeDocumentSnapshot(self, self._db._read(self.path), field_paths)
+
+    def set(self, document_data: dict, merge: bool = False):
+        self._db._io()
+        return self._db._commit([("merge" if merge else "set", self.path, document_data)])[0]
+
+    def create(self, document_data: dict):
+        self._db._io()
+        return self._db._commit([("create", self.path, document_data)])[0]
+
+    def update(self, field_updates: dict):
+        self._db._io()
+        return self._db._commit([("update", self.path, field_updates)])[0]
+
+    def delete(self):
+        self._db._io()
+        return self._db._commit([("delete", self.path, None)])[0]
+
+    def on_snapshot(self, callback: Callable) -> FakeWatch:
+        watch = self._db._add_watch(self.path, callback)
+        # The real listener delivers the initial state from its own thread
+        threading.Thread(target=watch.notify, daemon=True).start()
+        return watch
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeFirestore", path: str, filters=(), fields=None, order=(), limit=None):
+        self._db = db
+        self._path = path
+        self._filters = tuple(filters)
+        self._fields = fields
+        self._order = tuple(order)
+        self._limit = limit
+
+    def _copy(self, **changes) -> "FakeQuery":
+        state = {"filters": self._filters, "fields": self._fields, "order": self._order, "limit": self._limit, **changes}
+        return FakeQuery(self._db, self._path, **state)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None, *, filter: Any = None) -> "FakeQuery":
+        if filter is not None:  # FieldFilter
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, _OPERATORS[op_string], value),))
+
+    def select(self, field_paths: List[str]) -> "FakeQuery":
+        return self._copy(fields=list(field_paths))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copy(order=self._order + ((field_path, direction == "DESCENDING"),))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def stream(self, transaction: Any = None):
+        self._db._io()
+        yield from self._results()
+
+    def _results(self):
+        docs = [
+            (doc_id, data) for doc_id, data in self._db._list(self._path)
+            if all(op(data.get(field), value) for field, op, value in self._filters)
+        ]
+        for field, descending in reversed(self._order):
+            docs.sort(key=lambda item: (item[1].get(field) is None, item[1].get(field)), reverse=descending)
+        for doc_id, data in docs[:self._limit]:
+            yield FakeDocumentSnapshot(FakeDocumentReference(self._db, f"{self._path}/{doc_id}"), data, self._fields)
+
+    def get(self, transaction: Any = None) -> List[FakeDocumentSnapshot]:
+        return list(self.stream(transaction))
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db: "FakeFirestore", path: str, **state):
+        super().__init__(db, path, **state)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._db, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, document_data: dict, document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        self._db._io()
+        self._db._commit([("create", ref.path, document_data)])
+        return _now(), ref
+
+    def list_documents(self) -> List[FakeDocumentReference]:
+        return [FakeDocumentReference(self._db, f"{self._path}/{doc_id}") for doc_id, _ in self._db._list(self._path)]
+
+
+class FakeWriteBatch:
+    MAX_OPERATIONS = 500
+
+    def __init__(self, db: "FakeFirestore"):
+        self._db = db
+        self._writes: list = []
+
+    def set(self, reference: FakeDocumentReference, document_data: dict, merge: bool = False) -> None:
+        self._writes.append(("merge" if merge else "set", reference.path, document_data))
+
+    def create(self, reference: FakeDocumentReference, document_data: dict) -> None:
+        self._writes.append(("create", reference.path, document_data))
+
+    def update(self, reference: FakeDocumentReference, field_updates: dict) -> None:
+        self._writes.append(("update", reference.path, field_updates))
+
+    def delete(self, reference: FakeDocumentReference) -> None:
+        self._writes.append(("delete", reference.path, None))
+
+    def commit(self) -> list:
+        from google.api_core import exceptions
+        if len(self._writes) > self.MAX_OPERATIONS:
+            raise exceptions.InvalidArgument(f"maximum {self.MAX_OPERATIONS} writes allowed per request")
+        self._db._io()
+        writes, self._writes = self._writes, []
+        return self._db._commit(writes)
+
+
+class FakeTransaction(FakeWriteBatch):
+    pass
+
+
+def fake_transactional(fn: Callable) -> Callable:
+    """Stand-in for firestore.transactional: runs fn serialized with every other write, then commits."""
+    def run(transaction: FakeTransaction, *args, **kwargs):
+        with transaction._db._lock:
+            result = fn(transaction, *args, **kwargs)
+            transaction.commit()
+        return result
+    return run
+
+
+class FakeFirestore(FaultInjector):
+    """
+    In-memory firestore.client(): documents, subcollections, where/select/
+    order_by/limit queries, batches (500-write limit), transactions,
+    on_snapshot listeners and the SERVER_TIMESTAMP / DELETE_FIELD sentinels.
+    One latency per round trip (a get, a write, a query, a batch commit).
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        super().__init__(latency, error_rate)
+        self.collections: Dict[str, Dict[str, dict]] = {}
+        self.reads = 0
+        self.writes = 0
+        self._watches: Dict[str, List[FakeWatch]] = {}
+        self._lock = threading.RLock()
+
+    def _unavailable(self) -> Exception:
+        from google.api_core import exceptions
+        return exceptions.ServiceUnavailable("injected")
+
+    def collection(self, path: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, path)
+
+    def document(self, path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def transaction(self, **kwargs) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    def seed(self, path: str, data: dict) -> None:
+        """Writes a document without latency, faults or listener notifications."""
+        collection, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            self.collections.setdefault(collection, {})[doc_id] = _transform(None, data)
+
+    def drop_listeners(self) -> None:
+        """Simulates the watch streams dying (listeners report is_active=False)."""
+        with self._lock:
+            for watch in itertools.chain.from_iterable(self._watches.values()):
+                watch.is_active = False
+            self._watches.clear()
+
+    # --- internals ---
+
+    def _read(self, path: str) -> Optional[dict]:
+        collection, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            self.reads += 1
+            return self.collections.get(collection, {}).get(doc_id)
+
+    def _list(self, collection: str) -> list:
+        with self._lock:
+            docs = list(self.collections.get(collection, {}).items())
+            self.reads += len(docs)
+            return docs
+
+    def _commit(self, writes: list) -> list:
+        from google.api_core import exceptions
+        with self._lock:
+            for op, path, _ in writes:
+                collection, doc_id = path.rsplit("/", 1)
+                exists = doc_id in self.collections.get(collection, {})
+                if op == "update" and not exists:
+                    raise exceptions.NotFound(f"No document to update: {path}")
+                if op == "create" and exists:
+                    raise exceptions.AlreadyExists(f"Document already exists: {path}")
+            results = []
+            for op, path, data in writes:
+                collection, doc_id = path.rsplit("/", 1)
+                docs = self.collections.setdefault(collection, {})
+                if op == "delete":
+                    docs.pop(doc_id, None)
+                else:
+                    docs[doc_id] = _transform(docs.get(doc_id) if op in ("merge", "update") else None, data)
+                self.writes += 1
+                results.append(SimpleNamespace(update_time=_now()))
+                for watch in list(self._watches.get(path, [])):
+                    watch.notify()
+            return results
+
+    def _add_watch(self, path: str, callback: Callable) -> FakeWatch:
+        watch = FakeWatch(self, path, callback)
+        with self._lock:
+            self._watches.setdefault(path, []).append(watch)
+        return watch
+
+    def _remove_watch(self, watch: FakeWatch) -> None:
+        with self._lock:
+            watches = self._watches.get(watch.path, [])
+            if watch in watches:
+                watches.remove(watch)
+
+
+class FakeAsyncDocumentReference:
+    def __init__(self, ref: FakeDocumentReference):
+        self._ref = ref
+        self._db = ref._db
+        self.path = ref.path
+        self.id = ref.id
+
+    @property
+    def parent(self) -> "FakeAsyncCollectionReference":
+        return FakeAsyncCollectionReference(self._ref.parent)
+
+    def collection(self, name: str) -> "FakeAsyncCollectionReference":
+        return FakeAsyncCollectionReference(self._ref.collection(name))
+
+    async def get(self, field_paths: Optional[List[str]] = None, transaction: Any = None) -> FakeDocumentSnapshot:
+        await self._db._aio()
+        return FakeDocumentSnapshot(self._ref, self._db._read(self.path), field_paths)
+
+    async def set(self, document_data: dict, merge: bool = False):
+        await self._db._aio()
+        return self._db._commit([("merge" if merge else "set", self.path, document_data)])[0]
+
+    async def create(self, document_data: dict):
+        await self._db._aio()
+        return self._db._commit([("create", self.path, document_data)])[0]
+
+    async def update(self, field_updates: dict):
+        await self._db._aio()
+        return self._db._commit([("update", self.path, field_updates)])[0]
+
+    async def delete(self):
+        await self._db._aio()
+        return self._db._commit([("delete", self.path, None)])[0]
+
+
+class FakeAsyncQuery:
+    def __init__(self, query: FakeQuery):
+        self._query = query
+        self._db = query._db
+
+    def where(self, *args, **kwargs) -> "FakeAsyncQuery":
+        return FakeAsyncQuery(self._query.where(*args, **kwargs))
+
+    def select(self, field_paths: List[str]) -> "FakeAsyncQuery":
+        return FakeAsyncQuery(self._query.select(field_paths))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeAsyncQuery":
+        return FakeAsyncQuery(self._query.order_by(field_path, direction))
+
+    def limit(self, count: int) -> "FakeAsyncQuery":
+        return FakeAsyncQuery(self._query.limit(count))
+
+    async def stream(self, transaction: Any = None):
+        await self._db._aio()
+        for snapshot in self._query._results():
+            yield snapshot
+
+    async def get(self, transaction: Any = None) -> List[FakeDocumentSnapshot]:
+        return [snapshot async for snapshot in self.stream(transaction)]
+
+
+class FakeAsyncCollectionReference(FakeAsyncQuery):
+    def __init__(self, collection: FakeCollectionReference):
+        super().__init__(collection)
+        self.id = collection.id
+
+    def document(self, document_id: Optional[str] = None) -> FakeAsyncDocumentReference:
+        return FakeAsyncDocumentReference(self._query.document(document_id))
+
+    async def add(self, document_data: dict, document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        await self._db._aio()
+        self._db._commit([("create", ref.path, document_data)])
+        return _now(), ref
+
+
+class FakeAsyncWriteBatch(FakeWriteBatch):
+    async def commit(self) -> list:
+        from google.api_core import exceptions
+        if len(self._writes) > self.MAX_OPERATIONS:
+            raise exceptions.InvalidArgument(f"maximum {self.MAX_OPERATIONS} writes allowed per request")
+        await self._db._aio()
+        writes, self._writes = self._writes, []
+        return self._db._commit(writes)
+
+
+class FakeAsyncTransaction(FakeAsyncWriteBatch):
+    pass
+
+
+def fake_async_transactional(fn: Callable) -> Callable:
+    """Stand-in for firestore_async.async_transactional: buffered writes, committed when fn returns (no contention retries)."""
+    async def run(transaction: FakeAsyncTransaction, *args, **kwargs):
+        result = await fn(transaction, *args, **kwargs)
+        await transaction.commit()
+        return result
+    return run
+
+
+class FakeAsyncFirestore:
+    """firestore_async.client() over the same documents (and faults) as a FakeFirestore."""
+
+    def __init__(self, db: FakeFirestore):
+        self._db = db
+
+    def collection(self, path: str) -> FakeAsyncCollectionReference:
+        return FakeAsyncCollectionReference(self._db.collection(path))
+
+    def document(self, path: str) -> FakeAsyncDocumentReference:
+        return FakeAsyncDocumentReference(self._db.document(path))
+
+    def batch(self) -> FakeAsyncWriteBatch:
+        return FakeAsyncWriteBatch(self._db)
+
+    def transaction(self, **kwargs) -> FakeAsyncTransaction:
+        return FakeAsyncTransaction(self._db)
+
+
+PROJECT_ID = "kybo-bench"
+SIGNING_KID = "bench-kid"
+
+
+class FakeAuth(FaultInjector):
+    """
+    firebase_admin.auth stand-in: a user table plus ID tokens signed with a
+    local RSA key. Pass the same signing_key_pem to two FakeAuth instances
+    (e.g. a load driver and the server process) and they accept each other's tokens.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, project_id: str = PROJECT_ID,
+                 signing_key_pem: Optional[bytes] = None):
+        super().__init__(latency, error_rate)
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        self.project_id = project_id
+        self.users: Dict[str, SimpleNamespace] = {}
+        self._lock = threading.Lock()
+        if signing_key_pem:
+            self.key = serialization.load_pem_private_key(signing_key_pem, password=None)
+        else:
+            self.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.certificate_pem = self._self_signed_certificate()
+
+    def _self_signed_certificate(self) -> str:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.x509.oid import NameOID
+
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench")])
+        now = _now()
+        cert = (
+            x509.CertificateBuilder().subject_name(name).issuer_name(name)
+            .public_key(self.key.public_key()).serial_number(1)
+            .not_valid_before(now - datetime.timedelta(minutes=5)).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(self.key, hashes.SHA256())
+        )
+        return cert.public_bytes(serialization.Encoding.PEM).decode()
+
+    def signing_key_pem(self) -> bytes:
+        from cryptography.hazmat.primitives import serialization
+        return self.key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+
+    def certificates(self) -> Dict[str, str]:
+        return {SIGNING_KID: self.certificate_pem}
+
+    def mint_token(self, uid: str, lifetime: int = 3600, **claims) -> str:
+        import jwt
+        now = int(time.time())
+        payload = {
+            "iss": f"https://securetoken.google.com/{self.project_id}", "aud": self.project_id,
+            "sub": uid, "iat": now, "auth_time": now, "exp": now + lifetime, **claims,
+        }
+        return jwt.encode(payload, self.key, algorithm="RS256", headers={"kid": SIGNING_KID})
+
+    # --- firebase_admin.auth functions ---
+
+    def verify_id_token(self, id_token: str, app: Any = None, check_revoked: bool = False, clock_skew_seconds: int = 0) -> dict:
+        import jwt
+        from firebase_admin import auth
+        self._io()
+        try:
+            claims = jwt.decode(id_token, self.key.public_key(), algorithms=["RS256"], audience=self.project_id,
+                                issuer=f"https://securetoken.google.com/{self.project_id}", leeway=clock_skew_seconds)
+        except jwt.PyJWTError as e:
+            raise auth.InvalidIdTokenError(str(e))
+        return {**claims, "uid": claims["sub"]}
+
+    def create_user(self, uid: Optional[str] = None, email: Optional[str] = None, display_name: Optional[str] = None,
+                    password: Optional[str] = None, email_verified: bool = False, disabled: bool = False, app: Any = None, **kwargs):
+        from firebase_admin import auth
+        self._io()
+        with self._lock:
+            if email and any(u.email == email for u in self.users.values()):
+                raise auth.EmailAlreadyExistsError("The user with the provided email already exists", None, None)
+            user = SimpleNamespace(
+                uid=uid or uuid.uuid4().hex[:28], email=email, display_name=display_name,
+                email_verified=email_verified, disabled=disabled, custom_claims=None,
+            )
+            self.users[user.uid] = user
+            return copy.copy(user)
+
+    def _user(self, uid: str) -> SimpleNamespace:
+        from firebase_admin import auth
+        user = self.users.get(uid)
+        if user is None:
+            raise auth.UserNotFoundError(f"No user record found for the provided user ID: {uid}")
+        return user
+
+    def get_user(self, uid: str, app: Any = None):
+        self._io()
+        with self._lock:
+            return copy.copy(self._user(uid))
+
+    def get_user_by_email(self, email: str, app: Any = None):
+        from firebase_admin import auth
+        self._io()
+        with self._lock:
+            for user in self.users.values():
+                if user.email == email:
+                    return copy.copy(user)
+        raise auth.UserNotFoundError(f"No user record found for the provided email: {email}")
+
+    def update_user(self, uid: str, app: Any = None, **kwargs):
+        self._io()
+        with self._lock:
+            user = self._user(uid)
+            for key in ("email", "display_name", "email_verified", "disabled"):
+                if key in kwargs:
+                    setattr(user, key, kwargs[key])
+            return copy.copy(user)
+
+    def delete_user(self, uid: str, app: Any = None) -> None:
+        self._io()
+        with self._lock:
+            self._user(uid)
+            del self.users[uid]
+
+    def set_custom_user_claims(self, uid: str, custom_claims: Optional[dict], app: Any = None) -> None:
+        self._io()
+        with self._lock:
+            self._user(uid).custom_claims = custom_claims
+
+    def list_users(self, page_token: Optional[str] = None, max_results: int = 1000, app: Any = None):
+        self._io()
+        with self._lock:
+            users = [copy.copy(u) for u in self.users.values()]
+        return SimpleNamespace(users=users, iterate_all=lambda: iter(users))
+
+
+AUTH_FUNCTIONS = (
+    "verify_id_token", "create_user", "get_user", "get_user_by_email",
+    "update_user", "delete_user", "set_custom_user_claims", "list_users",
+)
+
+
+class FakeMessaging(FaultInjector):
+    """messaging.send / send_each; tokens in invalid_tokens fail with UnregisteredError."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, invalid_tokens=()):
+        super().__init__(latency, error_rate)
+        self.invalid_tokens = set(invalid_tokens)
+        self.sent: list = []
+        self._lock = threading.Lock()
+
+    def _deliver(self, message: Any) -> str:
+        from firebase_admin import messaging
+        if getattr(message, "token", None) in self.invalid_tokens:
+            raise messaging.UnregisteredError("Requested entity was not found.")
+        with self._lock:
+            self.sent.append(message)
+            return f"projects/{PROJECT_ID}/messages/{len(self.sent)}"
+
+    def send(self, message: Any, dry_run: bool = False, app: Any = None) -> str:
+        self._io()
+        return self._deliver(message)
+
+    def send_each(self, messages: list, dry_run: bool = False, app: Any = None):
+        # One round trip for the whole batch, like the HTTP/2 multiplexed real call
+        self._io()
+        responses = []
+        for message in messages:
+            try:
+                responses.append(SimpleNamespace(success=True, message_id=self._deliver(message), exception=None))
+            except Exception as e:
+                responses.append(SimpleNamespace(success=False, message_id=None, exception=e))
+        success = sum(r.success for r in responses)
+        return SimpleNamespace(responses=responses, success_count=success, failure_count=len(responses) - success)
+
+
+class FakeServices:
+    """
+    The four fakes, patched into firebase_admin (firestore.client,
+    firestore_async.client, firestore.transactional,
+    firestore_async.async_transactional, auth.*, messaging.send/send_each), the
+    gemini_gateway client and the token verifier's signing keys:
+
+        with FakeServices(genai=FakeGenaiClient(latency=2.0)) as fakes:
+            ...  # app.main now runs fully offline
+    """
+
+    def __init__(self, genai: Optional[FakeGenaiClient] = None, db: Optional[FakeFirestore] = None,
+                 auth: Optional[FakeAuth] = None, messaging: Optional[FakeMessaging] = None):
+        self.genai = genai or FakeGenaiClient()
+        self.db = db or FakeFirestore()
+        self.auth = auth or FakeAuth()
+        self.messaging = messaging or FakeMessaging()
+        self._restore: list = []
+
+    def _patch(self, target: Any, name: str, value: Any) -> None:
+        self._restore.append((target, name, getattr(target, name)))
+        setattr(target, name, value)
+
+    def install(self) -> "FakeServices":
+        from firebase_admin import auth, firestore, firestore_async, messaging
+
+        from app.core.token_verifier import token_verifier
+        from app.services.gemini_gateway import gemini_gateway
+
+        self._patch(firestore, "client", lambda app=None: self.db)
+        self._patch(firestore, "transactional", fake_transactional)
+        async_db = FakeAsyncFirestore(self.db)
+        self._patch(firestore_async, "client", lambda app=None: async_db)
+        self._patch(firestore_async, "async_transactional", fake_async_transactional)
+        for name in AUTH_FUNCTIONS:
+            self._patch(auth, name, getattr(self.auth, name))
+        self._patch(messaging, "send", self.messaging.send)
+        self._patch(messaging, "send_each", self.messaging.send_each)
+        for name in ("_client", "_configured"):
+            self._patch(gemini_gateway, name, getattr(gemini_gateway, name))
+        gemini_gateway.set_client(self.genai)
+        for name in ("_project_id", "_keys", "_keys_expire_at"):
+            self._patch(token_verifier, name, getattr(token_verifier, name))
+        token_verifier._project_id = self.auth.project_id
+        token_verifier.set_keys(self.auth.certificates(), max_age=86400)
+        return self
+
+    def uninstall(self) -> None:
+        while self._restore:
+            target, name, value = self._restore.pop()
+            setattr(target, name, value)
+
+    def __enter__(self) -> "FakeServices":
+        return self.install()
+
+    def __exit__(self, *exc) -> None:
+        self.uninstall()
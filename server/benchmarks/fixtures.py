@@ -0,0 +1,246 @@
+"""
+Synthetic fixtures for the offline benchmarks (no external files needed).
+PDFs are written by hand with the standard Helvetica font so pdfplumber can read them.
+"""
+import os
+import random
+
+# Template specs (app.services.template_parser) for the layouts generated here
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "diet_templates")
+
+DAYS = ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"]
+MEALS = ["Colazione", "Seconda Colazione", "Pranzo", "Merenda", "Cena"]
+FOODS = [
+    ("Pane integrale", "60 g"), ("Yogurt greco", "150 g"), ("Pasta di semola", "80 g"),
+    ("Petto di pollo", "120 g"), ("Zucchine", "200 g"), ("Olio extravergine", "10 g"),
+    ("Mela", "1 frutto"), ("Riso basmati", "70 g"), ("Salmone", "150 g"),
+    ("Insalata mista", "q.b."), ("Fette biscottate", "4 pz"), ("Latte parzialmente scremato", "200 ml"),
+]
+
+
+def _escape(text: str) -> bytes:
+    raw = text.encode("latin-1", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _assemble_pdf(streams: list[bytes], width: int = 595, height: int = 842) -> bytes:
+    """Wraps one content stream per page into a minimal PDF with Helvetica as /F1."""
+    objects: list[bytes] = []
+    page_ids = []
+    font_id = 3
+    objects.append(b"")  # 1: catalog (filled later)
+    objects.append(b"")  # 2: pages  (filled later)
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    for stream in streams:
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (width, height, font_id, content_id)
+        )
+        page_ids.append(len(objects))
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    return bytes(out)
+
+
+def build_pdf(pages: list[list[str]]) -> bytes:
+    """Builds a minimal PDF where each page is a list of text lines."""
+    return _assemble_pdf([
+        b"BT /F1 10 Tf 14 TL 50 800 Td " + b" ".join(b"(" + _escape(l) + b") Tj T*" for l in lines) + b" ET"
+        for lines in pages
+    ])
+
+
+def diet_pages(page_count: int, seed: int = 42) -> list[list[str]]:
+    rng = random.Random(seed)
+    pages = []
+    for p in range(page_count):
+        day = DAYS[p % len(DAYS)]
+        lines = [f"{day.upper()} - Settimana {p // len(DAYS) + 1}"]
+        for meal in MEALS:
+            lines.append(meal.upper())
+            for name, qty in rng.sample(FOODS, 5):
+                lines.append(f"   {name} ........ {qty}   (CAD {rng.randint(1, 40)})")
+        pages.append(lines)
+    return pages
+
+
+def substitution_pages(groups: int, seed: int = 42, options: int = 4) -> list[list[str]]:
+    rng = random.Random(seed)
+    lines = ["TABELLA SOSTITUZIONI"]
+    for cad in range(1, groups + 1):
+        lines.append(f"CAD {cad} - Gruppo {cad}")
+        for name, qty in rng.sample(FOODS, options):
+            lines.append(f"   {name} ........ {qty}")
+    return [lines[i:i + 50] for i in range(0, len(lines), 50)]
+
+
+def make_diet_pdf(page_count: int, seed: int = 42, substitution_groups: int = 0) -> bytes:
+    pages = diet_pages(page_count, seed)
+    if substitution_groups:
+        pages += substitution_pages(substitution_groups, seed)
+    return build_pdf(pages)
+
+
+def make_grid_diet_pdf(weeks: int = 1, dishes_per_cell: int = 3, seed: int = 42) -> bytes:
+    """Landscape weekly grid (meals x days) with ruled cells, one page per week."""
+    rng = random.Random(seed)
+    left, top, meal_w, day_w, header_h, row_h = 10, 570, 80, 106, 20, 100
+    streams = []
+    for _ in range(weeks):
+        ops = [b"0.5 w"]
+        width = meal_w + day_w * len(DAYS)
+        height = header_h + row_h * len(MEALS)
+        ops.append(b"%d %d %d %d re S" % (left, top - height, width, height))
+        for c in range(len(DAYS) + 1):
+            x = left + meal_w + c * day_w
+            ops.append(b"%d %d m %d %d l S" % (x, top, x, top - height))
+        for r in range(len(MEALS) + 1):
+            y = top - header_h - r * row_h
+            ops.append(b"%d %d m %d %d l S" % (left, y, left + width, y))
+
+        def text(x: float, y: float, size: float, value: str) -> bytes:
+            return b"BT /F1 %.1f Tf %.1f %.1f Td (" % (size, x, y) + _escape(value) + b") Tj ET"
+
+        ops.append(text(left + 4, top - 14, 8, "PASTO"))
+        for c, day in enumerate(DAYS):
+            ops.append(text(left + meal_w + c * day_w + 4, top - 14, 8, day.upper()))
+        for r, meal in enumerate(MEALS):
+            row_top = top - header_h - r * row_h
+            ops.append(text(left + 4, row_top - 14, 7, meal.upper()))
+            for c in range(len(DAYS)):
+                for i, (name, qty) in enumerate(rng.sample(FOODS, dishes_per_cell)):
+                    ops.append(text(left + meal_w + c * day_w + 3, row_top - 12 - i * 10, 5, f"{name} {qty} (CAD {rng.randint(1, 40)})"))
+        streams.append(b"\n".join(ops))
+    return _assemble_pdf(streams, width=842, height=595)
+
+
+def large_gemini_output(days: int = 7, meals: int = 8, dishes: int = 6, ingredients: int = 5,
+                        groups: int = 150, options: int = 8, seed: int = 42) -> dict:
+    """An OutputDietaCompleto the size of a dense weekly plan with a full substitution table."""
+    rng = random.Random(seed)
+    meal_names = MEALS + ["Spuntino", "Spuntino Serale", "Nell'arco della giornata"]
+    plan = []
+    for d in range(days):
+        pasti = []
+        for m in range(meals):
+            piatti = []
+            for _ in range(dishes):
+                name, qty = rng.choice(FOODS)
+                piatti.append({
+                    "nome_piatto": name, "tipo": rng.choice(["semplice", "composto"]),
+                    "cad_code": rng.randint(0, groups), "quantita_totale": qty,
+                    "ingredienti": [{"nome": n, "quantita": q} for n, q in rng.sample(FOODS, ingredients)],
+                })
+            pasti.append({"tipo_pasto": meal_names[m % len(meal_names)], "elenco_piatti": piatti})
+        plan.append({"giorno": DAYS[d % len(DAYS)], "pasti": pasti})
+    substitutions = [
+        {"cad_code": c, "titolo": f"Gruppo {c}", "opzioni": [{"nome": n, "quantita": q} for n, q in rng.sample(FOODS, options)]}
+        for c in range(1, groups + 1)
+    ]
+    return {"piano_settimanale": plan, "tabella_sostituzioni": substitutions}
+
+
+RECEIPT_ITEMS = [
+    "PANE INTEGRALE", "YOGURT GRECO 0%", "PASTA DI SEMOLA 500G", "PETTO DI POLLO",
+    "ZUCCHINE BIO", "OLIO EVO 1L", "MELE GOLDEN", "RISO BASMATI", "SALMONE AFFUMICATO",
+    "INSALATA MISTA", "LATTE P.S. 1L", "DETERSIVO PIATTI", "UOVA FRESCHE X6",
+]
+
+
+def make_receipt_photo(item_count: int = 40, rotation: float = 6.0, size=(3000, 4000), seed: int = 7) -> bytes:
+    """A ~12 MP JPEG 'phone photo' of a long receipt: dark table, slight tilt, uneven light."""
+    import cv2
+    import numpy as np
+
+    rng = random.Random(seed)
+    width, height = size
+    paper_h = int(height * 0.85)
+    paper = np.full((paper_h, int(width * 0.4)), 245, np.uint8)
+    line_h = max(40, (paper_h - 300) // (item_count + 6))
+    y = 120
+    cv2.putText(paper, "SUPERMERCATO KYBO", (40, y), cv2.FONT_HERSHEY_SIMPLEX, 1.6, 20, 3)
+    for _ in range(item_count):
+        y += line_h
+        name = rng.choice(RECEIPT_ITEMS)
+        price = f"{rng.randint(0, 9)},{rng.randint(0, 99):02d}"
+        cv2.putText(paper, f"{name:<24}{price:>8}", (40, y), cv2.FONT_HERSHEY_SIMPLEX, 1.1, 25, 2)
+    cv2.putText(paper, "TOTALE EURO", (40, y + 2 * line_h), cv2.FONT_HERSHEY_SIMPLEX, 1.4, 20, 3)
+
+    photo = np.full((height, width), 70, np.uint8)
+    top, left = (height - paper_h) // 2, (width - paper.shape[1]) // 2
+    photo[top:top + paper_h, left:left + paper.shape[1]] = paper
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotation, 1.0)
+    photo = cv2.warpAffine(photo, matrix, (width, height), borderValue=70)
+
+    # Uneven lighting + sensor noise
+    gradient = np.tile(np.linspace(0.75, 1.0, width, dtype=np.float32), (height, 1))
+    noise = np.random.default_rng(seed).normal(0, 6, (height, width)).astype(np.float32)
+    photo = np.clip(photo.astype(np.float32) * gradient + noise, 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", cv2.cvtColor(photo, cv2.COLOR_GRAY2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def make_receipt_pdf(item_count: int = 40, seed: int = 7) -> bytes:
+    """A digital receipt (e-mailed PDF) with the same lines as make_receipt_photo."""
+    rng = random.Random(seed)
+    lines = ["SUPERMERCATO KYBO", ""]
+    for _ in range(item_count):
+        name = rng.choice(RECEIPT_ITEMS)
+        lines.append(f"{name:<24}{rng.randint(0, 9)},{rng.randint(0, 99):02d}")
+    lines += ["", "TOTALE EURO"]
+    return build_pdf([lines[i:i + 55] for i in range(0, len(lines), 55)])
+
+
+def write_corpus(directory: str, photos: bool = True) -> list[str]:
+    """
+    Writes the load-test corpus: diet PDFs (text and grid layouts, 1 to 28
+    pages, with and without substitution tables) and receipts (PDF, and
+    JPEG photos when OpenCV is installed). Returns the file names.
+    """
+    import os
+
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+    for seed, pages in enumerate((1, 7, 7, 14, 28), start=1):
+        groups = 20 if seed % 2 else 0
+        files[f"diet_lines_{pages:02d}p_{seed}.pdf"] = make_diet_pdf(pages, seed=seed, substitution_groups=groups)
+    for weeks in (1, 4):
+        files[f"diet_grid_{weeks}w.pdf"] = make_grid_diet_pdf(weeks=weeks, seed=weeks)
+    for seed, items in enumerate((10, 40, 120), start=1):
+        files[f"receipt_{items:03d}_{seed}.pdf"] = make_receipt_pdf(items, seed=seed)
+    if photos:
+        try:
+            for seed, items in enumerate((15, 40), start=1):
+                files[f"receipt_photo_{items:03d}_{seed}.jpg"] = make_receipt_photo(items, seed=seed)
+        except ImportError:
+            pass
+    for name, data in files.items():
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(data)
+    return sorted(files)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write the benchmark fixture corpus to a directory")
+    parser.add_argument("--write", metavar="DIR", required=True)
+    parser.add_argument("--no-photos", action="store_true", help="skip the ~12 MP receipt photos")
+    args = parser.parse_args()
+    for name in write_corpus(args.write, photos=not args.no_photos):
+        print(name)
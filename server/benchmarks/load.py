@@ -0,0 +1,327 @@
+"""
+Offline load test of the real app (app.main) with every external service faked.
+
+The server runs in a child process (uvicorn, one worker) with FakeServices
+installed: fake Gemini, Firestore, Firebase Auth and FCM, each with its own
+latency and error injection. This process drives it over HTTP and reports,
+per scenario and concurrency level, p50/p95/p99 latency, requests/sec,
+errors, and the server's peak RSS (VmHWM of the server and its process-pool
+workers, so it includes PDF extraction and OCR).
+
+    python -m benchmarks.load [--scenarios upload-diet,scan-receipt,admin]
+        [--concurrency 1,4,16] [--requests 32] [--gemini-latency 0.5]
+        [--firestore-latency 0.02] [--error-rate 0] [--corpus DIR]
+        [--replay DIR | --record DIR] [--json results.json]
+
+Rate limits are disabled in the server (the load would only measure 429s).
+The parsed-diet cache and the template parser are off unless --diet-cache /
+--templates are given, so every upload goes through extraction + Gemini.
+--record DIR calls the real Gemini (GOOGLE_API_KEY) and saves its responses;
+--replay DIR serves them back offline, unknown prompts get synthetic output.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from benchmarks.fakes import PROJECT_ID, FakeAuth
+from benchmarks.fixtures import FOODS, RECEIPT_ITEMS, write_corpus
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("upload-diet", "scan-receipt", "admin")
+ADMIN_UID = "admin-0"
+NUTRITIONIST_UID = "nutritionist-0"
+USERS = 20
+
+
+# --- Server process ---
+
+def serve(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="kybo-load-")
+    os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+    os.environ.update({
+        "FIREBASE_PROJECT_ID": PROJECT_ID,
+        "RATE_LIMIT_STORAGE_URI": "memory://",
+        "LEADER_BACKEND": "none",
+        "JOB_QUEUE_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "JOB_UPLOAD_DIR": os.path.join(workdir, "job_uploads"),
+        "DIET_CACHE_DIR": os.path.join(workdir, "diets"),
+        "DIET_CACHE_ENABLED": str(args.diet_cache).lower(),
+        "DIET_TEMPLATES_ENABLED": str(args.templates).lower(),
+        "DIET_TEMPLATES_DIR": os.path.join(SERVER_DIR, "benchmarks", "diet_templates"),
+    })
+
+    import uvicorn
+
+    from app.core.config import settings
+    from benchmarks.fakes import FakeFirestore, FakeGenaiClient, FakeMessaging, FakeServices, RecordingGenaiClient, ReplayResponder
+
+    if args.record:
+        from google import genai
+        genai_client = RecordingGenaiClient(genai.Client(api_key=settings.GOOGLE_API_KEY), args.record)
+    else:
+        genai_client = FakeGenaiClient(
+            latency=args.gemini_latency,
+            per_output_token_latency=args.gemini_token_latency,
+            error_rate=args.error_rate,
+            responder=ReplayResponder(args.replay) if args.replay else None,
+        )
+    with open(args.signing_key, "rb") as f:
+        signing_key = f.read()
+    fakes = FakeServices(
+        genai=genai_client,
+        db=FakeFirestore(latency=args.firestore_latency, error_rate=args.error_rate),
+        auth=FakeAuth(latency=args.auth_latency, error_rate=args.error_rate, signing_key_pem=signing_key),
+        messaging=FakeMessaging(latency=args.firestore_latency),
+    ).install()
+    _seed(fakes)
+
+    from app.main import app, limiter
+    limiter.enabled = False
+    try:
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _seed(fakes) -> None:
+    fakes.db.seed("config/global", {"maintenance_mode": False})
+    people = [(ADMIN_UID, "admin", None), (NUTRITIONIST_UID, "nutritionist", None)]
+    people += [(f"user-{i}", "user", NUTRITIONIST_UID) for i in range(USERS)]
+    for uid, role, parent_id in people:
+        fakes.auth.users[uid] = SimpleNamespace(
+            uid=uid, email=f"{uid}@kybo.test", display_name=f"Load {uid}",
+            email_verified=True, disabled=False, custom_claims={"role": role},
+        )
+        doc = {"uid": uid, "email": f"{uid}@kybo.test", "role": role, "first_name": "Load", "last_name": uid}
+        if parent_id:
+            doc["parent_id"] = parent_id
+        fakes.db.seed(f"users/{uid}", doc)
+
+
+# --- Driver ---
+
+class Workload:
+    def __init__(self, corpus_dir: str, auth: FakeAuth, receipt_mode: str):
+        self.diets = [_read(p) for p in sorted(glob.glob(os.path.join(corpus_dir, "diet_*.pdf")))]
+        receipts = sorted(glob.glob(os.path.join(corpus_dir, "receipt_*.pdf")))
+        if shutil.which("tesseract"):
+            receipts += sorted(glob.glob(os.path.join(corpus_dir, "receipt_*.jpg")))
+        self.receipts = [_read(p) for p in receipts]
+        self.allowed_foods = json.dumps([name.lower() for name, _ in FOODS] + [RECEIPT_ITEMS[0].lower()])
+        self.receipt_mode = receipt_mode
+        self.admin_token = auth.mint_token(ADMIN_UID, role="admin")
+        self.user_tokens = [auth.mint_token(f"user-{i}", role="user") for i in range(USERS)]
+        self.created = 0
+
+    def request(self, scenario: str, n: int) -> dict:
+        if scenario == "upload-diet":
+            name, data = self.diets[n % len(self.diets)]
+            return {"method": "POST", "url": "/upload-diet", "files": {"file": (name, data, "application/pdf")},
+                    "headers": self._auth(self.user_tokens[n % USERS])}
+        if scenario == "scan-receipt":
+            name, data = self.receipts[n % len(self.receipts)]
+            content_type = "application/pdf" if name.endswith(".pdf") else "image/jpeg"
+            return {"method": "POST", "url": "/scan-receipt", "files": {"file": (name, data, content_type)},
+                    "data": {"allowed_foods": self.allowed_foods, "mode": self.receipt_mode},
+                    "headers": self._auth(self.user_tokens[n % USERS])}
+        return self._admin_request(n)
+
+    def _admin_request(self, n: int) -> dict:
+        # The dashboard's mix: mostly reads and small updates, the odd user creation and sync dry run
+        headers = self._auth(self.admin_token)
+        target = f"user-{n % USERS}"
+        op = n % 6
+        if op == 0:
+            return {"method": "GET", "url": "/admin/config/maintenance", "headers": headers}
+        if op == 1:
+            self.created += 1
+            body = {"email": f"load-{os.getpid()}-{self.created}@kybo.test", "password": "load-test-1",
+                    "role": "user", "first_name": "Load", "last_name": str(self.created)}
+            return {"method": "POST", "url": "/admin/create-user", "json": body, "headers": headers}
+        if op == 2:
+            return {"method": "PUT", "url": f"/admin/update-user/{target}", "json": {"first_name": f"Load{n}"}, "headers": headers}
+        if op == 3:
+            return {"method": "POST", "url": "/admin/assign-user",
+                    "json": {"target_uid": target, "nutritionist_id": NUTRITIONIST_UID}, "headers": headers}
+        if op == 4:
+            return {"method": "POST", "url": "/admin/log-access", "json": {"target_uid": target, "reason": "load test"}, "headers": headers}
+        return {"method": "POST", "url": "/admin/sync-users?dry_run=true", "headers": headers}
+
+    @staticmethod
+    def _auth(token: str) -> dict:
+        return {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip, br"}
+
+
+def _read(path: str) -> tuple:
+    with open(path, "rb") as f:
+        return os.path.basename(path), f.read()
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def _status_kb(pid: int, field: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _children(pid: int) -> list:
+    children = []
+    for task in glob.glob(f"/proc/{pid}/task/*/children"):
+        try:
+            with open(task) as f:
+                children += [int(c) for c in f.read().split()]
+        except OSError:
+            pass
+    return children
+
+
+def peak_rss_mb(pid: int) -> float:
+    """Peak resident set of the server plus its live children (process-pool workers)."""
+    return sum(_status_kb(p, "VmHWM") for p in [pid] + _children(pid)) / 1024
+
+
+async def run_level(client: httpx.AsyncClient, workload: Workload, scenario: str, concurrency: int, total: int) -> dict:
+    latencies, statuses = [], {}
+    counter = iter(range(total))
+
+    async def worker():
+        for n in counter:
+            spec = dict(workload.request(scenario, n))
+            start = time.perf_counter()
+            try:
+                response = await client.request(spec.pop("method"), spec.pop("url"), **spec)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+    return {
+        "scenario": scenario, "concurrency": concurrency, "requests": total, "ok": ok,
+        "errors": {str(k): v for k, v in statuses.items() if not (isinstance(k, int) and k < 400)},
+        "rps": total / wall,
+        "p50_ms": 1e3 * _percentile(latencies, 50),
+        "p95_ms": 1e3 * _percentile(latencies, 95),
+        "p99_ms": 1e3 * _percentile(latencies, 99),
+    }
+
+
+async def _wait_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            if (await client.get("/openapi.json")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def drive(args, workload: Workload, server: subprocess.Popen) -> list:
+    results = []
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=base_url, timeout=600, limits=limits) as client:
+        await _wait_ready(client, server)
+        print(f"{'scenario':<14} {'conc':>4} {'reqs':>5} {'ok':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS MB':>12}  errors")
+        for scenario in args.scenarios:
+            # Warm-up: imports, pools, first Gemini/Firestore handshakes
+            spec = dict(workload.request(scenario, 0))
+            await client.request(spec.pop("method"), spec.pop("url"), **spec)
+            for concurrency in args.concurrency:
+                row = await run_level(client, workload, scenario, concurrency, args.requests)
+                row["peak_rss_mb"] = peak_rss_mb(server.pid)
+                results.append(row)
+                print(f"{scenario:<14} {concurrency:>4} {row['requests']:>5} {row['ok']:>5} {row['rps']:>8.2f} "
+                      f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['peak_rss_mb']:>12.1f}  "
+                      f"{row['errors'] or ''}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", nargs="?", default="run", choices=("run", "serve"))
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="per scenario and concurrency level")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--gemini-token-latency", type=float, default=0.0)
+    parser.add_argument("--firestore-latency", type=float, default=0.02)
+    parser.add_argument("--auth-latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--receipt-mode", default="hybrid", choices=("hybrid", "local_only", "llm"))
+    parser.add_argument("--diet-cache", action="store_true")
+    parser.add_argument("--templates", action="store_true")
+    parser.add_argument("--corpus", help="fixture directory (default: generated with benchmarks.fixtures)")
+    parser.add_argument("--record", metavar="DIR", help="call the real Gemini and save its responses")
+    parser.add_argument("--replay", metavar="DIR", help="serve recorded Gemini responses")
+    parser.add_argument("--signing-key", help=argparse.SUPPRESS)
+    parser.add_argument("--verbose", action="store_true", help="show the server's logs")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.command == "serve":
+        return serve(args)
+
+    with tempfile.TemporaryDirectory(prefix="kybo-load-") as tmp:
+        corpus = args.corpus
+        if not corpus:
+            corpus = os.path.join(tmp, "corpus")
+            write_corpus(corpus, photos=bool(shutil.which("tesseract")))
+        auth = FakeAuth()
+        key_path = os.path.join(tmp, "signing-key.pem")
+        with open(key_path, "wb") as f:
+            f.write(auth.signing_key_pem())
+        workload = Workload(corpus, auth, args.receipt_mode)
+
+        command = [sys.executable, "-m", "benchmarks.load", "serve", "--signing-key", key_path] + [
+            a for a in sys.argv[1:] if a not in ("run",)
+        ]
+        output = None if args.verbose else subprocess.DEVNULL
+        server = subprocess.Popen(command, cwd=SERVER_DIR, stdout=output, stderr=output)
+        try:
+            results = asyncio.run(drive(args, workload, server))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "signing_key"}, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()